@@ -4,6 +4,7 @@ import json
 from datetime import datetime, timedelta
 from collections import defaultdict
 import os
+import unicodedata
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -28,6 +29,10 @@ class SistemaFinancieroAgricola:
         self.presupuesto_anual = {}
         self.presupuesto_mensual_por_mes = {}
         self.proveedores = {}
+        self.nombres_normalizados = {}
+        self.trigramas_proveedores = defaultdict(set)
+        self.proveedores_por_categoria = defaultdict(set)
+        self.filas_proveedores = set()
         self.presupuesto_modificado = {}
         self.sobrantes = {}
         self.presupuestos_por_año = {}
@@ -1300,6 +1305,7 @@ class SistemaFinancieroAgricola:
         tk.Label(frame_busqueda, text="Buscar:").pack(side='left', padx=5)
         self.entry_buscar_proveedor = ttk.Entry(frame_busqueda, width=30)
         self.entry_buscar_proveedor.pack(side='left', padx=5)
+        self.entry_buscar_proveedor.bind('<KeyRelease>', self.filtrar_proveedores)
         ttk.Button(frame_busqueda, text=" Buscar", 
                   command=self.buscar_proveedor).pack(side='left', padx=5)
         
@@ -1381,6 +1387,7 @@ class SistemaFinancieroAgricola:
             'direccion': direccion,
             'notas': notas
         }
+        self.indexar_proveedor(nombre)
         
         self.guardar_datos()
         self.actualizar_tabla_proveedores()
@@ -1400,6 +1407,7 @@ class SistemaFinancieroAgricola:
             messagebox.showwarning("Advertencia", "La categoría es obligatoria")
             return
         
+        self.desindexar_proveedor(nombre)
         self.proveedores[nombre] = {
             'categoria': categoria,
             'telefono': self.entry_telefono_proveedor.get().strip(),
@@ -1407,6 +1415,7 @@ class SistemaFinancieroAgricola:
             'direccion': self.entry_direccion_proveedor.get().strip(),
             'notas': self.entry_notas_proveedor.get().strip()
         }
+        self.indexar_proveedor(nombre)
         
         self.guardar_datos()
         self.actualizar_tabla_proveedores()
@@ -1421,6 +1430,7 @@ class SistemaFinancieroAgricola:
             return
         
         if messagebox.askyesno("Confirmar", f"¿Está seguro de eliminar al proveedor '{nombre}'?"):
+            self.desindexar_proveedor(nombre)
             del self.proveedores[nombre]
             self.guardar_datos()
             self.actualizar_tabla_proveedores()
@@ -1451,49 +1461,56 @@ class SistemaFinancieroAgricola:
             self.entry_direccion_proveedor.insert(0, valores[4])
             self.entry_notas_proveedor.insert(0, valores[5])
     
-    def buscar_proveedor(self):
+    def normalizar(self, texto):
         """"""
-        termino = self.entry_buscar_proveedor.get().strip().lower()
-        
-        for item in self.tree_proveedores.get_children():
-            self.tree_proveedores.delete(item)
-        
-        for nombre, datos in self.proveedores.items():
-            if termino in nombre.lower():
-                self.tree_proveedores.insert('', 'end', values=(
-                    nombre,
-                    datos['categoria'],
-                    datos['telefono'],
-                    datos['email'],
-                    datos['direccion'],
-                    datos['notas']
-                ))
+        descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+        return ' '.join(''.join(c for c in descompuesto if not unicodedata.combining(c)).split())
     
-    def filtrar_proveedores(self, event=None):
+    def indexar_proveedor(self, nombre):
+        """"""
+        normalizado = self.normalizar(nombre)
+        self.nombres_normalizados[nombre] = normalizado
+        for i in range(len(normalizado) - 2):
+            self.trigramas_proveedores[normalizado[i:i + 3]].add(nombre)
+        self.proveedores_por_categoria[self.proveedores[nombre]['categoria']].add(nombre)
+    
+    def desindexar_proveedor(self, nombre):
         """"""
+        normalizado = self.nombres_normalizados.pop(nombre)
+        for i in range(len(normalizado) - 2):
+            self.trigramas_proveedores[normalizado[i:i + 3]].discard(nombre)
+        self.proveedores_por_categoria[self.proveedores[nombre]['categoria']].discard(nombre)
+    
+    def proveedores_coincidentes(self):
+        """"""
+        termino = self.normalizar(self.entry_buscar_proveedor.get())
         categoria_filtro = self.combo_filtro_categoria.get()
         
-        for item in self.tree_proveedores.get_children():
-            self.tree_proveedores.delete(item)
-        
-        for nombre, datos in self.proveedores.items():
-            if categoria_filtro == "Todas" or datos['categoria'] == categoria_filtro:
-                self.tree_proveedores.insert('', 'end', values=(
-                    nombre,
-                    datos['categoria'],
-                    datos['telefono'],
-                    datos['email'],
-                    datos['direccion'],
-                    datos['notas']
-                ))
+        if categoria_filtro and categoria_filtro != "Todas":
+            nombres = set(self.proveedores_por_categoria.get(categoria_filtro, ()))
+        else:
+            nombres = set(self.proveedores)
+        
+        if len(termino) >= 3:
+            for i in range(len(termino) - 2):
+                nombres &= self.trigramas_proveedores.get(termino[i:i + 3], set())
+        
+        return sorted(n for n in nombres if termino in self.nombres_normalizados[n])
+    
+    def buscar_proveedor(self):
+        """"""
+        self.filtrar_proveedores()
+    
+    def filtrar_proveedores(self, event=None):
+        """"""
+        self.tree_proveedores.set_children('', *self.proveedores_coincidentes())
     
     def actualizar_tabla_proveedores(self):
         """"""
-        for item in self.tree_proveedores.get_children():
-            self.tree_proveedores.delete(item)
+        self.tree_proveedores.delete(*self.filas_proveedores)
         
         for nombre, datos in sorted(self.proveedores.items()):
-            self.tree_proveedores.insert('', 'end', values=(
+            self.tree_proveedores.insert('', 'end', iid=nombre, values=(
                 nombre,
                 datos['categoria'],
                 datos['telefono'],
@@ -1501,6 +1518,9 @@ class SistemaFinancieroAgricola:
                 datos['direccion'],
                 datos['notas']
             ))
+        self.filas_proveedores = set(self.proveedores)
+        
+        self.filtrar_proveedores()
     
 
     def crear_tab_registro(self):
@@ -2343,6 +2363,8 @@ class SistemaFinancieroAgricola:
                     self.proveedores = json.load(f)
             except:
                 self.proveedores = {}
+        for nombre in self.proveedores:
+            self.indexar_proveedor(nombre)
         
         if os.path.exists(self.archivo_presupuestos_anuales):
             try:
@@ -1,29 +1,102 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, simpledialog
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from collections import defaultdict
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 import calendar
+import math
 import hashlib
 import secrets
-from cryptography.fernet import Fernet
-import base64
+import sys
+import time
+import sqlite3
+import threading
+import unicodedata
+from itertools import count, islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from bisect import bisect_left, bisect_right, insort
 
-class SistemaSeguridad:
+ARCHIVOS_JSON = {
+    'transacciones': "agricultura_finanzas.json",
+    'diario_transacciones': "agricultura_finanzas_diario.jsonl",
+    'presupuesto_mensual': "agricultura_presupuesto_mensual.json",
+    'proveedores': "agricultura_proveedores.json",
+    'secuencias': "agricultura_secuencias.json",
+    'presupuestos_anuales': "agricultura_presupuestos_anuales.json",
+    'sobrantes_anuales': "agricultura_sobrantes_anuales.json",
+    'categorias_personalizadas': "agricultura_categorias_personalizadas.json",
+    'log_actividades': "log_actividades.json",
+    'directorio_log': "log_actividades",
+    'usuarios': "usuarios_sistema.json",
+    'accesos_usuarios': "accesos_usuarios.jsonl",
+    'parametros_hash': "parametros_hash.json"
+}
+ARCHIVO_BASE_DATOS = "agritrack.db"
+ESPERA_ESCRITURA_SEGUNDOS = 0.5
+TAMAÑO_PAGINA_LOG = 200
+TAMAÑO_BLOQUE_GASTOS = 100
+MAX_FILAS_GASTOS = 400
+TOP_PROVEEDORES = 50
+# Usuarios creados antes de guardar los parámetros del hash usaban exactamente estos
+PARAMETROS_HASH_POR_DEFECTO = {'algoritmo': 'pbkdf2_sha256', 'iteraciones': 100000}
+TIEMPO_OBJETIVO_LOGIN = 0.25
+MESES = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+# 0: lista plana, 1: snapshot + diario, 2: todos los registros con id y todos los campos,
+# 3: gastos enlazados por id al catálogo de proveedores
+VERSION_ESQUEMA = 3
+
+
+class CronometroArranque:
     def __init__(self):
-        self.archivo_usuarios = "usuarios_sistema.json"
+        self.ultimo = time.perf_counter()
+        self.etapas = []
+        self.mostrar = False
+
+    def marcar(self, etapa):
+        ahora = time.perf_counter()
+        self.etapas.append((etapa, ahora - self.ultimo))
+        self.ultimo = ahora
+
+    def reanudar(self):
+        # Descarta el tiempo que el programa pasa esperando al usuario
+        self.ultimo = time.perf_counter()
+
+    def informe(self):
+        lineas = [f"  {etapa:<28}{segundos * 1000:>9.1f} ms" for etapa, segundos in self.etapas]
+        lineas.append(f"  {'Total':<28}{sum(s for _, s in self.etapas) * 1000:>9.1f} ms")
+        return "Tiempos de arranque:\n" + "\n".join(lineas)
+
+    def publicar(self):
+        if self.mostrar:
+            print(self.informe())
+
+
+cronometro_arranque = CronometroArranque()
+
+class SistemaSeguridad:
+    def __init__(self, almacenamiento=None):
+        self.almacenamiento = almacenamiento or crear_almacenamiento()
         self.archivo_clave_maestra = "clave_maestra.key"
         self.usuarios = {}
         self.intentos_fallidos = {}
         self.max_intentos = 3
+        self.parametros_hash = self.cargar_parametros_hash()
         self.cargar_usuarios()
-        self.cipher = self.obtener_cipher()
+        self._cipher = None
+    
+    @property
+    def cipher(self):
+        # La clave maestra (y la librería cryptography) solo se cargan la primera vez que se piden
+        if self._cipher is None:
+            self._cipher = self.obtener_cipher()
+        return self._cipher
     
     def obtener_cipher(self):
+        from cryptography.fernet import Fernet
         if os.path.exists(self.archivo_clave_maestra):
             with open(self.archivo_clave_maestra, 'rb') as f:
                 key = f.read()
@@ -33,24 +106,66 @@ class SistemaSeguridad:
                 f.write(key)
         return Fernet(key)
     
-    def hash_password(self, password, salt=None):
+    def cargar_parametros_hash(self):
+        try:
+            return self.almacenamiento.cargar('parametros_hash', dict(PARAMETROS_HASH_POR_DEFECTO))
+        except:
+            return dict(PARAMETROS_HASH_POR_DEFECTO)
+    
+    def configurar_hash(self, **parametros):
+        self.parametros_hash = parametros
+        self.almacenamiento.guardar('parametros_hash', parametros)
+    
+    def derivar_clave(self, password, salt, parametros):
+        if parametros['algoritmo'] == 'scrypt':
+            clave = hashlib.scrypt(
+                password.encode('utf-8'),
+                salt=salt.encode('utf-8'),
+                n=parametros['n'],
+                r=parametros['r'],
+                p=parametros['p'],
+                maxmem=128 * parametros['n'] * parametros['r'] * 2
+            )
+        elif parametros['algoritmo'] == 'pbkdf2_sha256':
+            clave = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), parametros['iteraciones'])
+        else:
+            raise ValueError(f"Algoritmo de hash no soportado: {parametros['algoritmo']}")
+        return clave.hex()
+    
+    def hash_password(self, password, salt=None, parametros=None):
         if salt is None:
             salt = secrets.token_hex(32)
-        pwd_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode('utf-8'),
-            salt.encode('utf-8'),
-            100000
-        )
-        return salt, pwd_hash.hex()
+        parametros = dict(parametros or self.parametros_hash)
+        return salt, self.derivar_clave(password, salt, parametros), parametros
+    
+    def verificar_password(self, password, salt, hash_guardado, parametros=None):
+        nuevo_hash = self.derivar_clave(password, salt, parametros or PARAMETROS_HASH_POR_DEFECTO)
+        return secrets.compare_digest(nuevo_hash, hash_guardado)
     
-    def verificar_password(self, password, salt, hash_guardado):
-        _, nuevo_hash = self.hash_password(password, salt)
-        return nuevo_hash == hash_guardado
+    def necesita_rehash(self, parametros):
+        return (parametros or PARAMETROS_HASH_POR_DEFECTO) != self.parametros_hash
+    
+    def comprobar_password(self, password, user_data):
+        # Si la contraseña es correcta y el coste configurado cambió, se aprovecha para derivar el nuevo hash
+        parametros = user_data.get('password_kdf')
+        if not self.verificar_password(password, user_data['password_salt'], user_data['password_hash'], parametros):
+            return False, None
+        if self.necesita_rehash(parametros):
+            return True, self.hash_password(password)
+        return True, None
+    
+    def calibrar_iteraciones(self, tiempo_objetivo=TIEMPO_OBJETIVO_LOGIN, iteraciones_prueba=20000):
+        salt = secrets.token_hex(32)
+        inicio = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'calibracion', salt.encode('utf-8'), iteraciones_prueba)
+        transcurrido = time.perf_counter() - inicio
+        iteraciones = int(iteraciones_prueba * tiempo_objetivo / max(transcurrido, 1e-6))
+        # Nunca por debajo del coste histórico, y redondeado para que sea legible en el archivo
+        return max(PARAMETROS_HASH_POR_DEFECTO['iteraciones'], round(iteraciones, -3))
     
     def crear_usuario_inicial(self):
-        salt, pwd_hash = self.hash_password("admin123")
-        salt_resp, resp_hash = self.hash_password("admin") 
+        salt, pwd_hash, kdf = self.hash_password("admin123")
+        salt_resp, resp_hash, kdf_resp = self.hash_password("admin") 
         self.usuarios = {
             "admin": {
                 "nombre_completo": "Administrador",
@@ -58,9 +173,11 @@ class SistemaSeguridad:
                 "rol": "Administrador",
                 "password_salt": salt,
                 "password_hash": pwd_hash,
+                "password_kdf": kdf,
                 "pregunta_seguridad": "¿Cuál es el nombre de tu primera mascota?", 
                 "respuesta_salt": salt_resp,                                        
                 "respuesta_hash": resp_hash, 
+                "respuesta_kdf": kdf_resp, 
                 "activo": True,
                 "fecha_creacion": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 "ultimo_acceso": None,
@@ -70,20 +187,42 @@ class SistemaSeguridad:
         self.guardar_usuarios()
     
     def cargar_usuarios(self):
-        if os.path.exists(self.archivo_usuarios):
+        if self.almacenamiento.existe('usuarios'):
             try:
-                with open(self.archivo_usuarios, 'r', encoding='utf-8') as f:
-                    self.usuarios = json.load(f)
+                self.usuarios = self.almacenamiento.cargar('usuarios', {})
             except:
                 self.crear_usuario_inicial()
         else:
             self.crear_usuario_inicial()
+        
+        # El estado de acceso más reciente está en su propio registro, no en la tabla de credenciales
+        try:
+            accesos = self.almacenamiento.cargar_accesos()
+        except:
+            accesos = {}
+        for usuario, estado in accesos.items():
+            if usuario in self.usuarios:
+                self.usuarios[usuario].update(estado)
     
     def guardar_usuarios(self):
-        with open(self.archivo_usuarios, 'w', encoding='utf-8') as f:
-            json.dump(self.usuarios, f, ensure_ascii=False, indent=2)
+        self.almacenamiento.guardar('usuarios', self.usuarios)
+    
+    def actualizar_acceso(self, usuario, **cambios):
+        user_data = self.usuarios[usuario]
+        user_data.update(cambios)
+        self.almacenamiento.registrar_acceso(usuario, {
+            'ultimo_acceso': user_data.get('ultimo_acceso'),
+            'intentos_fallidos': user_data.get('intentos_fallidos', 0)
+        })
     
     def autenticar(self, usuario, password):
+        valido, mensaje = self.validar_cuenta(usuario)
+        if not valido:
+            return False, mensaje
+        correcta, nueva_clave = self.comprobar_password(password, self.usuarios[usuario])
+        return self.registrar_intento(usuario, correcta, nueva_clave)
+    
+    def validar_cuenta(self, usuario):
         if usuario not in self.usuarios:
             return False, "Usuario no existe"
         
@@ -94,15 +233,18 @@ class SistemaSeguridad:
         
         if not user_data.get('activo', False):
             return False, "Usuario desactivado"
-        
-        if self.verificar_password(password, user_data['password_salt'], user_data['password_hash']):
-            user_data['intentos_fallidos'] = 0
-            user_data['ultimo_acceso'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.guardar_usuarios()
+        return True, ""
+    
+    def registrar_intento(self, usuario, correcta, nueva_clave=None):
+        user_data = self.usuarios[usuario]
+        if correcta:
+            if nueva_clave:
+                user_data['password_salt'], user_data['password_hash'], user_data['password_kdf'] = nueva_clave
+                self.guardar_usuarios()
+            self.actualizar_acceso(usuario, intentos_fallidos=0, ultimo_acceso=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             return True, "Login exitoso"
         else:
-            user_data['intentos_fallidos'] = user_data.get('intentos_fallidos', 0) + 1
-            self.guardar_usuarios()
+            self.actualizar_acceso(usuario, intentos_fallidos=user_data.get('intentos_fallidos', 0) + 1)
             intentos_restantes = self.max_intentos - user_data['intentos_fallidos']
             if intentos_restantes > 0:
                 return False, f"Contraseña incorrecta. {intentos_restantes} intentos restantes."
@@ -113,35 +255,37 @@ class SistemaSeguridad:
         if username in self.usuarios:
             return False, "El usuario ya existe"
         
-        salt, pwd_hash = self.hash_password(password)
-        salt_resp, resp_hash = self.hash_password(respuesta_seguridad.strip().lower()) if respuesta_seguridad else ("", "")
+        salt, pwd_hash, kdf = self.hash_password(password)
+        salt_resp, resp_hash, kdf_resp = self.hash_password(respuesta_seguridad.strip().lower()) if respuesta_seguridad else ("", "", None)
         
         self.usuarios[username] = {
             "nombre_completo": nombre_completo,
             "rol": rol,
             "password_salt": salt,
             "password_hash": pwd_hash,
+            "password_kdf": kdf,
             "pregunta_seguridad": pregunta_seguridad,
             "respuesta_salt": salt_resp,
             "respuesta_hash": resp_hash,
+            "respuesta_kdf": kdf_resp,
             "activo": True,
             "fecha_creacion": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             "ultimo_acceso": None,
             "intentos_fallidos": 0
         }
         self.guardar_usuarios()
+        # Un usuario nuevo con el nombre de uno eliminado no hereda su estado de acceso
+        self.actualizar_acceso(username)
         return True, "Usuario creado exitosamente"
     
     def cambiar_password(self, username, password_actual, password_nueva):
         if username not in self.usuarios:
             return False, "Usuario no existe"
         user_data = self.usuarios[username]
-        if not self.verificar_password(password_actual, user_data['password_salt'], user_data['password_hash']):
+        if not self.verificar_password(password_actual, user_data['password_salt'], user_data['password_hash'], user_data.get('password_kdf')):
             return False, "Contraseña actual incorrecta"
         
-        salt, pwd_hash = self.hash_password(password_nueva)
-        user_data['password_salt'] = salt
-        user_data['password_hash'] = pwd_hash
+        user_data['password_salt'], user_data['password_hash'], user_data['password_kdf'] = self.hash_password(password_nueva)
         self.guardar_usuarios()
         return True, "Contraseña cambiada exitosamente"
 
@@ -155,7 +299,7 @@ class SistemaSeguridad:
             return False, "Este usuario no tiene configurada una pregunta de seguridad. Contacte al administrador."
             
         respuesta_limpia = respuesta.strip().lower()
-        if self.verificar_password(respuesta_limpia, user_data['respuesta_salt'], user_data['respuesta_hash']):
+        if self.verificar_password(respuesta_limpia, user_data['respuesta_salt'], user_data['respuesta_hash'], user_data.get('respuesta_kdf')):
             return True, "Respuesta correcta"
         return False, "Respuesta incorrecta"
 
@@ -163,11 +307,16 @@ class SistemaSeguridad:
         if username not in self.usuarios:
             return False
             
-        salt, pwd_hash = self.hash_password(nueva_password)
+        return self.asignar_password(username, *self.hash_password(nueva_password))
+
+    def asignar_password(self, username, salt, pwd_hash, parametros):
+        if username not in self.usuarios:
+            return False
         self.usuarios[username]['password_salt'] = salt
         self.usuarios[username]['password_hash'] = pwd_hash
-        self.usuarios[username]['intentos_fallidos'] = 0 
+        self.usuarios[username]['password_kdf'] = parametros
         self.guardar_usuarios()
+        self.actualizar_acceso(username, intentos_fallidos=0)
         return True
 
 class VentanaLogin:
@@ -176,6 +325,7 @@ class VentanaLogin:
         self.seguridad = seguridad
         self.usuario_actual = None
         self.login_exitoso = False
+        self.verificando = False
         
         self.root.title("🔐 Sistema de Login - AgriTrack")
         self.root.geometry("500x630")
@@ -219,12 +369,14 @@ class VentanaLogin:
             command=self.toggle_password, bg='white', font=('Arial', 9)
         ).pack(anchor='w', padx=20)
         
-        btn_login = tk.Button(
+        self.btn_login = tk.Button(
             frame_login, text="🔓 INICIAR SESIÓN", font=('Arial', 12, 'bold'),
             bg='#4CAF50', fg='white', relief='raised', bd=3, cursor='hand2',
             command=self.intentar_login
         )
-        btn_login.pack(pady=(20, 10), padx=20, fill='x')
+        self.btn_login.pack(pady=(20, 10), padx=20, fill='x')
+        
+        self.barra_progreso = ttk.Progressbar(frame_login, mode='indeterminate')
 
         btn_recuperar = tk.Button(
             frame_login, text="¿Olvidaste tu contraseña?", font=('Arial', 9, 'underline'),
@@ -245,13 +397,68 @@ class VentanaLogin:
         else:
             self.entry_password.config(show='●')
     
+    def ejecutar_en_segundo_plano(self, trabajo, al_terminar, barra=None):
+        # La derivación de claves corre en un hilo; la interfaz solo se toca desde el hilo de Tk
+        resultado = {}
+        
+        def trabajar():
+            try:
+                resultado['valor'] = trabajo()
+            except Exception as e:
+                resultado['error'] = e
+        
+        hilo = threading.Thread(target=trabajar, daemon=True)
+        hilo.start()
+        if barra is not None:
+            barra.start(15)
+        
+        def revisar():
+            if hilo.is_alive():
+                self.root.after(50, revisar)
+                return
+            if barra is not None and barra.winfo_exists():
+                barra.stop()
+            if 'error' in resultado:
+                messagebox.showerror("Error", f"Error al verificar credenciales: {resultado['error']}")
+                al_terminar(None)
+            else:
+                al_terminar(resultado['valor'])
+        
+        self.root.after(50, revisar)
+    
     def intentar_login(self):
+        if self.verificando:
+            return
         usuario = self.entry_usuario.get().strip()
         password = self.entry_password.get()
         if not usuario or not password:
             self.label_estado.config(text="⚠️ Complete todos los campos", fg='#FF6B6B')
             return
-        exito, mensaje = self.seguridad.autenticar(usuario, password)
+        valido, mensaje = self.seguridad.validar_cuenta(usuario)
+        if not valido:
+            self.label_estado.config(text="❌ " + mensaje, fg='#FF6B6B')
+            self.entry_password.delete(0, 'end')
+            return
+        
+        user_data = dict(self.seguridad.usuarios[usuario])
+        self.verificando = True
+        self.btn_login.config(state='disabled')
+        self.label_estado.config(text="⏳ Verificando credenciales...", fg='white')
+        self.barra_progreso.pack(padx=20, pady=(0, 10), fill='x', before=self.btn_login)
+        self.ejecutar_en_segundo_plano(
+            lambda: self.seguridad.comprobar_password(password, user_data),
+            lambda resultado: self.finalizar_login(usuario, resultado),
+            self.barra_progreso
+        )
+    
+    def finalizar_login(self, usuario, resultado):
+        self.verificando = False
+        self.barra_progreso.pack_forget()
+        self.btn_login.config(state='normal')
+        if resultado is None:
+            self.label_estado.config(text="", fg='#FF6B6B')
+            return
+        exito, mensaje = self.seguridad.registrar_intento(usuario, *resultado)
         if exito:
             self.label_estado.config(text="✅ " + mensaje, fg='#4CAF50')
             self.usuario_actual = usuario
@@ -291,6 +498,7 @@ class VentanaLogin:
         
         lbl_estado = tk.Label(frame_main, text="", bg='white', font=('Arial', 9))
         lbl_estado.pack(side='bottom', pady=10)
+        barra_rec = ttk.Progressbar(frame_main, mode='indeterminate')
 
         def buscar_usuario():
             user = entry_user.get().strip()
@@ -337,19 +545,1573 @@ class VentanaLogin:
                 lbl_estado.config(text="La contraseña debe tener al menos 6 caracteres", fg='red')
                 return
 
-            exito, msj = self.seguridad.verificar_respuesta_seguridad(user, resp)
-            if exito:
-                self.seguridad.restablecer_password(user, n_pass)
-                messagebox.showinfo("Éxito", "Contraseña restablecida correctamente.\nYa puedes iniciar sesión.", parent=vent_rec)
-                vent_rec.destroy()
-            else:
-                lbl_estado.config(text="Respuesta incorrecta", fg='red')
+            def verificar_y_derivar():
+                exito, _ = self.seguridad.verificar_respuesta_seguridad(user, resp)
+                return self.seguridad.hash_password(n_pass) if exito else None
+
+            def al_terminar(nueva_clave):
+                if not vent_rec.winfo_exists():
+                    return
+                barra_rec.pack_forget()
+                btn_restablecer.config(state='normal')
+                if nueva_clave:
+                    self.seguridad.asignar_password(user, *nueva_clave)
+                    messagebox.showinfo("Éxito", "Contraseña restablecida correctamente.\nYa puedes iniciar sesión.", parent=vent_rec)
+                    vent_rec.destroy()
+                else:
+                    lbl_estado.config(text="Respuesta incorrecta", fg='red')
+
+            btn_restablecer.config(state='disabled')
+            lbl_estado.config(text="⏳ Verificando respuesta...", fg='#666')
+            barra_rec.pack(side='bottom', fill='x')
+            self.ejecutar_en_segundo_plano(verificar_y_derivar, al_terminar, barra_rec)
+
+        btn_restablecer = ttk.Button(frame_pasos_siguientes, text="Restablecer Contraseña", command=intentar_restablecer)
+        btn_restablecer.pack(pady=20)
+
+
+class Transaccion:
+    __slots__ = ('id', 'ordinal', 'año', 'mes', 'categoria', 'subcategoria', 'monto', 'proveedor', 'descripcion', 'proveedor_id')
+
+    def __init__(self, fecha, categoria, subcategoria, monto, proveedor='', descripcion='', id_transaccion=None, proveedor_id=''):
+        # El id lo asigna el almacenamiento al registrar el alta y no se reutiliza nunca
+        self.id = id_transaccion
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d')
+        self.ordinal = fecha_obj.toordinal()
+        self.año = fecha_obj.year
+        self.mes = fecha_obj.month
+        # Categorías y proveedores se repiten en miles de filas: se comparte una sola copia de cada texto
+        self.categoria = sys.intern(categoria)
+        self.subcategoria = sys.intern(subcategoria)
+        self.monto = float(monto)
+        self.proveedor = sys.intern(proveedor)
+        self.descripcion = descripcion
+        # Referencia al catálogo; el nombre se conserva para gastos de proveedores que no están dados de alta
+        self.proveedor_id = sys.intern(proveedor_id or '')
+
+    @property
+    def fecha(self):
+        return date.fromordinal(self.ordinal).strftime('%Y-%m-%d')
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(
+            datos['fecha'],
+            datos.get('categoria', ''),
+            datos.get('subcategoria', ''),
+            datos['monto'],
+            datos.get('proveedor', ''),
+            datos.get('descripcion', ''),
+            id_transaccion=datos.get('id'),
+            proveedor_id=datos.get('proveedor_id', '')
+        )
+
+    def a_dict(self):
+        return {
+            'id': self.id,
+            'fecha': self.fecha,
+            'categoria': self.categoria,
+            'subcategoria': self.subcategoria,
+            'monto': self.monto,
+            'proveedor': self.proveedor,
+            'descripcion': self.descripcion,
+            'proveedor_id': self.proveedor_id
+        }
+
+
+class DiarioTransacciones:
+    def __init__(self, archivo_snapshot, archivo_diario, max_entradas=500):
+        self.archivo_snapshot = archivo_snapshot
+        self.archivo_diario = archivo_diario
+        self.max_entradas = max_entradas
+        self.secuencia = 0
+        self.ultimo_id = 0
+        self.entradas_pendientes = 0
+        self.version = VERSION_ESQUEMA
+
+    def cargar(self):
+        transacciones, self.secuencia, self.ultimo_id = [], 0, 0
+        self.version = 0 if os.path.exists(self.archivo_diario) else VERSION_ESQUEMA
+        if os.path.exists(self.archivo_snapshot):
+            with open(self.archivo_snapshot, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            # Formato antiguo: lista plana sin número de secuencia
+            if isinstance(snapshot, list):
+                transacciones = snapshot
+                self.version = 0
+            else:
+                transacciones = snapshot.get('transacciones', [])
+                self.version = snapshot.get('version', 1)
+                self.secuencia = snapshot.get('secuencia', 0)
+                self.ultimo_id = snapshot.get('ultimo_id', 0)
+
+        self.entradas_pendientes = 0
+        if os.path.exists(self.archivo_diario):
+            # Posición de cada id en la lista: bajas y cambios se aplican sin recorrerla
+            posiciones = {t['id']: i for i, t in enumerate(transacciones) if t.get('id')}
+            with open(self.archivo_diario, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        # Línea truncada por un cierre inesperado: se descarta
+                        continue
+                    if entrada['n'] <= self.secuencia:
+                        continue
+                    self.aplicar(transacciones, entrada, posiciones)
+                    self.secuencia = entrada['n']
+                    self.entradas_pendientes += 1
+            # Las bajas dejan un hueco para no desplazar las posiciones; se compacta una sola vez al final
+            transacciones = [t for t in transacciones if t is not None]
+
+        if self.version < VERSION_ESQUEMA:
+            # Historial anterior a los ids: se numeran en orden de registro hasta que se compacte con la versión actual
+            self.ultimo_id = max([self.ultimo_id] + [t['id'] for t in transacciones if t.get('id')])
+            for t in transacciones:
+                if not t.get('id'):
+                    self.ultimo_id += 1
+                    t['id'] = self.ultimo_id
+        return transacciones
+
+    def aplicar(self, transacciones, entrada, posiciones):
+        datos = entrada['datos']
+        if entrada['op'] == 'alta':
+            if datos.get('id'):
+                posiciones[datos['id']] = len(transacciones)
+                self.ultimo_id = max(self.ultimo_id, datos['id'])
+            transacciones.append(datos)
+        elif entrada['op'] == 'baja':
+            if datos.get('id'):
+                posicion = posiciones.pop(datos['id'], None)
+                if posicion is not None:
+                    transacciones[posicion] = None
+                return
+            # Entradas anteriores a los ids: solo se pueden localizar comparando los datos
+            for i, t in enumerate(transacciones):
+                if t is not None and t == datos:
+                    transacciones[i] = None
+                    break
+        elif entrada['op'] == 'cambio':
+            posicion = posiciones.get(datos['id'])
+            if posicion is not None:
+                transacciones[posicion] = datos
+
+    def registrar(self, op, datos):
+        if op == 'alta' and not datos.get('id'):
+            self.ultimo_id += 1
+            datos['id'] = self.ultimo_id
+        self.secuencia += 1
+        linea = json.dumps({'n': self.secuencia, 'op': op, 'datos': datos}, ensure_ascii=False)
+        with open(self.archivo_diario, 'a', encoding='utf-8') as f:
+            f.write(linea + '\n')
+        self.entradas_pendientes += 1
+        return datos.get('id')
+
+    def necesita_compactar(self):
+        return self.entradas_pendientes >= self.max_entradas
+
+    def compactar(self, transacciones):
+        temporal = self.archivo_snapshot + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': VERSION_ESQUEMA,
+                'secuencia': self.secuencia,
+                'ultimo_id': self.ultimo_id,
+                'transacciones': transacciones
+            }, f, ensure_ascii=False)
+        os.replace(temporal, self.archivo_snapshot)
+        # El snapshot ya incluye la secuencia aplicada, así que truncar el diario después es seguro
+        open(self.archivo_diario, 'w', encoding='utf-8').close()
+        self.entradas_pendientes = 0
+        self.version = VERSION_ESQUEMA
+
+
+class LogSegmentado:
+    def __init__(self, directorio, archivo_antiguo=None, max_bytes=256 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.segmento_actual = None
+        self.periodo_actual = None
+        os.makedirs(directorio, exist_ok=True)
+        if archivo_antiguo and os.path.exists(archivo_antiguo):
+            self.importar_antiguo(archivo_antiguo)
+
+    def segmentos(self):
+        return sorted(n for n in os.listdir(self.directorio) if n.startswith('actividades_') and n.endswith('.jsonl'))
+
+    def importar_antiguo(self, archivo_antiguo):
+        # El historial se reparte por mes y por tamaño igual que si se hubiera escrito ya con rotación.
+        # Se importa antes de escribir nada nuevo, así que el escritor sigue después del último segmento del mes.
+        with open(archivo_antiguo, 'r', encoding='utf-8') as f:
+            entradas = json.load(f)
+        numeros = defaultdict(int)
+        archivo, periodo_archivo, tamaño = None, None, 0
+        try:
+            for entrada in entradas:
+                linea = json.dumps(entrada, ensure_ascii=False) + '\n'
+                periodo = entrada['fecha_hora'][:7]
+                if archivo is None or periodo != periodo_archivo or tamaño >= self.max_bytes:
+                    if archivo is not None:
+                        archivo.close()
+                    numeros[periodo] += 1
+                    ruta = os.path.join(self.directorio, f"actividades_{periodo}_{numeros[periodo]:04d}.jsonl")
+                    archivo, periodo_archivo, tamaño = open(ruta, 'w', encoding='utf-8'), periodo, 0
+                archivo.write(linea)
+                tamaño += len(linea.encode('utf-8'))
+        finally:
+            if archivo is not None:
+                archivo.close()
+        os.replace(archivo_antiguo, archivo_antiguo + '.migrado')
+
+    def _ruta_escritura(self):
+        periodo = datetime.now().strftime('%Y-%m')
+        if periodo != self.periodo_actual or self.segmento_actual is None:
+            del_periodo = [n for n in self.segmentos() if n.startswith(f"actividades_{periodo}_")]
+            numero = int(del_periodo[-1][-10:-6]) if del_periodo else 1
+            self.periodo_actual = periodo
+            self.segmento_actual = os.path.join(self.directorio, f"actividades_{periodo}_{max(numero, 1):04d}.jsonl")
+        if os.path.exists(self.segmento_actual) and os.path.getsize(self.segmento_actual) >= self.max_bytes:
+            numero = int(self.segmento_actual[-10:-6]) + 1
+            self.segmento_actual = os.path.join(self.directorio, f"actividades_{periodo}_{numero:04d}.jsonl")
+        return self.segmento_actual
+
+    def agregar(self, entrada):
+        with open(self._ruta_escritura(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+    def leer_recientes(self, usuario=None):
+        # Del segmento más nuevo al más antiguo, según se van pidiendo entradas
+        for nombre in reversed(self.segmentos()):
+            for linea in self.lineas_al_reves(os.path.join(self.directorio, nombre)):
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    continue
+                if usuario is None or entrada.get('usuario') == usuario:
+                    yield entrada
+
+    @staticmethod
+    def lineas_al_reves(ruta, tamaño_bloque=64 * 1024):
+        # Se lee desde el final en bloques fijos, así la primera página no depende del tamaño del segmento.
+        # El archivo se abre solo para cada bloque: entre páginas no queda abierto y limpiar() puede borrarlo.
+        posicion = os.path.getsize(ruta)
+        resto = b''
+        while posicion > 0:
+            leer = min(tamaño_bloque, posicion)
+            posicion -= leer
+            with open(ruta, 'rb') as f:
+                f.seek(posicion)
+                bloque = f.read(leer) + resto
+            lineas = bloque.split(b'\n')
+            resto = lineas.pop(0)
+            for linea in reversed(lineas):
+                if linea.strip():
+                    yield linea.decode('utf-8')
+        if resto.strip():
+            yield resto.decode('utf-8')
+
+    def limpiar(self):
+        for nombre in self.segmentos():
+            os.remove(os.path.join(self.directorio, nombre))
+        self.segmento_actual = None
+
+
+class RegistroAccesos:
+    def __init__(self, archivo, max_lineas=1000):
+        self.archivo = archivo
+        self.max_lineas = max_lineas
+        self.lineas = 0
+
+    def cargar(self):
+        estados, self.lineas = {}, 0
+        if os.path.exists(self.archivo):
+            with open(self.archivo, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        continue
+                    estados[entrada.pop('usuario')] = entrada
+                    self.lineas += 1
+        # Cuando el registro crece demasiado se reduce a una línea por usuario
+        if self.lineas > self.max_lineas:
+            self.compactar(estados)
+        return estados
+
+    def registrar(self, usuario, estado):
+        with open(self.archivo, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(estado, usuario=usuario), ensure_ascii=False) + '\n')
+        self.lineas += 1
+
+    def compactar(self, estados):
+        temporal = self.archivo + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for usuario, estado in estados.items():
+                f.write(json.dumps(dict(estado, usuario=usuario), ensure_ascii=False) + '\n')
+        os.replace(temporal, self.archivo)
+        self.lineas = len(estados)
+
+
+class AlmacenamientoJSON:
+    def __init__(self, archivos=None):
+        self.archivos = archivos or ARCHIVOS_JSON
+        self.diario = DiarioTransacciones(self.archivos['transacciones'], self.archivos['diario_transacciones'])
+        self.log = LogSegmentado(self.archivos['directorio_log'], self.archivos['log_actividades'])
+        self.accesos = RegistroAccesos(self.archivos['accesos_usuarios'])
+
+    def existe(self, coleccion):
+        if coleccion == 'transacciones':
+            return os.path.exists(self.archivos['transacciones']) or os.path.exists(self.archivos['diario_transacciones'])
+        return os.path.exists(self.archivos[coleccion])
+
+    def cargar(self, coleccion, por_defecto):
+        if not os.path.exists(self.archivos[coleccion]):
+            return por_defecto
+        with open(self.archivos[coleccion], 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def guardar(self, coleccion, datos):
+        self.escribir(coleccion, self.serializar(coleccion, datos))
+
+    def serializar(self, coleccion, datos):
+        return json.dumps(datos, ensure_ascii=False, indent=2)
+
+    def escribir(self, coleccion, texto):
+        # Se escribe a un temporal y se renombra para no dejar nunca un archivo a medias
+        temporal = self.archivos[coleccion] + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        os.replace(temporal, self.archivos[coleccion])
+
+    def cargar_transacciones(self):
+        return self.diario.cargar()
+
+    def registrar_transaccion(self, op, datos):
+        return self.diario.registrar(op, datos)
+
+    def necesita_compactar(self):
+        return self.diario.necesita_compactar()
+
+    def version_esquema(self):
+        return self.diario.version
+
+    def compactar(self, transacciones):
+        self.diario.compactar(transacciones)
+
+    def resumen_gastos(self):
+        # Sin motor de consultas: el índice se construye recorriendo las transacciones en memoria
+        return None
+
+    def indice_fechas(self):
+        # Las transacciones se cargan enteras, así que el índice de fechas también vive en memoria
+        return None
+
+    def agregar_actividad(self, entrada):
+        self.log.agregar(entrada)
+
+    def leer_actividades(self, usuario=None):
+        return self.log.leer_recientes(usuario)
+
+    def limpiar_actividades(self):
+        self.log.limpiar()
+
+    def cargar_accesos(self):
+        return self.accesos.cargar()
+
+    def registrar_acceso(self, usuario, estado):
+        self.accesos.registrar(usuario, estado)
+
+
+class AlmacenamientoSQLite:
+    COLUMNAS_TRANSACCION = ('id', 'fecha', 'categoria', 'subcategoria', 'monto', 'proveedor', 'descripcion', 'proveedor_id')
+
+    def __init__(self, ruta=ARCHIVO_BASE_DATOS):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.crear_esquema()
+
+    def crear_esquema(self):
+        with self.lock, self.conexion:
+            self.conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS transacciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha TEXT NOT NULL,
+                    año INTEGER NOT NULL,
+                    mes INTEGER NOT NULL,
+                    categoria TEXT NOT NULL,
+                    subcategoria TEXT NOT NULL DEFAULT '',
+                    monto REAL NOT NULL,
+                    proveedor TEXT NOT NULL DEFAULT '',
+                    descripcion TEXT NOT NULL DEFAULT '',
+                    proveedor_id TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS idx_transacciones_fecha ON transacciones (fecha);
+                CREATE INDEX IF NOT EXISTS idx_transacciones_periodo ON transacciones (año, mes, categoria, subcategoria);
+                CREATE INDEX IF NOT EXISTS idx_transacciones_categoria ON transacciones (categoria);
+                CREATE INDEX IF NOT EXISTS idx_transacciones_proveedor ON transacciones (proveedor);
+                CREATE TABLE IF NOT EXISTS log_actividades (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha_hora TEXT NOT NULL,
+                    usuario TEXT,
+                    rol TEXT,
+                    actividad TEXT,
+                    detalles TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_log_usuario ON log_actividades (usuario);
+                CREATE TABLE IF NOT EXISTS colecciones (
+                    nombre TEXT PRIMARY KEY,
+                    datos TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS accesos_usuarios (
+                    usuario TEXT PRIMARY KEY,
+                    ultimo_acceso TEXT,
+                    intentos_fallidos INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            columnas = {fila[1] for fila in self.conexion.execute("PRAGMA table_info(transacciones)")}
+            if 'proveedor_id' not in columnas:
+                self.conexion.execute("ALTER TABLE transacciones ADD COLUMN proveedor_id TEXT NOT NULL DEFAULT ''")
+            self.conexion.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transacciones_proveedor_id ON transacciones (proveedor_id, año, mes)"
+            )
+            # Las tablas nacieron ya con ids y columnas con valor por defecto: una base nueva está al día
+            if self.conexion.execute("PRAGMA user_version").fetchone()[0] == 0:
+                self.conexion.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+
+    def existe(self, coleccion):
+        with self.lock:
+            if coleccion == 'transacciones':
+                fila = self.conexion.execute("SELECT 1 FROM transacciones LIMIT 1").fetchone()
+            else:
+                fila = self.conexion.execute("SELECT 1 FROM colecciones WHERE nombre = ?", (coleccion,)).fetchone()
+        return fila is not None
+
+    def cargar(self, coleccion, por_defecto):
+        with self.lock:
+            fila = self.conexion.execute("SELECT datos FROM colecciones WHERE nombre = ?", (coleccion,)).fetchone()
+        return json.loads(fila[0]) if fila else por_defecto
+
+    def guardar(self, coleccion, datos):
+        self.escribir(coleccion, self.serializar(coleccion, datos))
+
+    def serializar(self, coleccion, datos):
+        return json.dumps(datos, ensure_ascii=False)
+
+    def escribir(self, coleccion, texto):
+        with self.lock, self.conexion:
+            self.conexion.execute("INSERT OR REPLACE INTO colecciones (nombre, datos) VALUES (?, ?)", (coleccion, texto))
+
+    def cargar_transacciones(self):
+        # Lectura completa: solo para la migración única del esquema; el registro lee por tramos (IndiceFechasSQLite)
+        with self.lock:
+            filas = self.conexion.execute(
+                "SELECT id, fecha, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id FROM transacciones ORDER BY id"
+            ).fetchall()
+        return [dict(zip(self.COLUMNAS_TRANSACCION, fila)) for fila in filas]
+
+    def indice_fechas(self):
+        return IndiceFechasSQLite(self)
+
+    def _filtro_fechas(self, desde=None, hasta=None):
+        if desde is not None and hasta is not None:
+            return "WHERE fecha BETWEEN ? AND ?", (desde, hasta)
+        if desde is not None:
+            return "WHERE fecha >= ?", (desde,)
+        if hasta is not None:
+            return "WHERE fecha <= ?", (hasta,)
+        return "", ()
+
+    def contar_transacciones(self, desde=None, hasta=None):
+        filtro, parametros = self._filtro_fechas(desde, hasta)
+        with self.lock:
+            return self.conexion.execute(f"SELECT COUNT(*) FROM transacciones {filtro}", parametros).fetchone()[0]
+
+    def leer_transacciones(self, inicio=0, cantidad=-1, desde=None, hasta=None):
+        # Mismo orden que IndiceFechas: de la más reciente a la más antigua y, a igual fecha, por orden de registro
+        filtro, parametros = self._filtro_fechas(desde, hasta)
+        with self.lock:
+            filas = self.conexion.execute(
+                "SELECT id, fecha, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id FROM transacciones "
+                f"{filtro} ORDER BY fecha DESC, id LIMIT ? OFFSET ?",
+                parametros + (cantidad, inicio)
+            ).fetchall()
+        return [dict(zip(self.COLUMNAS_TRANSACCION, fila)) for fila in filas]
+
+    def posicion_transaccion(self, fecha, id_transaccion):
+        with self.lock:
+            return self.conexion.execute(
+                "SELECT (SELECT COUNT(*) FROM transacciones WHERE fecha > ?) + "
+                "(SELECT COUNT(*) FROM transacciones WHERE fecha = ? AND id < ?)",
+                (fecha, fecha, id_transaccion)
+            ).fetchone()[0]
+
+    def leer_transaccion(self, id_transaccion):
+        with self.lock:
+            fila = self.conexion.execute(
+                "SELECT id, fecha, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id FROM transacciones WHERE id = ?",
+                (id_transaccion,)
+            ).fetchone()
+        return dict(zip(self.COLUMNAS_TRANSACCION, fila)) if fila else None
+
+    def transacciones_sin_vincular(self):
+        with self.lock:
+            filas = self.conexion.execute(
+                "SELECT id, fecha, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id FROM transacciones "
+                "WHERE proveedor != '' AND proveedor_id = ''"
+            ).fetchall()
+        return [dict(zip(self.COLUMNAS_TRANSACCION, fila)) for fila in filas]
+
+    def _valores_transaccion(self, datos):
+        fecha = datetime.strptime(datos['fecha'], '%Y-%m-%d')
+        return (
+            datos.get('id'), datos['fecha'], fecha.year, fecha.month, datos.get('categoria', ''), datos.get('subcategoria', ''),
+            datos['monto'], datos.get('proveedor', ''), datos.get('descripcion', ''), datos.get('proveedor_id', '')
+        )
+
+    def registrar_transaccion(self, op, datos):
+        with self.lock, self.conexion:
+            if op == 'alta':
+                cursor = self.conexion.execute(
+                    "INSERT INTO transacciones (id, fecha, año, mes, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._valores_transaccion(datos)
+                )
+                return cursor.lastrowid
+            elif op == 'baja':
+                self.conexion.execute("DELETE FROM transacciones WHERE id = ?", (datos['id'],))
+            elif op == 'cambio':
+                valores = self._valores_transaccion(datos)
+                self.conexion.execute(
+                    "UPDATE transacciones SET fecha = ?, año = ?, mes = ?, categoria = ?, subcategoria = ?, monto = ?, "
+                    "proveedor = ?, descripcion = ?, proveedor_id = ? WHERE id = ?",
+                    valores[1:] + valores[:1]
+                )
+
+    def necesita_compactar(self):
+        return False
+
+    def version_esquema(self):
+        with self.lock:
+            return self.conexion.execute("PRAGMA user_version").fetchone()[0]
+
+    def compactar(self, transacciones):
+        with self.lock, self.conexion:
+            self.conexion.execute("DELETE FROM transacciones")
+            self.conexion.executemany(
+                "INSERT INTO transacciones (id, fecha, año, mes, categoria, subcategoria, monto, proveedor, descripcion, proveedor_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._valores_transaccion(t) for t in transacciones]
+            )
+            self.conexion.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+
+    def resumen_gastos(self):
+        with self.lock:
+            return self.conexion.execute(
+                "SELECT año, mes, categoria, subcategoria, SUM(monto) FROM transacciones "
+                "GROUP BY año, mes, categoria, subcategoria"
+            ).fetchall()
+
+    def resumen_proveedores(self):
+        with self.lock:
+            return self.conexion.execute(
+                "SELECT proveedor_id, año, mes, categoria, SUM(monto) FROM transacciones "
+                "GROUP BY proveedor_id, año, mes, categoria"
+            ).fetchall()
+
+    def agregar_actividad(self, entrada):
+        with self.lock, self.conexion:
+            self.conexion.execute(
+                "INSERT INTO log_actividades (fecha_hora, usuario, rol, actividad, detalles) VALUES (?, ?, ?, ?, ?)",
+                (entrada['fecha_hora'], entrada['usuario'], entrada['rol'], entrada['actividad'], entrada['detalles'])
+            )
+
+    def leer_actividades(self, usuario=None):
+        # Lectura por bloques usando el id como cursor, sin retener el lock entre páginas
+        ultimo_id = None
+        while True:
+            condiciones, parametros = [], []
+            if ultimo_id is not None:
+                condiciones.append("id < ?")
+                parametros.append(ultimo_id)
+            if usuario is not None:
+                condiciones.append("usuario = ?")
+                parametros.append(usuario)
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+            with self.lock:
+                filas = self.conexion.execute(
+                    f"SELECT id, fecha_hora, usuario, rol, actividad, detalles FROM log_actividades {where} "
+                    f"ORDER BY id DESC LIMIT {TAMAÑO_PAGINA_LOG}",
+                    parametros
+                ).fetchall()
+            if not filas:
+                return
+            for fila in filas:
+                yield {'fecha_hora': fila[1], 'usuario': fila[2], 'rol': fila[3], 'actividad': fila[4], 'detalles': fila[5]}
+            ultimo_id = filas[-1][0]
+
+    def limpiar_actividades(self):
+        with self.lock, self.conexion:
+            self.conexion.execute("DELETE FROM log_actividades")
+
+    def cargar_accesos(self):
+        with self.lock:
+            filas = self.conexion.execute("SELECT usuario, ultimo_acceso, intentos_fallidos FROM accesos_usuarios").fetchall()
+        return {usuario: {'ultimo_acceso': ultimo, 'intentos_fallidos': intentos} for usuario, ultimo, intentos in filas}
+
+    def registrar_acceso(self, usuario, estado):
+        with self.lock, self.conexion:
+            self.conexion.execute(
+                "INSERT OR REPLACE INTO accesos_usuarios (usuario, ultimo_acceso, intentos_fallidos) VALUES (?, ?, ?)",
+                (usuario, estado['ultimo_acceso'], estado['intentos_fallidos'])
+            )
+
+
+class EscritorSegundoPlano:
+    def __init__(self, almacenamiento, espera=ESPERA_ESCRITURA_SEGUNDOS):
+        self.almacenamiento = almacenamiento
+        self.espera = espera
+        self.pendientes = {}
+        self.ultimo_cambio = 0
+        self.escribiendo = False
+        self.forzar = False
+        self.detenido = False
+        self.ultimo_error = None
+        self.condicion = threading.Condition()
+        self.hilo = threading.Thread(target=self._trabajar, name="EscritorSegundoPlano", daemon=True)
+        self.hilo.start()
+
+    def encolar(self, coleccion, datos):
+        # Se serializa en el hilo que llama: el escritor solo recibe texto, que la interfaz ya no puede modificar
+        texto = self.almacenamiento.serializar(coleccion, datos)
+        if self.detenido:
+            self.almacenamiento.escribir(coleccion, texto)
+            return
+        with self.condicion:
+            # Una ráfaga de cambios sobre la misma colección se queda solo con la última versión
+            self.pendientes[coleccion] = texto
+            self.ultimo_cambio = time.monotonic()
+            self.condicion.notify_all()
+
+    def _trabajar(self):
+        while True:
+            with self.condicion:
+                while not self.pendientes and not self.detenido:
+                    self.condicion.wait()
+                if not self.pendientes:
+                    return
+                while not self.forzar and not self.detenido:
+                    restante = self.ultimo_cambio + self.espera - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.condicion.wait(restante)
+                lote, self.pendientes = self.pendientes, {}
+                self.escribiendo = True
+
+            for coleccion, texto in lote.items():
+                try:
+                    self.almacenamiento.escribir(coleccion, texto)
+                except Exception as e:
+                    self.ultimo_error = f"{coleccion}: {e}"
+
+            with self.condicion:
+                self.escribiendo = False
+                self.condicion.notify_all()
+
+    def vaciar(self):
+        with self.condicion:
+            self.forzar = True
+            self.condicion.notify_all()
+            while (self.pendientes or self.escribiendo) and self.hilo.is_alive():
+                self.condicion.wait()
+            self.forzar = False
+
+    def detener(self):
+        if self.detenido:
+            return
+        self.vaciar()
+        with self.condicion:
+            self.detenido = True
+            self.condicion.notify_all()
+        self.hilo.join()
+
+    def tomar_error(self):
+        error, self.ultimo_error = self.ultimo_error, None
+        return error
+
+
+def crear_almacenamiento():
+    if os.path.exists(ARCHIVO_BASE_DATOS):
+        return AlmacenamientoSQLite(ARCHIVO_BASE_DATOS)
+    return AlmacenamientoJSON()
+
+
+def migrar_json_a_sqlite(ruta=ARCHIVO_BASE_DATOS, archivos=None):
+    origen = AlmacenamientoJSON(archivos)
+    destino = AlmacenamientoSQLite(ruta)
+    transacciones = [Transaccion.desde_dict(t) for t in origen.cargar_transacciones()]
+    vincular_proveedores(transacciones, origen.cargar('proveedores', {}))
+    transacciones = [t.a_dict() for t in transacciones]
+    destino.compactar(transacciones)
+    for coleccion in ('presupuesto_mensual', 'secuencias', 'proveedores', 'presupuestos_anuales', 'sobrantes_anuales',
+                      'categorias_personalizadas', 'usuarios', 'parametros_hash'):
+        if origen.existe(coleccion):
+            destino.guardar(coleccion, origen.cargar(coleccion, None))
+    for entrada in reversed(list(origen.leer_actividades())):
+        destino.agregar_actividad(entrada)
+    for usuario, estado in origen.cargar_accesos().items():
+        destino.registrar_acceso(usuario, estado)
+    return len(transacciones)
+
+
+class CatalogoCategorias:
+    # Categorías predefinidas más las del usuario. Las personalizadas sustituyen por completo a la predefinida
+    # del mismo nombre (así se guardan las altas y bajas de subcategorías). La vista combinada se mantiene
+    # ordenada cambio a cambio, y cada cambio se notifica a las vistas suscritas con la categoría afectada.
+    def __init__(self, predefinidas, personalizadas=None):
+        self.predefinidas = predefinidas
+        self.personalizadas = personalizadas if personalizadas is not None else {}
+        self.version = 0
+        self.orden = []
+        self.combinada = {}
+        self.suscriptores = {}
+        self.versiones_vistas = {}
+        self._combinar()
+
+    def _combinar(self):
+        combinada = {**self.predefinidas, **self.personalizadas}
+        self.orden = sorted(combinada)
+        self.combinada = {cat: sorted(combinada[cat]) for cat in self.orden}
+
+    def cargar(self, personalizadas):
+        self.personalizadas = personalizadas
+        self._combinar()
+        self.cambiado()
+
+    def suscribir(self, vista, funcion, cambio=None):
+        # La vista se suscribe ya pintada con el estado actual. `funcion` la repinta entera y devuelve True si lo
+        # logró; `cambio(categoria, solo_subcategorias)` aplica un único cambio tocando solo esa categoría.
+        self.suscriptores[vista] = (funcion, cambio)
+        self.versiones_vistas[vista] = self.version
+
+    def vista_al_dia(self, vista):
+        return self.versiones_vistas.get(vista) == self.version
+
+    def refrescar(self, vista, forzar=False):
+        # Sin cambios desde el último repintado no se hace nada, salvo que lo pida el usuario con un botón.
+        # La versión se anota solo cuando el repintado terminó bien; si no, el próximo refresco lo reintenta.
+        if not forzar and self.vista_al_dia(vista):
+            return False
+        if self.suscriptores[vista][0]():
+            self.versiones_vistas[vista] = self.version
+            return True
+        return False
+
+    def cambiado(self, categoria=None, solo_subcategorias=False):
+        # `categoria` None es una recarga completa; solo_subcategorias indica que la categoría sigue existiendo
+        self.version += 1
+        for vista, (funcion, cambio) in list(self.suscriptores.items()):
+            if categoria is not None and cambio is not None and self.versiones_vistas.get(vista) == self.version - 1:
+                cambio(categoria, solo_subcategorias)
+                self.versiones_vistas[vista] = self.version
+            else:
+                self.refrescar(vista)
+
+    def vista(self):
+        return {cat: self.combinada[cat] for cat in self.orden}
+
+    def categorias(self):
+        return list(self.orden)
+
+    def subcategorias(self, categoria):
+        return self.combinada.get(categoria, [])
+
+    def siguiente(self, categoria):
+        # La categoría que va justo después en el orden alfabético, para insertar una fila nueva en su sitio
+        posicion = bisect_right(self.orden, categoria)
+        return self.orden[posicion] if posicion < len(self.orden) else None
+
+    def __contains__(self, categoria):
+        return categoria in self.combinada
+
+    def tipo(self, categoria):
+        if categoria not in self.predefinidas:
+            return "PERSONALIZADA"
+        return "PREDEFINIDA" if categoria not in self.personalizadas else "MIXTA"
+
+    def _editable(self, categoria):
+        # Al modificar una predefinida se guarda una copia completa en las personalizadas
+        if categoria not in self.personalizadas:
+            self.personalizadas[categoria] = list(self.predefinidas[categoria])
+        return self.personalizadas[categoria]
+
+    def agregar_categoria(self, nombre):
+        if nombre in self:
+            raise ValueError("Ya existe")
+        self.personalizadas[nombre] = []
+        insort(self.orden, nombre)
+        self.combinada[nombre] = []
+        self.cambiado(nombre)
+
+    def agregar_subcategoria(self, categoria, subcategoria):
+        if categoria not in self:
+            raise ValueError(f"La categoría '{categoria}' no existe")
+        if subcategoria in self.subcategorias(categoria):
+            raise ValueError("Ya existe")
+        self._editable(categoria).append(subcategoria)
+        insort(self.combinada[categoria], subcategoria)
+        self.cambiado(categoria, solo_subcategorias=True)
+
+    def eliminar_categoria(self, categoria):
+        if categoria not in self.personalizadas:
+            raise ValueError("No se pueden eliminar categorías predefinidas")
+        del self.personalizadas[categoria]
+        if categoria in self.predefinidas:
+            # Una categoría mixta vuelve a sus subcategorías predefinidas
+            self.combinada[categoria] = sorted(self.predefinidas[categoria])
+            self.cambiado(categoria, solo_subcategorias=True)
+        else:
+            del self.orden[bisect_left(self.orden, categoria)]
+            del self.combinada[categoria]
+            self.cambiado(categoria)
+
+    def eliminar_subcategoria(self, categoria, subcategoria):
+        if subcategoria not in self.subcategorias(categoria):
+            return False
+        self._editable(categoria).remove(subcategoria)
+        self.combinada[categoria].remove(subcategoria)
+        self.cambiado(categoria, solo_subcategorias=True)
+        return True
+
+
+class IndiceGastos:
+    def __init__(self):
+        self.por_subcategoria = defaultdict(float)
+        self.por_categoria = defaultdict(float)
+        self.por_mes = defaultdict(float)
+        self.por_año = defaultdict(float)
+
+    def reconstruir(self, transacciones):
+        for tabla in (self.por_subcategoria, self.por_categoria, self.por_mes, self.por_año):
+            tabla.clear()
+        for t in transacciones:
+            self.agregar(t)
+
+    def cargar_resumen(self, filas):
+        for tabla in (self.por_subcategoria, self.por_categoria, self.por_mes, self.por_año):
+            tabla.clear()
+        for año, mes, categoria, subcategoria, total in filas:
+            self.por_subcategoria[(año, mes, categoria, subcategoria)] += total
+            self.por_categoria[(año, mes, categoria)] += total
+            self.por_mes[(año, mes)] += total
+            self.por_año[año] += total
+
+    def agregar(self, t):
+        self._acumular(t, 1)
+
+    def quitar(self, t):
+        self._acumular(t, -1)
+
+    def _acumular(self, t, signo):
+        año, mes, categoria = t.año, t.mes, t.categoria
+        monto = signo * t.monto
+        claves = (
+            (self.por_subcategoria, (año, mes, categoria, t.subcategoria)),
+            (self.por_categoria, (año, mes, categoria)),
+            (self.por_mes, (año, mes)),
+            (self.por_año, año)
+        )
+        for tabla, clave in claves:
+            tabla[clave] += monto
+            # Al quitar, se descartan los residuos de coma flotante para no acumular claves vacías
+            if signo < 0 and abs(tabla[clave]) < 1e-9:
+                del tabla[clave]
+
+    def gastado(self, año, mes=None, categoria=None, subcategoria=None):
+        if mes is None:
+            return self.por_año.get(año, 0)
+        if categoria is None:
+            return self.por_mes.get((año, mes), 0)
+        if subcategoria is None:
+            return self.por_categoria.get((año, mes, categoria), 0)
+        return self.por_subcategoria.get((año, mes, categoria, subcategoria), 0)
+
+    def años(self):
+        return sorted(self.por_año)
+
+    def gastado_por_categoria(self, año, mes, categorias):
+        return {c: self.por_categoria.get((año, mes, c), 0) for c in categorias}
+
+    def gastado_por_año(self, años):
+        return {a: self.por_año.get(a, 0) for a in años}
+
+    def serie_categorias(self, año, mes, categorias):
+        # numpy llega con matplotlib; como ella, solo se importa al preparar datos para gráficos
+        import numpy as np
+        return np.fromiter((self.por_categoria.get((año, mes, c), 0) for c in categorias), dtype=float, count=len(categorias))
+
+    def serie_mensual(self, año, mes, meses=6):
+        # Los `meses` anteriores a (año, mes), cruzando al año previo cuando hace falta
+        import numpy as np
+        periodos = []
+        for i in range(meses, 0, -1):
+            indice = año * 12 + (mes - 1) - i
+            periodos.append((indice // 12, indice % 12 + 1))
+        return periodos, np.fromiter((self.por_mes.get(p, 0) for p in periodos), dtype=float, count=meses)
+
+
+class ResumenProveedores:
+    # Gasto acumulado por proveedor: por mes, por año y por categoría. Las claves son ids del catálogo;
+    # los gastos sin proveedor registrado se agrupan bajo ''. Los que solo traen el nombre de un proveedor
+    # que aún no está en el catálogo esperan en sin_vincular hasta que se dé de alta.
+    def __init__(self):
+        self.por_mes = defaultdict(float)
+        self.por_año = defaultdict(lambda: defaultdict(float))
+        self.por_categoria = defaultdict(lambda: defaultdict(float))
+        self.sin_vincular = defaultdict(dict)
+
+    def reconstruir(self, transacciones):
+        for tabla in (self.por_mes, self.por_año, self.por_categoria, self.sin_vincular):
+            tabla.clear()
+        for t in transacciones:
+            self.agregar(t)
+
+    def cargar_resumen(self, filas, sin_vincular):
+        # Totales ya agrupados por la base (proveedor_id, año, mes, categoría, monto) y las filas aún sin proveedor
+        for tabla in (self.por_mes, self.por_año, self.por_categoria, self.sin_vincular):
+            tabla.clear()
+        for prov_id, año, mes, categoria, monto in filas:
+            self.por_mes[(prov_id, año, mes)] += monto
+            self.por_año[año][prov_id] += monto
+            self.por_categoria[(prov_id, año)][categoria] += monto
+        for t in sin_vincular:
+            self.sin_vincular[normalizar_nombre(t.proveedor)][t.id] = t
+
+    def agregar(self, t):
+        self._acumular(t, 1)
+        if t.proveedor and not t.proveedor_id:
+            self.sin_vincular[normalizar_nombre(t.proveedor)][t.id] = t
+
+    def quitar(self, t):
+        self._acumular(t, -1)
+        if t.proveedor and not t.proveedor_id:
+            nombre = normalizar_nombre(t.proveedor)
+            self.sin_vincular[nombre].pop(t.id, None)
+            if not self.sin_vincular[nombre]:
+                del self.sin_vincular[nombre]
+
+    def vincular(self, prov_id, nombre):
+        # Pasa al proveedor recién dado de alta los gastos que traían su nombre (ya normalizado)
+        pendientes = self.sin_vincular.pop(nombre, {})
+        for t in pendientes.values():
+            self._acumular(t, -1)
+            t.proveedor_id = sys.intern(prov_id)
+            self._acumular(t, 1)
+        return list(pendientes.values())
+
+    def _acumular(self, t, signo):
+        prov_id, año = t.proveedor_id, t.año
+        monto = signo * t.monto
+        claves = (
+            (self.por_mes, (prov_id, año, t.mes)),
+            (self.por_año[año], prov_id),
+            (self.por_categoria[(prov_id, año)], t.categoria)
+        )
+        for tabla, clave in claves:
+            tabla[clave] += monto
+            if signo < 0 and abs(tabla[clave]) < 1e-9:
+                del tabla[clave]
+
+    def gastado(self, prov_id, año, mes=None):
+        if mes is None:
+            return self.por_año.get(año, {}).get(prov_id, 0)
+        return self.por_mes.get((prov_id, año, mes), 0)
+
+    def principales(self, año, cantidad=None):
+        totales = sorted(self.por_año.get(año, {}).items(), key=lambda par: par[1], reverse=True)
+        return totales if cantidad is None else totales[:cantidad]
+
+    def categorias(self, prov_id, año):
+        return sorted(self.por_categoria.get((prov_id, año), {}).items(), key=lambda par: par[1], reverse=True)
+
+    def mensual(self, prov_id, año):
+        return [self.por_mes.get((prov_id, año, mes), 0) for mes in range(1, 13)]
+
+
+class IndiceFechas:
+    # Transacciones ordenadas de la más reciente a la más antigua; a igual fecha se respeta el orden de registro
+    def __init__(self):
+        self.transacciones = []
+        self.claves = []
+
+    def reconstruir(self, transacciones):
+        self.transacciones = sorted(transacciones, key=lambda t: t.ordinal, reverse=True)
+        self.claves = [-t.ordinal for t in self.transacciones]
+
+    def agregar(self, t):
+        posicion = bisect_right(self.claves, -t.ordinal)
+        self.claves.insert(posicion, -t.ordinal)
+        self.transacciones.insert(posicion, t)
+        return posicion
+
+    def quitar(self, t):
+        posicion = self.posicion(t)
+        del self.claves[posicion]
+        del self.transacciones[posicion]
+        return posicion
+
+    def posicion(self, t):
+        posicion = bisect_left(self.claves, -t.ordinal)
+        while self.transacciones[posicion] is not t:
+            posicion += 1
+        return posicion
+
+    def limites(self, desde=None, hasta=None):
+        inicio = 0 if hasta is None else bisect_left(self.claves, -self._ordinal(hasta))
+        fin = len(self.claves) if desde is None else bisect_right(self.claves, -self._ordinal(desde))
+        return inicio, max(inicio, fin)
+
+    def limites_periodo(self, año, mes=None):
+        # Un mes o un año naturales completos
+        if mes is None:
+            return self.limites(date(año, 1, 1), date(año, 12, 31))
+        return self.limites(date(año, mes, 1), date(año, mes, calendar.monthrange(año, mes)[1]))
+
+    @staticmethod
+    def _ordinal(fecha):
+        if isinstance(fecha, str):
+            fecha = datetime.strptime(fecha, '%Y-%m-%d')
+        return fecha.toordinal()
+
+    def __len__(self):
+        return len(self.transacciones)
+
+    def __getitem__(self, indice):
+        return self.transacciones[indice]
+
+    def __iter__(self):
+        return iter(self.transacciones)
+
+
+class IndiceFechasSQLite:
+    # Misma interfaz y mismo orden que IndiceFechas, pero las transacciones se quedan en la base: cada tramo se lee
+    # con LIMIT/OFFSET sobre idx_transacciones_fecha y las posiciones y límites se obtienen contando filas.
+    # En memoria solo se guarda el total.
+    def __init__(self, almacenamiento):
+        self.almacenamiento = almacenamiento
+        self.total = 0
+
+    def reconstruir(self, transacciones=None):
+        self.total = self.almacenamiento.contar_transacciones()
+
+    def agregar(self, t):
+        # La transacción ya se insertó en la base
+        self.total += 1
+        return self.posicion(t)
+
+    def quitar(self, t):
+        # Ya se borró de la base; las que la precedían siguen siendo las mismas
+        self.total -= 1
+        return self.posicion(t)
+
+    def posicion(self, t):
+        return self.almacenamiento.posicion_transaccion(t.fecha, t.id)
+
+    def limites(self, desde=None, hasta=None):
+        desde, hasta = self._texto(desde), self._texto(hasta)
+        inicio = 0 if hasta is None else self.total - self.almacenamiento.contar_transacciones(hasta=hasta)
+        return inicio, inicio + self.almacenamiento.contar_transacciones(desde, hasta)
+
+    def limites_periodo(self, año, mes=None):
+        if mes is None:
+            return self.limites(date(año, 1, 1), date(año, 12, 31))
+        return self.limites(date(año, mes, 1), date(año, mes, calendar.monthrange(año, mes)[1]))
+
+    @staticmethod
+    def _texto(fecha):
+        if fecha is None or isinstance(fecha, str):
+            return fecha
+        return fecha.strftime('%Y-%m-%d')
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            if indice < 0:
+                indice += self.total
+            if not 0 <= indice < self.total:
+                raise IndexError(indice)
+            return self[indice:indice + 1][0]
+        inicio, fin, _ = indice.indices(self.total)
+        return [Transaccion.desde_dict(d) for d in self.almacenamiento.leer_transacciones(inicio, max(fin - inicio, 0))]
+
+    def __iter__(self):
+        for inicio in range(0, self.total, TAMAÑO_BLOQUE_GASTOS):
+            yield from self[inicio:inicio + TAMAÑO_BLOQUE_GASTOS]
+
+
+def normalizar_nombre(texto):
+    # Sin mayúsculas, acentos ni espacios repetidos: "  Agro  Insumos Núñez" y "agro insumos nunez" son el mismo
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    return ' '.join(''.join(c for c in descompuesto if not unicodedata.combining(c)).split())
+
+
+def vincular_proveedores(transacciones, proveedores):
+    # Migración al esquema 3: los gastos guardados solo con el nombre se enlazan al id del catálogo.
+    # Con nombres repetidos gana el primero, igual que en IndiceProveedores.
+    ids = {}
+    for prov_id, prov in proveedores.items():
+        ids.setdefault(normalizar_nombre(prov['nombre']), prov_id)
+    vinculados = 0
+    for t in transacciones:
+        if t.proveedor and not t.proveedor_id:
+            prov_id = ids.get(normalizar_nombre(t.proveedor))
+            if prov_id is not None:
+                t.proveedor_id = sys.intern(prov_id)
+                vinculados += 1
+    return vinculados
+
+
+class IndiceProveedores:
+    # Nombre normalizado -> id, trigramas y palabras ordenadas para la búsqueda por subcadena o prefijo,
+    # y los índices invertidos categoría/subcategoría -> ids de proveedor.
+    def __init__(self):
+        self.por_nombre = {}
+        self.nombres = {}
+        self.trigramas = defaultdict(set)
+        self.palabras = []
+        self.por_categoria = defaultdict(set)
+        self.por_subcategoria = defaultdict(set)
+        self.categorias = {}
+
+    def reconstruir(self, proveedores):
+        for tabla in (self.por_nombre, self.nombres, self.trigramas, self.palabras, self.por_categoria,
+                      self.por_subcategoria, self.categorias):
+            tabla.clear()
+        for prov_id, prov in proveedores.items():
+            self.agregar(prov_id, prov, carga_inicial=True)
+        self.palabras.sort()
+
+    @staticmethod
+    def trigramas_de(nombre):
+        return {nombre[i:i + 3] for i in range(len(nombre) - 2)}
+
+    def agregar(self, prov_id, prov, carga_inicial=False):
+        # Restricción de nombre único; en la carga inicial se toleran duplicados heredados y el índice guarda el primero
+        nombre = normalizar_nombre(prov['nombre'])
+        existente = self.por_nombre.get(nombre)
+        if existente is not None and existente != prov_id and not carga_inicial:
+            raise ValueError(f"Ya existe un proveedor con el nombre '{prov['nombre']}'")
+        if prov_id in self.nombres:
+            self.quitar(prov_id)
+        self.por_nombre.setdefault(nombre, prov_id)
+        self.nombres[prov_id] = nombre
+        for trigrama in self.trigramas_de(nombre):
+            self.trigramas[trigrama].add(prov_id)
+        for palabra in set(nombre.split()):
+            if carga_inicial:
+                self.palabras.append((palabra, prov_id))
+            else:
+                insort(self.palabras, (palabra, prov_id))
+        categorias = {cat: list(subcats) for cat, subcats in prov.get('categorias', {}).items()}
+        for cat, subcats in categorias.items():
+            self.por_categoria[cat].add(prov_id)
+            for subcat in subcats:
+                self.por_subcategoria[(cat, subcat)].add(prov_id)
+        self.categorias[prov_id] = categorias
+
+    def quitar(self, prov_id):
+        nombre = self.nombres.pop(prov_id, None)
+        if nombre is None:
+            return
+        if self.por_nombre.get(nombre) == prov_id:
+            del self.por_nombre[nombre]
+        for trigrama in self.trigramas_de(nombre):
+            self.trigramas[trigrama].discard(prov_id)
+            if not self.trigramas[trigrama]:
+                del self.trigramas[trigrama]
+        for palabra in set(nombre.split()):
+            pos = bisect_left(self.palabras, (palabra, prov_id))
+            del self.palabras[pos]
+        for cat, subcats in self.categorias.pop(prov_id).items():
+            self.por_categoria[cat].discard(prov_id)
+            for subcat in subcats:
+                self.por_subcategoria[(cat, subcat)].discard(prov_id)
+
+    def id_por_nombre(self, nombre):
+        return self.por_nombre.get(normalizar_nombre(nombre))
+
+    def con_prefijo(self, prefijo):
+        inicio = bisect_left(self.palabras, (prefijo,))
+        fin = bisect_left(self.palabras, (prefijo + '\uffff',))
+        return {prov_id for _, prov_id in self.palabras[inicio:fin]}
+
+    def buscar(self, termino='', categoria=None, subcategoria=None):
+        termino = normalizar_nombre(termino)
+        if subcategoria is not None:
+            ids = set(self.por_subcategoria.get((categoria, subcategoria), ()))
+        elif categoria is not None:
+            ids = set(self.por_categoria.get(categoria, ()))
+        else:
+            ids = None
+        if len(termino) >= 3:
+            # Se cruzan los conjuntos de trigramas empezando por el más pequeño y se confirma la subcadena
+            conjuntos = sorted((self.trigramas.get(t, set()) for t in self.trigramas_de(termino)), key=len)
+            candidatos = set(conjuntos[0])
+            for conjunto in conjuntos[1:]:
+                candidatos &= conjunto
+            candidatos = {prov_id for prov_id in candidatos if termino in self.nombres[prov_id]}
+            ids = candidatos if ids is None else ids & candidatos
+        elif termino:
+            candidatos = self.con_prefijo(termino)
+            ids = candidatos if ids is None else ids & candidatos
+        elif ids is None:
+            ids = set(self.nombres)
+        return sorted(ids, key=self.nombres.__getitem__)
+
+    def nombres_en_categoria(self, proveedores, categoria):
+        return sorted((proveedores[prov_id]['nombre'] for prov_id in self.por_categoria.get(categoria, ())), key=normalizar_nombre)
+
+
+class TablaGastos:
+    # Agregado columnar de las transacciones: arrays de numpy y textos codificados con diccionario. Cuando numpy
+    # está instalado sustituye a IndiceGastos, con la misma interfaz (agregar, quitar, gastado, gastado_por_categoria,
+    # gastado_por_año, serie_categorias, serie_mensual), y además permite agrupar por cualquier columna de texto, mes o año.
+    # Las filas guardan el orden del índice de fechas al revés (de la más antigua a la más reciente): un mes
+    # o un año es un tramo contiguo que el índice localiza por bisección, sin recorrer la tabla entera.
+    COLUMNAS_TEXTO = ('categoria', 'subcategoria', 'proveedor')
+
+    def __init__(self, indice_fechas, capacidad=1024):
+        import numpy as np
+        self.indice_fechas = indice_fechas
+        self.n = 0
+        self.columnas = {
+            'periodo': np.empty(capacidad, dtype=np.int32),
+            'monto': np.empty(capacidad, dtype=np.float64),
+        }
+        for columna in self.COLUMNAS_TEXTO:
+            self.columnas[columna] = np.empty(capacidad, dtype=np.int32)
+        self.codigos = {columna: {} for columna in self.COLUMNAS_TEXTO}
+        self.textos = {columna: [] for columna in self.COLUMNAS_TEXTO}
+
+    def reconstruir(self):
+        # Carga masiva: una pasada por columna con np.fromiter en lugar de una asignación por celda
+        import numpy as np
+        transacciones = self.indice_fechas.transacciones[::-1]
+        self.n = len(transacciones)
+        for columna in self.COLUMNAS_TEXTO:
+            self.codigos[columna].clear()
+            self.textos[columna].clear()
+        valores = {
+            'periodo': (t.año * 12 + t.mes - 1 for t in transacciones),
+            'monto': (t.monto for t in transacciones),
+        }
+        for columna in self.COLUMNAS_TEXTO:
+            valores[columna] = [self.codificar(columna, getattr(t, columna)) for t in transacciones]
+        capacidad = max(self.n, 1024)
+        for nombre, generador in valores.items():
+            columna = np.empty(capacidad, dtype=self.columnas[nombre].dtype)
+            columna[:self.n] = np.fromiter(generador, dtype=columna.dtype, count=self.n)
+            self.columnas[nombre] = columna
+
+    def codificar(self, columna, texto):
+        codigo = self.codigos[columna].get(texto)
+        if codigo is None:
+            codigo = self.codigos[columna][texto] = len(self.textos[columna])
+            self.textos[columna].append(texto)
+        return codigo
+
+    def agregar(self, t):
+        # Se llama después de IndiceFechas.agregar; los gastos nuevos suelen caer al final de la tabla
+        self.insertar(self.indice_fechas.posicion(t), t)
+
+    def quitar(self, t):
+        # Se llama antes de IndiceFechas.quitar, mientras la transacción sigue en el índice
+        self.suprimir(self.indice_fechas.posicion(t))
+
+    def insertar(self, posicion, t):
+        import numpy as np
+        if self.n == len(self.columnas['monto']):
+            for nombre, columna in self.columnas.items():
+                nueva = np.empty(len(columna) * 2, dtype=columna.dtype)
+                nueva[:self.n] = columna[:self.n]
+                self.columnas[nombre] = nueva
+        fila = self.n - posicion
+        valores = {'periodo': t.año * 12 + t.mes - 1, 'monto': t.monto}
+        for columna in self.COLUMNAS_TEXTO:
+            valores[columna] = self.codificar(columna, getattr(t, columna))
+        for nombre, columna in self.columnas.items():
+            columna[fila + 1:self.n + 1] = columna[fila:self.n]
+            columna[fila] = valores[nombre]
+        self.n += 1
+
+    def suprimir(self, posicion):
+        fila = self.n - 1 - posicion
+        for columna in self.columnas.values():
+            columna[fila:self.n - 1] = columna[fila + 1:self.n]
+        self.n -= 1
+
+    def tramo(self, año=None, mes=None):
+        if año is None:
+            return slice(0, self.n)
+        inicio, fin = self.indice_fechas.limites_periodo(año, mes)
+        return slice(self.n - fin, self.n - inicio)
+
+    def seleccion(self, año=None, mes=None, categoria=None, subcategoria=None, proveedor=None):
+        # El periodo lo resuelve el índice de fechas; los textos solo se comparan dentro de ese tramo
+        tramo = self.tramo(año, mes)
+        mascara = None
+        for columna, texto in (('categoria', categoria), ('subcategoria', subcategoria), ('proveedor', proveedor)):
+            if texto is not None:
+                coincide = self.columnas[columna][tramo] == self.codigos[columna].get(texto, -1)
+                mascara = coincide if mascara is None else mascara & coincide
+        return tramo, mascara
+
+    def valores(self, columna, tramo, mascara=None):
+        valores = self.columnas[columna][tramo]
+        return valores if mascara is None else valores[mascara]
+
+    def sumar_por(self, clave, **filtros):
+        import numpy as np
+        tramo, mascara = self.seleccion(**filtros)
+        montos = self.valores('monto', tramo, mascara)
+        if clave in self.COLUMNAS_TEXTO:
+            codigos = self.valores(clave, tramo, mascara)
+            totales = np.bincount(codigos, weights=montos, minlength=len(self.textos[clave]))
+            return {self.textos[clave][i]: float(totales[i]) for i in np.flatnonzero(totales)}
+        periodo = self.valores('periodo', tramo, mascara)
+        if clave == 'mes':
+            totales = np.bincount(periodo % 12, weights=montos, minlength=12)
+            return {i + 1: float(totales[i]) for i in np.flatnonzero(totales)}
+        if clave == 'año':
+            años, posiciones = np.unique(periodo // 12, return_inverse=True)
+            totales = np.bincount(posiciones, weights=montos, minlength=len(años))
+            return {int(a): float(total) for a, total in zip(años, totales)}
+        raise ValueError(f"No se puede agrupar por {clave}")
+
+    def gastado(self, año, mes=None, categoria=None, subcategoria=None):
+        tramo, mascara = self.seleccion(año, mes, categoria, subcategoria)
+        return float(self.valores('monto', tramo, mascara).sum())
+
+    def años(self):
+        import numpy as np
+        return [int(a) for a in np.unique(self.columnas['periodo'][:self.n] // 12)]
+
+    def gastado_por_categoria(self, año, mes, categorias):
+        totales = self.sumar_por('categoria', año=año, mes=mes)
+        return {c: totales.get(c, 0.0) for c in categorias}
+
+    def gastado_por_año(self, años):
+        return {a: float(self.columnas['monto'][self.tramo(a)].sum()) for a in años}
+
+    def serie_categorias(self, año, mes, categorias):
+        import numpy as np
+        totales = self.sumar_por('categoria', año=año, mes=mes)
+        return np.array([totales.get(c, 0.0) for c in categorias], dtype=float)
+
+    def serie_mensual(self, año, mes, meses=6):
+        import numpy as np
+        primero = año * 12 + mes - 1 - meses
+        inicio, fin = self.indice_fechas.limites(date(primero // 12, primero % 12 + 1, 1), date(año, mes, 1) - timedelta(days=1))
+        tramo = slice(self.n - fin, self.n - inicio)
+        totales = np.bincount(self.columnas['periodo'][tramo] - primero, weights=self.columnas['monto'][tramo], minlength=meses)
+        periodos = [((primero + i) // 12, (primero + i) % 12 + 1) for i in range(meses)]
+        return periodos, totales
+
+
+class GraficosPresupuesto:
+    # Los cuatro gráficos del mes; sirve igual para la pestaña de Tk y para la exportación sin pantalla
+    def __init__(self):
+        from matplotlib.figure import Figure
+        
+        # La figura, los ejes y sus artistas se crean una vez; cambiar de mes solo actualiza sus datos
+        self.figura = fig = Figure(figsize=(14, 10))
+        ax1, ax2, ax3, ax4 = (fig.add_subplot(2, 2, i) for i in range(1, 5))
+        self.ax1, self.ax2, self.ax3, self.ax4 = ax1, ax2, ax3, ax4
+        
+        ax1.set_xlabel('Categorías')
+        ax1.set_ylabel('Monto ($)')
+        ax1.grid(axis='y', alpha=0.3)
+        
+        ax2.set_xlabel('% Utilizado')
+        ax2.set_title('Porcentaje de Uso del Presupuesto')
+        ax2.axvline(x=100, color='red', linestyle='--', linewidth=2, label='Límite')
+        ax2.legend()
+        ax2.grid(axis='x', alpha=0.3)
+        ax2.tick_params(axis='y', labelsize=8)
+        
+        ax3.set_title('Distribución del Gasto por Categoría')
+        ax3.set_aspect('equal')
+        ax3.set_xlim(-1.25, 1.25)
+        ax3.set_ylim(-1.25, 1.25)
+        ax3.axis('off')
+        self.sin_gastos = ax3.text(0.5, 0.5, 'Sin gastos registrados', ha='center', va='center', transform=ax3.transAxes, visible=False)
+        
+        self.linea_tendencia, = ax4.plot([], [], marker='o', linewidth=2, markersize=8)
+        ax4.set_xlabel('Mes')
+        ax4.set_ylabel('Total Gastado ($)')
+        ax4.set_title('Tendencia de Gasto (Últimos 6 Meses)')
+        ax4.grid(True, alpha=0.3)
+        
+        fig.subplots_adjust(left=0.06, right=0.98, top=0.95, bottom=0.15, wspace=0.3, hspace=0.6)
+        
+        self.barras_presupuesto = self.barras_gasto = self.barras_uso = None
+        self.cuñas, self.textos_pastel = [], []
+
+    def actualizar(self, fuente_gastos, presupuesto_mes, año, mes):
+        import numpy as np
+        nombres = list(presupuesto_mes)
+        categorias = [c[:12] + '..' if len(c) > 12 else c for c in nombres]
+        presupuestos = np.fromiter(presupuesto_mes.values(), dtype=float, count=len(nombres))
+        gastos = fuente_gastos.serie_categorias(año, mes, nombres)
+        
+        self.ax1.set_title(f'Presupuesto vs Gastado - {MESES[mes - 1]} {año}')
+        self.actualizar_barras_presupuesto(categorias, presupuestos, gastos)
+        
+        porcentajes = np.divide(gastos * 100, presupuestos, out=np.zeros_like(gastos), where=presupuestos > 0)
+        colors = np.where(porcentajes > 100, '#f44336', np.where(porcentajes > 90, '#FF9800', '#4CAF50'))
+        self.actualizar_barras_uso(categorias, porcentajes, colors.tolist())
+        
+        con_gasto = gastos > 0
+        self.actualizar_pastel([c for c, hay in zip(categorias, con_gasto) if hay], gastos[con_gasto])
+        
+        periodos, totales_gastados = fuente_gastos.serie_mensual(año, mes)
+        meses_anteriores = [MESES[m - 1][:3] + ('' if a == año else f" {a % 100:02d}") for a, m in periodos]
+        self.linea_tendencia.set_data(np.arange(len(periodos)), totales_gastados)
+        self.ax4.set_xticks(range(len(periodos)))
+        self.ax4.set_xticklabels(meses_anteriores)
+        self.ax4.relim()
+        self.ax4.autoscale_view()
+
+    def actualizar_barras_presupuesto(self, categorias, presupuestos, gastos):
+        ax, width = self.ax1, 0.35
+        if self.barras_presupuesto is None or len(self.barras_presupuesto) != len(categorias):
+            # Cambió el número de categorías: solo entonces se reemplazan las barras
+            for barras in (self.barras_presupuesto, self.barras_gasto):
+                if barras is not None:
+                    barras.remove()
+            x = range(len(categorias))
+            self.barras_presupuesto = ax.bar([i - width/2 for i in x], presupuestos, width, label='Presupuesto', color='#4CAF50')
+            self.barras_gasto = ax.bar([i + width/2 for i in x], gastos, width, label='Gastado', color='#FF9800')
+            ax.set_xticks(x)
+            ax.legend()
+        else:
+            for barra, valor in zip(self.barras_presupuesto, presupuestos):
+                barra.set_height(valor)
+            for barra, valor in zip(self.barras_gasto, gastos):
+                barra.set_height(valor)
+        ax.set_xticklabels(categorias, rotation=45, ha='right', fontsize=8)
+        ax.relim()
+        ax.autoscale_view()
+
+    def actualizar_barras_uso(self, categorias, porcentajes, colores):
+        ax = self.ax2
+        if self.barras_uso is None or len(self.barras_uso) != len(categorias):
+            if self.barras_uso is not None:
+                self.barras_uso.remove()
+            self.barras_uso = ax.barh(range(len(categorias)), porcentajes, color=colores)
+            ax.set_yticks(range(len(categorias)))
+        else:
+            for barra, valor, color in zip(self.barras_uso, porcentajes, colores):
+                barra.set_width(valor)
+                barra.set_color(color)
+        ax.set_yticklabels(categorias)
+        ax.relim()
+        ax.autoscale_view()
+
+    def actualizar_pastel(self, etiquetas, valores):
+        ax = self.ax3
+        self.sin_gastos.set_visible(len(valores) == 0)
+        if len(self.cuñas) != len(valores):
+            for artista in self.cuñas + self.textos_pastel:
+                artista.remove()
+            self.cuñas, self.textos_pastel = [], []
+            if len(valores):
+                cuñas, textos, porcentajes = ax.pie(valores, labels=etiquetas, autopct='%1.1f%%', startangle=90, textprops={'fontsize': 8})
+                self.cuñas = list(cuñas)
+                self.textos_pastel = [t for par in zip(textos, porcentajes) for t in par]
+            return
+        
+        # Mismo número de porciones: se recalculan los ángulos y se recolocan los textos como lo hace ax.pie
+        total, angulo = sum(valores), 90.0
+        textos = self.textos_pastel
+        for i, (cuña, etiqueta, valor) in enumerate(zip(self.cuñas, etiquetas, valores)):
+            barrido = 360.0 * valor / total
+            cuña.set_theta1(angulo)
+            cuña.set_theta2(angulo + barrido)
+            medio = math.radians(angulo + barrido / 2)
+            x, y = math.cos(medio), math.sin(medio)
+            textos[2 * i].set_position((1.1 * x, 1.1 * y))
+            textos[2 * i].set_text(etiqueta)
+            textos[2 * i].set_horizontalalignment('left' if x > 0 else 'right')
+            textos[2 * i + 1].set_position((0.6 * x, 0.6 * y))
+            textos[2 * i + 1].set_text(f"{100.0 * valor / total:.1f}%")
+            angulo += barrido
+
+
+def cargar_indice_gastos(almacenamiento):
+    indice = IndiceGastos()
+    resumen = almacenamiento.resumen_gastos()
+    if resumen is None:
+        indice.reconstruir(Transaccion.desde_dict(t) for t in almacenamiento.cargar_transacciones())
+    else:
+        indice.cargar_resumen(resumen)
+    return indice
+
+
+_estado_exportacion = {}
+
+
+def _iniciar_proceso_exportacion(indice_gastos):
+    # Cada proceso trabaja sin pantalla y reutiliza una sola figura para todos sus periodos
+    import matplotlib
+    matplotlib.use('Agg')
+    _estado_exportacion['indice'] = indice_gastos
+    _estado_exportacion['graficos'] = None
 
-        ttk.Button(frame_pasos_siguientes, text="Restablecer Contraseña", command=intentar_restablecer).pack(pady=20)
+
+def exportar_periodo(tarea):
+    año, mes, presupuesto_mes, destino, formatos = tarea
+    if _estado_exportacion['graficos'] is None:
+        _estado_exportacion['graficos'] = GraficosPresupuesto()
+    graficos = _estado_exportacion['graficos']
+    graficos.actualizar(_estado_exportacion['indice'], presupuesto_mes, año, mes)
+    rutas = []
+    for formato in formatos:
+        ruta = os.path.join(destino, f"graficos_{año}_{mes:02d}_{MESES[mes - 1]}.{formato}")
+        graficos.figura.savefig(ruta, format=formato)
+        rutas.append(ruta)
+    return rutas
+
+
+def exportar_graficos(destino, periodos=None, formatos=('png',), procesos=None, almacenamiento=None):
+    almacenamiento = almacenamiento or crear_almacenamiento()
+    presupuestos = almacenamiento.cargar('presupuestos_anuales', {})
+    indice_gastos = cargar_indice_gastos(almacenamiento)
+    if periodos is None:
+        periodos = [(int(año), MESES.index(mes) + 1) for año, meses in presupuestos.items() for mes in meses]
+    
+    tareas = []
+    for año, mes in sorted(periodos):
+        presupuesto_mes = presupuestos.get(str(año), {}).get(MESES[mes - 1])
+        if presupuesto_mes:
+            tareas.append((año, mes, presupuesto_mes, destino, tuple(formatos)))
+    if not tareas:
+        return []
+    
+    os.makedirs(destino, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso_exportacion, initargs=(indice_gastos,)) as ejecutor:
+        return [ruta for rutas in ejecutor.map(exportar_periodo, tareas) for ruta in rutas]
 
 
 class SistemaFinancieroAgricolaSeguro:
-    def __init__(self, root, usuario_actual, seguridad):
+    COLECCIONES_PERSISTENTES = (
+        'presupuesto_mensual', 'secuencias', 'proveedores', 'presupuestos_anuales',
+        'sobrantes_anuales', 'categorias_personalizadas'
+    )
+
+    def __init__(self, root, usuario_actual, seguridad, almacenamiento=None):
         self.root = root
         self.usuario_actual = usuario_actual
         self.seguridad = seguridad
@@ -360,26 +2122,34 @@ class SistemaFinancieroAgricolaSeguro:
         self.root.geometry("1400x800")
         self.root.configure(bg='#2d5016')
         
-        self.archivo_datos = "agricultura_finanzas.json"
-        self.archivo_presupuesto = "agricultura_presupuesto.json"
-        self.archivo_proveedores = "agricultura_proveedores.json"
-        self.archivo_presupuesto_mensual = "agricultura_presupuesto_mensual.json"
-        self.archivo_presupuestos_anuales = "agricultura_presupuestos_anuales.json"
-        self.archivo_sobrantes_anuales = "agricultura_sobrantes_anuales.json"
-        self.archivo_categorias_personalizadas = "agricultura_categorias_personalizadas.json"
-        self.archivo_log_actividades = "log_actividades.json"
-        
-        self.transacciones = []
+        self.almacenamiento = almacenamiento or seguridad.almacenamiento
+        
+        self.transacciones = {}
+        # TablaGastos si numpy está instalado, IndiceGastos si no: todas las consultas agrupadas pasan por aquí
+        self.indice_gastos = IndiceGastos()
+        self.resumen_proveedores = ResumenProveedores()
+        self.indice_fechas = IndiceFechas()
+        self.ventana_gastos = [0, 0]
+        self.revision_gastos_pendiente = False
+        self.carga_log_pendiente = False
+        self.numeros_etiqueta = count()
+        self.grafico = None
+        self.canvas_graficos = None
         self.presupuesto_anual = {}
         self.presupuesto_mensual_por_mes = {}
         self.proveedores = {}
+        self.secuencias = {}
+        self.indice_proveedores = IndiceProveedores()
+        self.filas_proveedores = set()
         self.presupuesto_modificado = {}
         self.sobrantes = {}
         self.presupuestos_por_año = {}
         self.sobrantes_anuales = {}
         self.año_actual = datetime.now().year
         self.categorias_personalizadas = {}
-        self.log_actividades = []
+        self.colecciones_modificadas = set()
+        self.escritor = EscritorSegundoPlano(self.almacenamiento)
+        self.persistencia_cerrada = False
         
         self.categorias_agricolas = {
             "Insumos Agrícolas": ["Semillas", "Fertilizantes", "Pesticidas", "Abonos", "Herbicidas"],
@@ -391,17 +2161,15 @@ class SistemaFinancieroAgricolaSeguro:
             "Infraestructura": ["Construcción", "Reparaciones", "Cercas", "Establos"],
             "Otros Gastos": ["Seguros", "Impuestos", "Asesoría", "Varios"]
         }
+        self.catalogo_categorias = CatalogoCategorias(self.categorias_agricolas, self.categorias_personalizadas)
         
-        self.meses = [
-            "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-            "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
-        ]
+        self.meses = list(MESES)
         
-        self.cargar_datos()
+        self.root.protocol("WM_DELETE_WINDOW", self.al_cerrar_ventana)
         self.configurar_estilos()
         self.crear_widgets()
-        self.registrar_actividad("Inicio de sesión")
-        self.mostrar_bienvenida()
+        cronometro_arranque.marcar("Creación de widgets")
+        self.cargar_datos_en_segundo_plano()
 
     def validar_solo_numeros(self, valor):
         if valor == "":
@@ -420,24 +2188,12 @@ class SistemaFinancieroAgricolaSeguro:
             'actividad': actividad,
             'detalles': detalles
         }
-        self.log_actividades.append(log_entry)
-        self.guardar_log_actividades()
-    
-    def guardar_log_actividades(self):
+        # Una línea añadida al segmento actual, sin reescribir el historial
         try:
-            with open(self.archivo_log_actividades, 'w', encoding='utf-8') as f:
-                json.dump(self.log_actividades, f, ensure_ascii=False, indent=2)
+            self.almacenamiento.agregar_actividad(log_entry)
         except:
             pass
     
-    def cargar_log_actividades(self):
-        if os.path.exists(self.archivo_log_actividades):
-            try:
-                with open(self.archivo_log_actividades, 'r', encoding='utf-8') as f:
-                    self.log_actividades = json.load(f)
-            except:
-                self.log_actividades = []
-    
     def verificar_permiso(self, accion):
         if self.rol_usuario == 'Administrador':
             return True
@@ -510,51 +2266,47 @@ class SistemaFinancieroAgricolaSeguro:
         ttk.Button(frame_botones_sesion, text="🔒 Cambiar Contraseña", command=self.cambiar_contraseña).pack(side='top', pady=2)
         ttk.Button(frame_botones_sesion, text="🚪 Cerrar Sesión", command=self.cerrar_sesion).pack(side='top', pady=2)
         
+        self.frame_carga = tk.Frame(self.root, bg='#2d5016')
+        self.frame_carga.pack(fill='both', expand=True)
+        self.label_carga = tk.Label(self.frame_carga, text="⏳ Cargando datos...", font=('Arial', 14, 'bold'), bg='#2d5016', fg='white')
+        self.label_carga.pack(pady=(200, 10))
+        self.barra_carga = ttk.Progressbar(self.frame_carga, mode='determinate', length=400, maximum=len(self.tareas_carga()))
+        self.barra_carga.pack()
+    
+    def crear_notebook(self):
+        self.frame_carga.destroy()
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        self.constructores_pestaña = {}
+        self.notebook.bind('<<NotebookTabChanged>>', self.al_cambiar_pestaña)
         self.crear_pestañas_segun_rol()
     
     def crear_pestañas_segun_rol(self):
         if self.rol_usuario == 'Administrador':
-            self.tab_usuarios = ttk.Frame(self.notebook)
-            self.notebook.add(self.tab_usuarios, text='👥 Gestión de Usuarios')
-            self.crear_tab_usuarios()
-            
-            self.tab_log = ttk.Frame(self.notebook)
-            self.notebook.add(self.tab_log, text='📋 Log de Actividades')
-            self.crear_tab_log()
-        
-        self.tab_gestion_año = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_gestion_año, text='📅 Gestión de Años')
-        self.crear_tab_gestion_año()
-        
-        self.tab_categorias_custom = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_categorias_custom, text='🏷️ Gestionar Categorías')
-        self.crear_tab_categorias_custom()
-        
-        self.tab_presupuesto_mensual = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_presupuesto_mensual, text='💰 Presupuesto Mensual')
-        self.crear_tab_presupuesto_mensual()
-        
-        self.tab_proveedores = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_proveedores, text='🏪 Catálogo de Proveedores')
-        self.crear_tab_proveedores()
-        
-        self.tab_registro = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_registro, text='📝 Registro de Gastos')
-        self.crear_tab_registro()
-        
-        self.tab_control = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_control, text='📊 Control Mensual')
-        self.crear_tab_control()
-        
-        self.tab_sobrantes = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_sobrantes, text='💵 Gestión de Sobrantes')
-        self.crear_tab_sobrantes()
-        
-        self.tab_graficos = ttk.Frame(self.notebook)
-        self.notebook.add(self.tab_graficos, text='📈 Gráficos y Análisis')
-        self.crear_tab_graficos()
+            self.agregar_pestaña('tab_usuarios', '👥 Gestión de Usuarios', self.crear_tab_usuarios)
+            self.agregar_pestaña('tab_log', '📋 Log de Actividades', self.crear_tab_log)
+        
+        self.agregar_pestaña('tab_gestion_año', '📅 Gestión de Años', self.crear_tab_gestion_año)
+        self.agregar_pestaña('tab_categorias_custom', '🏷️ Gestionar Categorías', self.crear_tab_categorias_custom)
+        self.agregar_pestaña('tab_presupuesto_mensual', '💰 Presupuesto Mensual', self.crear_tab_presupuesto_mensual)
+        self.agregar_pestaña('tab_proveedores', '🏪 Catálogo de Proveedores', self.crear_tab_proveedores)
+        self.agregar_pestaña('tab_registro', '📝 Registro de Gastos', self.crear_tab_registro)
+        self.agregar_pestaña('tab_control', '📊 Control Mensual', self.crear_tab_control)
+        self.agregar_pestaña('tab_sobrantes', '💵 Gestión de Sobrantes', self.crear_tab_sobrantes)
+        self.agregar_pestaña('tab_graficos', '📈 Gráficos y Análisis', self.crear_tab_graficos)
+        self.agregar_pestaña('tab_analisis_proveedores', '🚚 Análisis de Proveedores', self.crear_tab_analisis_proveedores)
+    
+    def agregar_pestaña(self, atributo, texto, constructor):
+        # El contenido de cada pestaña se construye (y se carga) la primera vez que se selecciona
+        tab = ttk.Frame(self.notebook)
+        setattr(self, atributo, tab)
+        self.notebook.add(tab, text=texto)
+        self.constructores_pestaña[str(tab)] = constructor
+    
+    def al_cambiar_pestaña(self, event=None):
+        constructor = self.constructores_pestaña.pop(self.notebook.select(), None)
+        if constructor is not None:
+            constructor()
 
     def crear_tab_usuarios(self):
         frame_instrucciones = ttk.LabelFrame(self.tab_usuarios, text="👥 Gestión de Usuarios del Sistema", padding=15)
@@ -685,8 +2437,7 @@ class SistemaFinancieroAgricolaSeguro:
         if not seleccion: return
         username = self.tree_usuarios.item(seleccion[0])['values'][0]
         if username in self.seguridad.usuarios:
-            self.seguridad.usuarios[username]['intentos_fallidos'] = 0
-            self.seguridad.guardar_usuarios()
+            self.seguridad.actualizar_acceso(username, intentos_fallidos=0)
             self.registrar_actividad("Desbloquear usuario", f"Usuario: {username}")
             messagebox.showinfo("Éxito", f"Usuario {username} desbloqueado")
             self.actualizar_lista_usuarios()
@@ -751,13 +2502,21 @@ class SistemaFinancieroAgricolaSeguro:
         self.combo_filtro_usuario.current(0)
         ttk.Button(frame_filtros, text="🔄 Actualizar", command=self.actualizar_log).pack(side='left', padx=10)
         ttk.Button(frame_filtros, text="🗑️ Limpiar Log", command=self.limpiar_log).pack(side='left', padx=5)
+        ttk.Button(frame_filtros, text="⬇️ Cargar Más", command=self.cargar_mas_log).pack(side='left', padx=5)
         
         frame_tabla = ttk.LabelFrame(self.tab_log, text="📋 Actividades", padding=10)
         frame_tabla.pack(fill='both', expand=True, padx=10, pady=10)
         scroll_y = ttk.Scrollbar(frame_tabla, orient='vertical')
         scroll_y.pack(side='right', fill='y')
         columnas = ('Fecha/Hora', 'Usuario', 'Rol', 'Actividad', 'Detalles')
-        self.tree_log = ttk.Treeview(frame_tabla, columns=columnas, show='headings', yscrollcommand=scroll_y.set)
+        def al_desplazar_log(inicio, fin):
+            scroll_y.set(inicio, fin)
+            # Al llegar al final de lo cargado se trae la siguiente página de segmentos, una sola vez por llegada
+            if float(fin) >= 1.0 and self.tree_log.get_children() and not self.carga_log_pendiente:
+                self.carga_log_pendiente = True
+                self.root.after_idle(self.cargar_mas_log)
+        
+        self.tree_log = ttk.Treeview(frame_tabla, columns=columnas, show='headings', yscrollcommand=al_desplazar_log)
         scroll_y.config(command=self.tree_log.yview)
         anchos = {'Fecha/Hora': 150, 'Usuario': 120, 'Rol': 120, 'Actividad': 200, 'Detalles': 400}
         for col in columnas:
@@ -770,12 +2529,21 @@ class SistemaFinancieroAgricolaSeguro:
         for item in self.tree_log.get_children():
             self.tree_log.delete(item)
         usuario_filtro = self.combo_filtro_usuario.get()
-        for entry in reversed(self.log_actividades):
-            if usuario_filtro == 'Todos' or entry['usuario'] == usuario_filtro:
-                self.tree_log.insert('', 'end', values=(
-                    entry['fecha_hora'], entry['usuario'], entry['rol'],
-                    entry['actividad'], entry['detalles']
-                ))
+        self.iterador_log = self.almacenamiento.leer_actividades(None if usuario_filtro == 'Todos' else usuario_filtro)
+        self.cargar_mas_log()
+
+    def cargar_mas_log(self):
+        self.carga_log_pendiente = False
+        if getattr(self, 'iterador_log', None) is None:
+            return
+        pagina = list(islice(self.iterador_log, TAMAÑO_PAGINA_LOG))
+        if len(pagina) < TAMAÑO_PAGINA_LOG:
+            self.iterador_log = None
+        for entry in pagina:
+            self.tree_log.insert('', 'end', values=(
+                entry['fecha_hora'], entry['usuario'], entry['rol'],
+                entry['actividad'], entry['detalles']
+            ))
     
     def limpiar_log(self):
         if not self.verificar_permiso('gestion_usuarios'):
@@ -783,8 +2551,7 @@ class SistemaFinancieroAgricolaSeguro:
             return
             
         if messagebox.askyesno("Confirmar", "¿Limpiar TODO el log de actividades?"):
-            self.log_actividades = []
-            self.guardar_log_actividades()
+            self.almacenamiento.limpiar_actividades()
             self.registrar_actividad("Limpiar log", "Log de actividades limpiado")
             self.actualizar_log()
     
@@ -838,8 +2605,13 @@ class SistemaFinancieroAgricolaSeguro:
     def cerrar_sesion(self):
         if messagebox.askyesno("Cerrar Sesión", "¿Está seguro de cerrar la sesión?"):
             self.registrar_actividad("Cierre de sesión")
+            self.cerrar_persistencia()
             self.root.destroy()
 
+    def al_cerrar_ventana(self):
+        self.cerrar_persistencia()
+        self.root.destroy()
+
     def crear_tab_gestion_año(self):
         self.frame_info_año = ttk.LabelFrame(self.tab_gestion_año, text=f"Información del Año {self.año_actual}", padding=15)
         self.frame_info_año.pack(fill='x', padx=10, pady=10)
@@ -1031,7 +2803,8 @@ class SistemaFinancieroAgricolaSeguro:
             messagebox.showinfo("Éxito", 
                 f"Presupuesto vacío creado para el año {año_nuevo}")
         
-        self.guardar_presupuestos_anuales()
+        self.marcar_modificado('presupuestos_anuales')
+        self.flush()
         self.actualizar_info_año()
         self.registrar_actividad("Crear presupuesto anual", f"Año {año_nuevo}")
         
@@ -1118,17 +2891,12 @@ class SistemaFinancieroAgricolaSeguro:
             fecha_actual_año = datetime(self.año_actual, 1, 1).strftime('%Y-%m-%d')
             self.fecha_var.set(fecha_actual_año)
 
-        if hasattr(self, 'actualizar_tabla_gastos'):
-            try:
-                self.actualizar_tabla_gastos()
-            except:
-                pass
+        # Las pestañas se construyen al seleccionarlas: una que aún no existe se cargará ya con el año nuevo
+        if hasattr(self, 'tree_gastos'):
+            self.actualizar_tabla_gastos()
 
-        if hasattr(self, 'cargar_presupuesto_mes'):
-            try:
-                self.cargar_presupuesto_mes()
-            except:
-                pass
+        if hasattr(self, 'presupuesto_mensual_entries'):
+            self.cargar_presupuesto_mes()
 
     def ver_presupuestos_anteriores(self):
         if not self.presupuestos_por_año:
@@ -1226,8 +2994,8 @@ class SistemaFinancieroAgricolaSeguro:
             self.distribuir_sobrante_personalizado(sobrante, año_anterior)
             return
             
-        self.guardar_sobrantes_anuales()
-        self.guardar_datos()
+        self.marcar_modificado('sobrantes_anuales', 'presupuesto_mensual')
+        self.flush()
         self.actualizar_info_año()
         self.registrar_actividad("Sobrante aplicado", f"Año {año_anterior}: {opcion}")
 
@@ -1235,7 +3003,7 @@ class SistemaFinancieroAgricolaSeguro:
         presupuesto_año = self.presupuestos_por_año.get(str(año), {})
         if not presupuesto_año: return 0
         total_presupuestado = sum(sum(mes_data.values()) for mes_data in presupuesto_año.values())
-        total_gastado = sum(t['monto'] for t in self.transacciones if datetime.strptime(t['fecha'], '%Y-%m-%d').year == año)
+        total_gastado = self.indice_gastos.gastado(año)
         return total_presupuestado - total_gastado
 
     def distribuir_sobrante_en_presupuesto(self, sobrante):
@@ -1247,7 +3015,8 @@ class SistemaFinancieroAgricolaSeguro:
                 monto_actual = self.presupuesto_mensual_por_mes[mes][categoria]
                 incremento = sobrante * (monto_actual / total_presupuesto_actual)
                 self.presupuesto_mensual_por_mes[mes][categoria] += incremento
-        self.guardar_datos()
+        self.marcar_modificado('presupuesto_mensual')
+        self.flush()
 
     def distribuir_sobrante_personalizado(self, sobrante, año_anterior):
         ventana = tk.Toplevel(self.root)
@@ -1269,9 +3038,7 @@ class SistemaFinancieroAgricolaSeguro:
         scrollbar.pack(side="right", fill="y")
         
         porcentaje_entries, monto_labels = {}, {}
-        todas_categorias = list(self.categorias_agricolas.keys()) + list(self.categorias_personalizadas.keys())
-        
-        for categoria in todas_categorias:
+        for categoria in self.catalogo_categorias.categorias():
             frame = tk.Frame(frame_categorias, bg='#f5f5f5', relief='raised', bd=1)
             frame.pack(fill='x', padx=5, pady=3)
             tk.Label(frame, text=categoria, width=30, anchor='w', bg='#f5f5f5').pack(side='left', padx=5)
@@ -1310,8 +3077,8 @@ class SistemaFinancieroAgricolaSeguro:
                         self.presupuesto_mensual_por_mes["Enero"][categoria] += monto
                 except: pass
             self.sobrantes_anuales[str(año_anterior)] = {'monto': sobrante, 'decision': 'Distribución Personalizada', 'fecha': datetime.now().strftime('%Y-%m-%d')}
-            self.guardar_sobrantes_anuales()
-            self.guardar_datos()
+            self.marcar_modificado('sobrantes_anuales', 'presupuesto_mensual')
+            self.flush()
             self.actualizar_info_año()
             messagebox.showinfo("Éxito", "Distribución aplicada correctamente")
             ventana.destroy()
@@ -1324,6 +3091,10 @@ class SistemaFinancieroAgricolaSeguro:
         except: label.config(text="$0.00")
 
     def actualizar_info_año(self):
+        if not hasattr(self, 'tree_historial_años'):
+            # La pestaña aún no se ha abierto; mostrará los datos al construirse
+            return
+        
         if hasattr(self, 'frame_info_año'):
             self.frame_info_año.config(text=f"Información del Año {self.año_actual}")
         
@@ -1340,9 +3111,11 @@ class SistemaFinancieroAgricolaSeguro:
         for item in self.tree_historial_años.get_children(): 
             self.tree_historial_años.delete(item)
         
-        for año in sorted(self.presupuestos_por_año.keys(), reverse=True):
+        años = sorted(self.presupuestos_por_año.keys(), reverse=True)
+        gastado_por_año = self.indice_gastos.gastado_por_año([int(año) for año in años])
+        for año in años:
             pres_total = sum(sum(m.values()) for m in self.presupuestos_por_año[año].values())
-            gastado = sum(t['monto'] for t in self.transacciones if datetime.strptime(t['fecha'], '%Y-%m-%d').year == int(año))
+            gastado = gastado_por_año[int(año)]
             sobrante = pres_total - gastado
             decision = self.sobrantes_anuales.get(año, {}).get('decision', 'N/A')
             self.tree_historial_años.insert('', 'end', values=(año, f"${pres_total:,.2f}", f"${gastado:,.2f}", f"${sobrante:,.2f}", decision))
@@ -1402,9 +3175,12 @@ class SistemaFinancieroAgricolaSeguro:
         self.text_categorias.pack(fill='both', expand=True)
         scroll_y.config(command=self.text_categorias.yview)
         
-        ttk.Button(self.tab_categorias_custom, text=" Actualizar Vista", command=self.actualizar_vista_categorias).pack(pady=10)
+        ttk.Button(self.tab_categorias_custom, text=" Actualizar Vista",
+                   command=lambda: self.catalogo_categorias.refrescar('categorias', forzar=True)).pack(pady=10)
         
+        self.etiquetas_categorias = {}
         self.actualizar_vista_categorias()
+        self.catalogo_categorias.suscribir('categorias', self.actualizar_vista_categorias, self.aplicar_cambio_vista_categorias)
 
     def agregar_nueva_categoria(self):
         if not self.puede_modificar():
@@ -1413,13 +3189,13 @@ class SistemaFinancieroAgricolaSeguro:
             
         nombre = self.entry_nueva_categoria.get().strip()
         if not nombre: return messagebox.showwarning("Advertencia", "Debe ingresar un nombre")
-        todas_categorias = {**self.categorias_agricolas, **self.categorias_personalizadas}
-        if nombre in todas_categorias: return messagebox.showwarning("Advertencia", "Ya existe")
-        self.categorias_personalizadas[nombre] = []
-        self.guardar_categorias_personalizadas()
+        try:
+            self.catalogo_categorias.agregar_categoria(nombre)
+        except ValueError as e:
+            return messagebox.showwarning("Advertencia", str(e))
+        self.marcar_modificado('categorias_personalizadas')
+        self.flush()
         self.entry_nueva_categoria.delete(0, 'end')
-        self.actualizar_vista_categorias()
-        self.actualizar_todas_categorias_combos() 
         messagebox.showinfo("Éxito", f"Categoría '{nombre}' creada")
 
     def agregar_nueva_subcategoria(self):
@@ -1431,18 +3207,14 @@ class SistemaFinancieroAgricolaSeguro:
         subcategoria = self.entry_nueva_subcategoria.get().strip()
         if not categoria or not subcategoria: return messagebox.showwarning("Advertencia", "Complete campos")
         
-        if categoria in self.categorias_personalizadas:
-            if subcategoria in self.categorias_personalizadas[categoria]: return messagebox.showwarning("Advertencia", "Ya existe")
-            self.categorias_personalizadas[categoria].append(subcategoria)
-        elif categoria in self.categorias_agricolas:
-            if categoria not in self.categorias_personalizadas: self.categorias_personalizadas[categoria] = list(self.categorias_agricolas[categoria])
-            if subcategoria in self.categorias_personalizadas[categoria]: return messagebox.showwarning("Advertencia", "Ya existe")
-            self.categorias_personalizadas[categoria].append(subcategoria)
+        try:
+            self.catalogo_categorias.agregar_subcategoria(categoria, subcategoria)
+        except ValueError as e:
+            return messagebox.showwarning("Advertencia", str(e))
             
-        self.guardar_categorias_personalizadas()
+        self.marcar_modificado('categorias_personalizadas')
+        self.flush()
         self.entry_nueva_subcategoria.delete(0, 'end')
-        self.actualizar_vista_categorias()
-        self.actualizar_todas_categorias_combos() 
         messagebox.showinfo("Éxito", f"Subcategoría agregada")
 
     def eliminar_categoria(self):
@@ -1452,12 +3224,12 @@ class SistemaFinancieroAgricolaSeguro:
             
         categoria = self.combo_cat_eliminar.get()
         if not categoria: return
-        if categoria in self.categorias_agricolas and categoria not in self.categorias_personalizadas:
+        if self.catalogo_categorias.tipo(categoria) == "PREDEFINIDA":
             return messagebox.showwarning("Advertencia", "No se pueden eliminar categorías predefinidas")
         if messagebox.askyesno("Confirmar", f"¿Eliminar '{categoria}'?"):
-            del self.categorias_personalizadas[categoria]
-            self.guardar_categorias_personalizadas()
-            self.actualizar_vista_categorias()
+            self.catalogo_categorias.eliminar_categoria(categoria)
+            self.marcar_modificado('categorias_personalizadas')
+            self.flush()
 
     def eliminar_subcategoria(self):
         if not self.puede_modificar():
@@ -1468,52 +3240,73 @@ class SistemaFinancieroAgricolaSeguro:
         subcategoria = self.combo_subcat_eliminar.get()
         if not categoria or not subcategoria: return
         if messagebox.askyesno("Confirmar", f"¿Eliminar '{subcategoria}'?"):
-            if categoria in self.categorias_agricolas and categoria not in self.categorias_personalizadas:
-                self.categorias_personalizadas[categoria] = list(self.categorias_agricolas[categoria])
-            if subcategoria in self.categorias_personalizadas.get(categoria, []):
-                self.categorias_personalizadas[categoria].remove(subcategoria)
-                self.guardar_categorias_personalizadas()
-                self.actualizar_vista_categorias()
-                self.actualizar_todas_categorias_combos() 
+            if self.catalogo_categorias.eliminar_subcategoria(categoria, subcategoria):
+                self.marcar_modificado('categorias_personalizadas')
+                self.flush()
 
     def actualizar_subcats_eliminar(self, event=None):
         categoria = self.combo_cat_eliminar.get()
         if not categoria: self.combo_subcat_eliminar['values'] = []; return
-        subcats = self.categorias_personalizadas.get(categoria, self.categorias_agricolas.get(categoria, []))
+        subcats = self.catalogo_categorias.subcategorias(categoria)
         self.combo_subcat_eliminar['values'] = subcats
         if subcats: self.combo_subcat_eliminar.current(0)
 
     def actualizar_vista_categorias(self):
+        # Cada categoría ocupa un bloque con su propia etiqueta de Text, para poder sustituirlo en su sitio
+        for etiqueta in self.etiquetas_categorias.values():
+            self.text_categorias.tag_delete(etiqueta)
+        self.etiquetas_categorias = {}
         self.text_categorias.delete('1.0', 'end')
-        todas_categorias = {cat: list(subcats) for cat, subcats in self.categorias_agricolas.items()}
-        for cat, subcats in self.categorias_personalizadas.items():
-            if cat in todas_categorias: todas_categorias[cat] = list(set(todas_categorias[cat] + subcats))
-            else: todas_categorias[cat] = list(subcats)
-            
-        texto = "=" * 100 + "\nCATEGORÍAS Y SUBCATEGORÍAS ACTUALES\n" + "=" * 100 + "\n\n"
-        for categoria in sorted(todas_categorias.keys()):
-            tipo = " [PREDEFINIDA]" if categoria in self.categorias_agricolas and categoria not in self.categorias_personalizadas else " [PERSONALIZADA]" if categoria not in self.categorias_agricolas else " [MIXTA]"
-            texto += f"\n {categoria}{tipo}\n" + "-" * 100 + "\n"
-            subcats = todas_categorias[categoria]
-            if subcats:
-                for i, subcat in enumerate(sorted(subcats), 1): texto += f"  {i}. {subcat}\n"
-            else: texto += "  (Sin subcategorías)\n"
-            texto += "\n"
-            
-        self.text_categorias.insert('1.0', texto)
-        lista_categorias = sorted(todas_categorias.keys())
-        
+        bloques = ["=" * 100 + "\nCATEGORÍAS Y SUBCATEGORÍAS ACTUALES\n" + "=" * 100 + "\n\n", ()]
+        for categoria in self.catalogo_categorias.categorias():
+            bloques += [self.texto_bloque_categoria(categoria), self.etiqueta_categoria(categoria)]
+        self.text_categorias.insert('end', *bloques)
+        self.actualizar_combos_categorias_custom()
+        return True
+
+    def aplicar_cambio_vista_categorias(self, categoria, solo_subcategorias):
+        texto = self.text_categorias
+        etiqueta = self.etiquetas_categorias.pop(categoria, None)
+        try:
+            if etiqueta is not None:
+                posicion = texto.index(f"{etiqueta}.first")
+                texto.delete(f"{etiqueta}.first", f"{etiqueta}.last")
+                texto.tag_delete(etiqueta)
+            else:
+                siguiente = self.etiquetas_categorias.get(self.catalogo_categorias.siguiente(categoria))
+                posicion = texto.index(f"{siguiente}.first") if siguiente else 'end'
+        except tk.TclError:
+            # El bloque ya no está donde se pintó (el texto se editó a mano): se repinta todo
+            self.actualizar_vista_categorias()
+            return
+        if categoria in self.catalogo_categorias:
+            texto.insert(posicion, self.texto_bloque_categoria(categoria), self.etiqueta_categoria(categoria))
+        if not solo_subcategorias:
+            self.actualizar_combos_categorias_custom()
+        elif hasattr(self, 'combo_cat_eliminar') and self.combo_cat_eliminar.get() == categoria:
+            self.actualizar_subcats_eliminar()
+
+    def texto_bloque_categoria(self, categoria):
+        subcats = self.catalogo_categorias.subcategorias(categoria)
+        texto = f"\n {categoria} [{self.catalogo_categorias.tipo(categoria)}]\n" + "-" * 100 + "\n"
+        if subcats:
+            texto += "".join(f"  {i}. {subcat}\n" for i, subcat in enumerate(subcats, 1))
+        else:
+            texto += "  (Sin subcategorías)\n"
+        return texto + "\n"
+
+    def etiqueta_categoria(self, categoria):
+        etiqueta = f"bloque_categoria_{next(self.numeros_etiqueta)}"
+        self.etiquetas_categorias[categoria] = etiqueta
+        return etiqueta
+
+    def actualizar_combos_categorias_custom(self):
+        lista_categorias = self.catalogo_categorias.categorias()
         if hasattr(self, 'combo_cat_para_subcat'):
-            self.combo_cat_para_subcat['values'] = lista_categorias
+            self.actualizar_combo_categorias(self.combo_cat_para_subcat, lista_categorias, seleccionar_primera=True)
         if hasattr(self, 'combo_cat_eliminar'):
-            self.combo_cat_eliminar['values'] = lista_categorias
-        
-        if lista_categorias:
-            if hasattr(self, 'combo_cat_para_subcat'):
-                self.combo_cat_para_subcat.current(0)
-            if hasattr(self, 'combo_cat_eliminar'):
-                self.combo_cat_eliminar.current(0)
-                self.actualizar_subcats_eliminar()
+            self.actualizar_combo_categorias(self.combo_cat_eliminar, lista_categorias, seleccionar_primera=True)
+            self.actualizar_subcats_eliminar()
 
     def crear_tab_presupuesto_mensual(self):
         frame_instrucciones = ttk.LabelFrame(self.tab_presupuesto_mensual, text=" Instrucciones", padding=10)
@@ -1531,7 +3324,8 @@ class SistemaFinancieroAgricolaSeguro:
         if self.puede_modificar():
             ttk.Button(frame_mes, text=" Copiar de Otro Mes", command=self.copiar_presupuesto_mes).pack(side='left', padx=5)
             ttk.Button(frame_mes, text=" Aplicar a Todos los Meses", command=self.aplicar_a_todos_meses).pack(side='left', padx=5)
-            ttk.Button(frame_mes, text="🔄 Actualizar Categorías", command=self.regenerar_presupuesto_categorias).pack(side='left', padx=5)
+            ttk.Button(frame_mes, text="🔄 Actualizar Categorías",
+                       command=lambda: self.catalogo_categorias.refrescar('presupuesto', forzar=True)).pack(side='left', padx=5)
         
         frame_categorias_container = ttk.LabelFrame(self.tab_presupuesto_mensual, text=" Presupuesto por Categoría", padding=10)
         frame_categorias_container.pack(fill='both', expand=True, padx=10, pady=10)
@@ -1547,8 +3341,10 @@ class SistemaFinancieroAgricolaSeguro:
         
         self.presupuesto_mensual_entries = {}
         self.presupuesto_mensual_labels_modificado = {}
+        self.filas_presupuesto = {}
         
         self.regenerar_presupuesto_categorias()
+        self.catalogo_categorias.suscribir('presupuesto', self.regenerar_presupuesto_categorias, self.aplicar_cambio_presupuesto)
         
         frame_botones = ttk.Frame(self.tab_presupuesto_mensual)
         frame_botones.pack(fill='x', padx=10, pady=10)
@@ -1561,67 +3357,77 @@ class SistemaFinancieroAgricolaSeguro:
         self.cargar_presupuesto_mes()
     
     def regenerar_presupuesto_categorias(self):
-        for widget in self.frame_categorias_presupuesto.winfo_children():
-            widget.destroy()
-        
-        self.presupuesto_mensual_entries.clear()
-        self.presupuesto_mensual_labels_modificado.clear()
-        
-        todas_categorias = {}
-        for cat, subcats in self.categorias_agricolas.items():
-            todas_categorias[cat] = list(subcats)
-        for cat, subcats in self.categorias_personalizadas.items():
-            if cat in todas_categorias:
-                todas_categorias[cat] = list(set(todas_categorias[cat] + subcats))
-            else:
-                todas_categorias[cat] = list(subcats)
+        # Solo se crean o destruyen las filas de las categorías que cambiaron; el resto conserva sus widgets
+        categorias = self.catalogo_categorias.categorias()
+        for categoria in set(self.filas_presupuesto) - set(categorias):
+            self.quitar_fila_presupuesto(categoria)
         
-        for row, categoria in enumerate(sorted(todas_categorias.keys())):
-            frame_cat = tk.Frame(self.frame_categorias_presupuesto, bg='#e8f5e9', relief='raised', bd=2)
-            frame_cat.grid(row=row, column=0, sticky='ew', padx=5, pady=5)
-            self.frame_categorias_presupuesto.grid_columnconfigure(0, weight=1)
-            
-            tipo = ""
-            if categoria in self.categorias_personalizadas and categoria not in self.categorias_agricolas:
-                tipo = " [PERSONALIZADA]"
-            
-            tk.Label(frame_cat, text=categoria + tipo, font=('Arial', 11, 'bold'), bg='#e8f5e9', anchor='w').grid(row=0, column=0, sticky='w', padx=10, pady=5)
-            tk.Label(frame_cat, text="Monto $:", bg='#e8f5e9').grid(row=0, column=1, padx=5)
-            entry = ttk.Entry(frame_cat, width=15, font=('Arial', 10))
-            entry.grid(row=0, column=2, padx=5)
-            entry.insert(0, "0.00")
-            self.presupuesto_mensual_entries[categoria] = entry
-            
-            if self.puede_modificar():
-                label_mod = tk.Label(frame_cat, text="", bg='#e8f5e9', font=('Arial', 9, 'italic'), fg='red')
-                label_mod.grid(row=0, column=3, padx=10)
-                self.presupuesto_mensual_labels_modificado[categoria] = label_mod
-                ttk.Button(frame_cat, text=" Modificar", command=lambda c=categoria: self.modificar_presupuesto_categoria(c)).grid(row=0, column=4, padx=5)
-            else:
-                entry.config(state='readonly')
+        mes = self.combo_mes_presupuesto.get()
+        siguiente = None
+        for categoria in reversed(categorias):
+            if categoria not in self.filas_presupuesto:
+                self.crear_fila_presupuesto(categoria, siguiente)
+                self.mostrar_presupuesto_categoria(mes, categoria)
+            siguiente = self.filas_presupuesto[categoria]
+        return True
+
+    def aplicar_cambio_presupuesto(self, categoria, solo_subcategorias):
+        # Hay una fila por categoría: los cambios de subcategorías no afectan a la cuadrícula
+        if solo_subcategorias:
+            return
+        if categoria in self.catalogo_categorias:
+            siguiente = self.filas_presupuesto.get(self.catalogo_categorias.siguiente(categoria))
+            self.crear_fila_presupuesto(categoria, siguiente)
+            self.mostrar_presupuesto_categoria(self.combo_mes_presupuesto.get(), categoria)
+        elif categoria in self.filas_presupuesto:
+            self.quitar_fila_presupuesto(categoria)
+
+    def quitar_fila_presupuesto(self, categoria):
+        self.filas_presupuesto.pop(categoria).destroy()
+        del self.presupuesto_mensual_entries[categoria]
+        self.presupuesto_mensual_labels_modificado.pop(categoria, None)
+
+    def crear_fila_presupuesto(self, categoria, siguiente=None):
+        frame_cat = tk.Frame(self.frame_categorias_presupuesto, bg='#e8f5e9', relief='raised', bd=2)
+        # pack con before= inserta la fila en su posición sin reubicar las demás
+        if siguiente is None:
+            frame_cat.pack(fill='x', padx=5, pady=5)
+        else:
+            frame_cat.pack(fill='x', padx=5, pady=5, before=siguiente)
+        self.filas_presupuesto[categoria] = frame_cat
         
-        self.cargar_presupuesto_mes()
+        tipo = ""
+        if self.catalogo_categorias.tipo(categoria) == "PERSONALIZADA":
+            tipo = " [PERSONALIZADA]"
+        
+        tk.Label(frame_cat, text=categoria + tipo, font=('Arial', 11, 'bold'), bg='#e8f5e9', anchor='w').grid(row=0, column=0, sticky='w', padx=10, pady=5)
+        tk.Label(frame_cat, text="Monto $:", bg='#e8f5e9').grid(row=0, column=1, padx=5)
+        entry = ttk.Entry(frame_cat, width=15, font=('Arial', 10))
+        entry.grid(row=0, column=2, padx=5)
+        entry.insert(0, "0.00")
+        self.presupuesto_mensual_entries[categoria] = entry
+        
+        if self.puede_modificar():
+            label_mod = tk.Label(frame_cat, text="", bg='#e8f5e9', font=('Arial', 9, 'italic'), fg='red')
+            label_mod.grid(row=0, column=3, padx=10)
+            self.presupuesto_mensual_labels_modificado[categoria] = label_mod
+            ttk.Button(frame_cat, text=" Modificar", command=lambda c=categoria: self.modificar_presupuesto_categoria(c)).grid(row=0, column=4, padx=5)
+        else:
+            entry.config(state='readonly')
 
     def cargar_presupuesto_mes(self, event=None):
         mes = self.combo_mes_presupuesto.get()
-        if mes in self.presupuesto_mensual_por_mes:
-            presupuesto_mes = self.presupuesto_mensual_por_mes[mes]
-            for categoria, entry in self.presupuesto_mensual_entries.items():
-                entry.delete(0, tk.END)
-                entry.insert(0, f"{presupuesto_mes.get(categoria, 0.00):.2f}")
-                if self.puede_modificar():
-                    if mes in self.presupuesto_modificado and categoria in self.presupuesto_modificado[mes] and self.presupuesto_modificado[mes][categoria]:
-                        self.presupuesto_mensual_labels_modificado[categoria].config(text=" Modificado")
-                    else: 
-                        self.presupuesto_mensual_labels_modificado[categoria].config(text="")
-        else:
-            for entry in self.presupuesto_mensual_entries.values():
-                entry.delete(0, tk.END)
-                entry.insert(0, "0.00")
-            if self.puede_modificar():
-                for label in self.presupuesto_mensual_labels_modificado.values():
-                    label.config(text="")
+        for categoria in self.presupuesto_mensual_entries:
+            self.mostrar_presupuesto_categoria(mes, categoria)
 
+    def mostrar_presupuesto_categoria(self, mes, categoria):
+        entry = self.presupuesto_mensual_entries[categoria]
+        entry.delete(0, tk.END)
+        entry.insert(0, f"{self.presupuesto_mensual_por_mes.get(mes, {}).get(categoria, 0.00):.2f}")
+        if self.puede_modificar():
+            modificado = self.presupuesto_modificado.get(mes, {}).get(categoria)
+            self.presupuesto_mensual_labels_modificado[categoria].config(text=" Modificado" if modificado else "")
+    
     def guardar_presupuesto_mes(self):
         if not self.puede_modificar():
             messagebox.showerror("Error", "No tiene permisos para guardar presupuestos")
@@ -1632,7 +3438,8 @@ class SistemaFinancieroAgricolaSeguro:
         for categoria, entry in self.presupuesto_mensual_entries.items():
             try: self.presupuesto_mensual_por_mes[mes][categoria] = float(entry.get())
             except ValueError: return messagebox.showerror("Error", f"Monto inválido en '{categoria}'")
-        self.guardar_datos()
+        self.marcar_modificado('presupuesto_mensual')
+        self.flush()
         self.registrar_actividad("Guardar presupuesto", f"Mes: {mes}")
         messagebox.showinfo("Éxito", f"Presupuesto de {mes} guardado correctamente")
 
@@ -1687,7 +3494,8 @@ class SistemaFinancieroAgricolaSeguro:
                 try: presupuesto_actual[categoria] = float(entry.get())
                 except: return messagebox.showerror("Error", "Montos inválidos")
             for mes in self.meses: self.presupuesto_mensual_por_mes[mes] = presupuesto_actual.copy()
-            self.guardar_datos()
+            self.marcar_modificado('presupuesto_mensual')
+            self.flush()
             messagebox.showinfo("Éxito", "Presupuesto aplicado a todos los meses")
 
     def mostrar_resumen_anual(self):
@@ -1820,46 +3628,8 @@ class SistemaFinancieroAgricolaSeguro:
                 scrollbar_cat.pack(side="right", fill="y")
                 
                 self.proveedor_categorias_vars = {}
-                
-                todas_cats = {**self.categorias_agricolas, **self.categorias_personalizadas}
-                
-                check_row = 0
-                for categoria, subcategorias in sorted(todas_cats.items()):
-                    frame_cat = tk.LabelFrame(
-                        frame_categorias_checks,
-                        text=categoria,
-                        font=('Arial', 10, 'bold'),
-                        padx=10,
-                        pady=5
-                    )
-                    frame_cat.grid(row=check_row, column=0, sticky='ew', padx=5, pady=5)
-                    
-                    var_cat = tk.BooleanVar()
-                    self.proveedor_categorias_vars[categoria] = {
-                        'principal': var_cat,
-                        'subcategorias': {}
-                    }
-                    
-                    tk.Checkbutton(
-                        frame_cat,
-                        text=f"✓ {categoria} (todas)",
-                        variable=var_cat,
-                        font=('Arial', 9, 'bold'),
-                        command=lambda c=categoria: self.toggle_todas_subcategorias(c)
-                    ).pack(anchor='w')
-                    
-                    for subcat in subcategorias:
-                        var_subcat = tk.BooleanVar()
-                        self.proveedor_categorias_vars[categoria]['subcategorias'][subcat] = var_subcat
-                        
-                        tk.Checkbutton(
-                            frame_cat,
-                            text=f"  • {subcat}",
-                            variable=var_subcat,
-                            font=('Arial', 9)
-                        ).pack(anchor='w', padx=20)
-                    
-                    check_row += 1
+                self.marcos_categorias_prov = {}
+                self.checks_subcategorias_prov = {}
                 
                 row += 1
                 
@@ -1890,6 +3660,24 @@ class SistemaFinancieroAgricolaSeguro:
                     command=self.refrescar_categorias_proveedores
                 ).pack(side='left', padx=5)
             
+            frame_busqueda = ttk.Frame(scrollable_frame)
+            frame_busqueda.pack(fill='x', padx=10, pady=(10, 0))
+            
+            tk.Label(frame_busqueda, text="🔍 Buscar:").pack(side='left', padx=5)
+            self.entry_buscar_proveedor = ttk.Entry(frame_busqueda, width=30)
+            self.entry_buscar_proveedor.pack(side='left', padx=5)
+            self.entry_buscar_proveedor.bind('<KeyRelease>', self.filtrar_proveedores)
+            
+            tk.Label(frame_busqueda, text="Categoría:").pack(side='left', padx=(15, 5))
+            self.combo_filtro_proveedores = ttk.Combobox(frame_busqueda, values=['Todas'] + self.catalogo_categorias.categorias(),
+                                                         state='readonly', width=30)
+            self.combo_filtro_proveedores.current(0)
+            self.combo_filtro_proveedores.pack(side='left', padx=5)
+            self.combo_filtro_proveedores.bind('<<ComboboxSelected>>', self.filtrar_proveedores)
+            
+            self.label_resultados_proveedores = tk.Label(frame_busqueda, text="", fg='#666')
+            self.label_resultados_proveedores.pack(side='left', padx=15)
+            
             frame_lista = ttk.LabelFrame(
                 scrollable_frame, # Modificado: ahora se asigna al scrollable_frame
                 text="📋 Lista de Proveedores",
@@ -1917,61 +3705,107 @@ class SistemaFinancieroAgricolaSeguro:
                 self.tree_proveedores.column(col, width=anchos[col], anchor='w')
             
             self.tree_proveedores.pack(fill='both', expand=True)
+            self.filas_proveedores = set()
             
             if self.puede_modificar():
                 self.tree_proveedores.bind('<Double-Button-1>', self.cargar_proveedor_seleccionado)
             
+            self.actualizar_categorias_proveedores()
+            self.catalogo_categorias.suscribir('proveedores', self.actualizar_categorias_proveedores, self.aplicar_cambio_proveedores)
             self.actualizar_lista_proveedores()
 
     def refrescar_categorias_proveedores(self):
         if not self.puede_modificar():
             messagebox.showerror("Error", "No tiene permisos para modificar proveedores")
             return
-            
-        self.actualizar_todas_categorias_combos()
+        self.catalogo_categorias.refrescar('proveedores', forzar=True)
+        messagebox.showinfo("Actualizado", "✅ Categorías de proveedores actualizadas correctamente.")
+
+    def actualizar_categorias_proveedores(self):
+        self.actualizar_combo_categorias(self.combo_filtro_proveedores, ['Todas'] + self.catalogo_categorias.categorias())
         if not hasattr(self, 'frame_categorias_prov'):
-            messagebox.showinfo("Info", "Primero abra el formulario de proveedores.")
-            return
+            # Sin permisos de edición la pestaña no tiene la matriz de casillas: el filtro es todo lo que hay que pintar
+            return True
             
-        for widget in self.frame_categorias_prov.winfo_children():
-            widget.destroy()
+        # Se aplican solo las altas y bajas; las casillas existentes conservan su estado marcado
+        vista = self.catalogo_categorias.vista()
+        for categoria in set(self.marcos_categorias_prov) - set(vista):
+            self.quitar_marco_categoria_proveedor(categoria)
+        
+        siguiente = None
+        for categoria in reversed(vista):
+            if categoria not in self.marcos_categorias_prov:
+                self.crear_marco_categoria_proveedor(categoria, siguiente)
+            self.sincronizar_subcategorias_proveedor(categoria, vista[categoria])
+            siguiente = self.marcos_categorias_prov[categoria]
             
-        self.proveedor_categorias_vars = {}
-        todas_cats = {cat: list(subcats) for cat, subcats in self.categorias_agricolas.items()}
-        for cat, subcats in self.categorias_personalizadas.items():
-            if cat in todas_cats:
-                todas_cats[cat] = list(set(todas_cats[cat] + list(subcats)))
-            else:
-                todas_cats[cat] = list(subcats)
-                
-        check_row = 0
-        for categoria, subcategorias in sorted(todas_cats.items()):
-            frame_cat = tk.LabelFrame(
-                self.frame_categorias_prov, text=categoria,
-                font=('Arial', 10, 'bold'), padx=10, pady=5
-            )
-            frame_cat.grid(row=check_row, column=0, sticky='ew', padx=5, pady=5)
-            var_cat = tk.BooleanVar()
-            self.proveedor_categorias_vars[categoria] = {'principal': var_cat, 'subcategorias': {}}
-            tk.Checkbutton(
-                frame_cat, text=f"✓ {categoria} (todas)", variable=var_cat,
-                font=('Arial', 9, 'bold'),
-                command=lambda c=categoria: self.toggle_todas_subcategorias(c)
-            ).pack(anchor='w')
-            for subcat in subcategorias:
+        self.frame_categorias_prov.update_idletasks()
+        self.canvas_categorias_prov.configure(scrollregion=self.canvas_categorias_prov.bbox("all"))
+        return True
+
+    def aplicar_cambio_proveedores(self, categoria, solo_subcategorias):
+        if not solo_subcategorias:
+            self.actualizar_combo_categorias(self.combo_filtro_proveedores, ['Todas'] + self.catalogo_categorias.categorias())
+        if not hasattr(self, 'frame_categorias_prov'):
+            return
+        if categoria in self.catalogo_categorias:
+            if categoria not in self.marcos_categorias_prov:
+                siguiente = self.marcos_categorias_prov.get(self.catalogo_categorias.siguiente(categoria))
+                self.crear_marco_categoria_proveedor(categoria, siguiente)
+            self.sincronizar_subcategorias_proveedor(categoria, self.catalogo_categorias.subcategorias(categoria))
+        elif categoria in self.marcos_categorias_prov:
+            self.quitar_marco_categoria_proveedor(categoria)
+        self.frame_categorias_prov.update_idletasks()
+        self.canvas_categorias_prov.configure(scrollregion=self.canvas_categorias_prov.bbox("all"))
+
+    def quitar_marco_categoria_proveedor(self, categoria):
+        self.marcos_categorias_prov.pop(categoria).destroy()
+        del self.checks_subcategorias_prov[categoria]
+        del self.proveedor_categorias_vars[categoria]
+
+    def crear_marco_categoria_proveedor(self, categoria, siguiente=None):
+        frame_cat = tk.LabelFrame(
+            self.frame_categorias_prov, text=categoria,
+            font=('Arial', 10, 'bold'), padx=10, pady=5
+        )
+        if siguiente is None:
+            frame_cat.pack(fill='x', padx=5, pady=5)
+        else:
+            frame_cat.pack(fill='x', padx=5, pady=5, before=siguiente)
+        var_cat = tk.BooleanVar()
+        self.proveedor_categorias_vars[categoria] = {'principal': var_cat, 'subcategorias': {}}
+        tk.Checkbutton(
+            frame_cat, text=f"✓ {categoria} (todas)", variable=var_cat,
+            font=('Arial', 9, 'bold'),
+            command=lambda c=categoria: self.toggle_todas_subcategorias(c)
+        ).pack(anchor='w')
+        self.marcos_categorias_prov[categoria] = frame_cat
+        self.checks_subcategorias_prov[categoria] = {}
+
+    def sincronizar_subcategorias_proveedor(self, categoria, subcategorias):
+        variables = self.proveedor_categorias_vars[categoria]['subcategorias']
+        if list(variables) == subcategorias:
+            return
+        checks = self.checks_subcategorias_prov[categoria]
+        for subcat in set(checks) - set(subcategorias):
+            checks.pop(subcat).destroy()
+            del variables[subcat]
+        
+        siguiente = None
+        for subcat in reversed(subcategorias):
+            if subcat not in checks:
                 var_subcat = tk.BooleanVar()
-                self.proveedor_categorias_vars[categoria]['subcategorias'][subcat] = var_subcat
-                tk.Checkbutton(
-                    frame_cat, text=f"  • {subcat}", variable=var_subcat, font=('Arial', 9)
-                ).pack(anchor='w', padx=20)
-            check_row += 1
-            
-        if hasattr(self, 'canvas_categorias_prov'):
-            self.frame_categorias_prov.update_idletasks()
-            self.canvas_categorias_prov.configure(
-                scrollregion=self.canvas_categorias_prov.bbox("all")
-            )
-        messagebox.showinfo("Actualizado", "✅ Categorías de proveedores actualizadas correctamente.")
+                variables[subcat] = var_subcat
+                check = tk.Checkbutton(
+                    self.marcos_categorias_prov[categoria], text=f"  • {subcat}", variable=var_subcat, font=('Arial', 9)
+                )
+                if siguiente is None:
+                    check.pack(anchor='w', padx=20)
+                else:
+                    check.pack(anchor='w', padx=20, before=siguiente)
+                checks[subcat] = check
+            siguiente = checks[subcat]
+        self.proveedor_categorias_vars[categoria]['subcategorias'] = {subcat: variables[subcat] for subcat in subcategorias}
 
     def toggle_todas_subcategorias(self, categoria):
         if not self.puede_modificar():
@@ -2009,31 +3843,51 @@ class SistemaFinancieroAgricolaSeguro:
                 "Debe seleccionar al menos una categoría/subcategoría")
             return
         
-        proveedor_id = None
-        for pid, prov in self.proveedores.items():
-            if prov['nombre'].lower() == nombre.lower():
-                proveedor_id = pid
-                break
-        
-        if proveedor_id is None:
-            proveedor_id = str(len(self.proveedores) + 1)
-        
-        self.proveedores[proveedor_id] = {
+        proveedor_id = self.registrar_proveedor({
             'nombre': nombre,
             'telefono': self.entry_proveedor_telefono.get().strip(),
             'direccion': self.entry_proveedor_direccion.get().strip(),
             'notas': self.text_proveedor_notas.get('1.0', 'end').strip(),
             'categorias': categorias_seleccionadas,
             'fecha_registro': datetime.now().strftime('%Y-%m-%d')
-        }
+        }, self.indice_proveedores.id_por_nombre(nombre))
         
-        self.guardar_datos()
-        self.actualizar_lista_proveedores()
+        self.flush()
+        self.actualizar_fila_proveedor(proveedor_id)
+        self.refrescar_analisis_proveedores()
         self.limpiar_form_proveedor()
         
         self.registrar_actividad("Guardar proveedor", f"Proveedor: {nombre}")
         messagebox.showinfo("Éxito", f"Proveedor '{nombre}' guardado correctamente")
 
+    def nuevo_id_proveedor(self):
+        # Secuencia persistida: un id no se reutiliza aunque se eliminen proveedores
+        self.secuencias['proveedores'] = self.secuencias.get('proveedores', 0) + 1
+        self.marcar_modificado('secuencias')
+        return str(self.secuencias['proveedores'])
+
+    def registrar_proveedor(self, datos, proveedor_id=None):
+        # El índice valida el nombre antes de tocar el catálogo; sirve igual para el formulario que para importaciones masivas
+        nuevo = proveedor_id is None
+        if nuevo:
+            if self.indice_proveedores.id_por_nombre(datos['nombre']) is not None:
+                raise ValueError(f"Ya existe un proveedor con el nombre '{datos['nombre']}'")
+            proveedor_id = self.nuevo_id_proveedor()
+        self.indice_proveedores.agregar(proveedor_id, datos)
+        self.proveedores[proveedor_id] = datos
+        self.marcar_modificado('proveedores')
+        self.vincular_gastos_pendientes(proveedor_id)
+        return proveedor_id
+
+    def vincular_gastos_pendientes(self, prov_id):
+        # Gastos registrados con este nombre antes de que el proveedor estuviera en el catálogo
+        vinculados = self.resumen_proveedores.vincular(prov_id, self.indice_proveedores.nombres[prov_id])
+        for t in vinculados:
+            self.almacenamiento.registrar_transaccion('cambio', t.a_dict())
+        if vinculados:
+            self.marcar_modificado('transacciones')
+        return len(vinculados)
+
     def cargar_proveedor_seleccionado(self, event):
         if not self.puede_modificar():
             return
@@ -2079,24 +3933,39 @@ class SistemaFinancieroAgricolaSeguro:
             for var in vars_dict['subcategorias'].values():
                 var.set(False)
 
+    def valores_fila_proveedor(self, prov_id):
+        prov = self.proveedores[prov_id]
+        cats_str = []
+        for cat, subcats in prov.get('categorias', {}).items():
+            cats_str.append(f"{cat}: {', '.join(subcats[:3])}")
+            if len(subcats) > 3:
+                cats_str[-1] += "..."
+        return (prov_id, prov['nombre'], prov.get('telefono', ''), ' | '.join(cats_str), prov.get('direccion', '')[:50])
+
     def actualizar_lista_proveedores(self):
-        for item in self.tree_proveedores.get_children():
-            self.tree_proveedores.delete(item)
-        
-        for prov_id, prov in self.proveedores.items():
-            cats_str = []
-            for cat, subcats in prov.get('categorias', {}).items():
-                cats_str.append(f"{cat}: {', '.join(subcats[:3])}")
-                if len(subcats) > 3:
-                    cats_str[-1] += "..."
-            
-            self.tree_proveedores.insert('', 'end', values=(
-                prov_id,
-                prov['nombre'],  
-                prov.get('telefono', ''),
-                ' | '.join(cats_str),
-                prov.get('direccion', '')[:50]
-            ))
+        # Cada proveedor tiene su fila creada una sola vez (iid = id); buscar y filtrar solo la engancha o desengancha
+        self.tree_proveedores.delete(*self.filas_proveedores)
+        for prov_id in self.proveedores:
+            self.tree_proveedores.insert('', 'end', iid=prov_id, values=self.valores_fila_proveedor(prov_id))
+        self.filas_proveedores = set(self.proveedores)
+        self.filtrar_proveedores()
+
+    def actualizar_fila_proveedor(self, prov_id):
+        if prov_id in self.filas_proveedores:
+            self.tree_proveedores.item(prov_id, values=self.valores_fila_proveedor(prov_id))
+        else:
+            self.tree_proveedores.insert('', 'end', iid=prov_id, values=self.valores_fila_proveedor(prov_id))
+            self.filas_proveedores.add(prov_id)
+        self.filtrar_proveedores()
+
+    def filtrar_proveedores(self, event=None):
+        categoria = self.combo_filtro_proveedores.get()
+        ids = self.indice_proveedores.buscar(
+            self.entry_buscar_proveedor.get(),
+            categoria=None if categoria in ('', 'Todas') else categoria
+        )
+        self.tree_proveedores.set_children('', *ids)
+        self.label_resultados_proveedores.config(text=f"{len(ids)} de {len(self.proveedores)} proveedores")
     
     def eliminar_proveedor(self):
         if not self.puede_modificar():
@@ -2121,14 +3990,106 @@ class SistemaFinancieroAgricolaSeguro:
         
         if prov_id in self.proveedores:
             del self.proveedores[prov_id]
-            self.guardar_datos()
-            self.actualizar_lista_proveedores()
+            self.indice_proveedores.quitar(prov_id)
+            self.marcar_modificado('proveedores')
+            self.flush()
+            self.tree_proveedores.delete(prov_id)
+            self.filas_proveedores.discard(prov_id)
+            self.filtrar_proveedores()
             self.limpiar_form_proveedor()
             self.registrar_actividad("Eliminar proveedor", f"Proveedor: {prov_nombre}")
             messagebox.showinfo("Éxito", f"Proveedor '{prov_nombre}' eliminado correctamente")
         else:
             messagebox.showerror("Error", "Proveedor no encontrado")
 
+    def crear_tab_analisis_proveedores(self):
+        frame_seleccion = ttk.Frame(self.tab_analisis_proveedores)
+        frame_seleccion.pack(fill='x', padx=10, pady=10)
+        tk.Label(frame_seleccion, text="Año:", font=('Arial', 12, 'bold')).pack(side='left', padx=5)
+        años = sorted(set(self.indice_gastos.años()) | {self.año_actual}, reverse=True)
+        self.combo_año_analisis = ttk.Combobox(frame_seleccion, values=[str(a) for a in años], state='readonly', width=10, font=('Arial', 11))
+        self.combo_año_analisis.set(str(self.año_actual))
+        self.combo_año_analisis.pack(side='left', padx=5)
+        self.combo_año_analisis.bind('<<ComboboxSelected>>', lambda e: self.actualizar_analisis_proveedores())
+        self.label_total_analisis = tk.Label(frame_seleccion, text="", font=('Arial', 11))
+        self.label_total_analisis.pack(side='left', padx=15)
+        
+        frame_principales = ttk.LabelFrame(self.tab_analisis_proveedores, text=f" Principales Proveedores (top {TOP_PROVEEDORES})", padding=10)
+        frame_principales.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        scroll_y = ttk.Scrollbar(frame_principales, orient='vertical')
+        columnas = ('posicion', 'proveedor', 'total', 'porcentaje', 'meses')
+        self.tree_principales_proveedores = ttk.Treeview(frame_principales, columns=columnas, show='headings', yscrollcommand=scroll_y.set)
+        scroll_y.config(command=self.tree_principales_proveedores.yview)
+        for col, texto, w in zip(columnas, ('#', 'Proveedor', 'Total', '% del Año', 'Meses con Compras'), (50, 300, 150, 100, 150)):
+            self.tree_principales_proveedores.heading(col, text=texto)
+            self.tree_principales_proveedores.column(col, width=w)
+        self.tree_principales_proveedores.pack(side='left', fill='both', expand=True)
+        scroll_y.pack(side='right', fill='y')
+        self.tree_principales_proveedores.bind('<<TreeviewSelect>>', self.actualizar_detalle_proveedor)
+        
+        frame_detalle = ttk.Frame(self.tab_analisis_proveedores)
+        frame_detalle.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        frame_categorias = ttk.LabelFrame(frame_detalle, text=" Gasto por Categoría del Proveedor", padding=10)
+        frame_categorias.pack(side='left', fill='both', expand=True, padx=(0, 5))
+        self.tree_categorias_proveedor = ttk.Treeview(frame_categorias, columns=('categoria', 'total', 'porcentaje'), show='headings', height=8)
+        for col, texto, w in zip(('categoria', 'total', 'porcentaje'), ('Categoría', 'Total', '%'), (250, 150, 80)):
+            self.tree_categorias_proveedor.heading(col, text=texto)
+            self.tree_categorias_proveedor.column(col, width=w)
+        self.tree_categorias_proveedor.pack(fill='both', expand=True)
+        
+        frame_meses = ttk.LabelFrame(frame_detalle, text=" Gasto Mensual del Proveedor", padding=10)
+        frame_meses.pack(side='left', fill='both', expand=True, padx=(5, 0))
+        self.tree_meses_proveedor = ttk.Treeview(frame_meses, columns=('mes', 'total'), show='headings', height=8)
+        for col, texto, w in zip(('mes', 'total'), ('Mes', 'Total'), (150, 150)):
+            self.tree_meses_proveedor.heading(col, text=texto)
+            self.tree_meses_proveedor.column(col, width=w)
+        self.tree_meses_proveedor.pack(fill='both', expand=True)
+        
+        self.actualizar_analisis_proveedores()
+
+    def actualizar_analisis_proveedores(self):
+        año = int(self.combo_año_analisis.get())
+        seleccion = self.tree_principales_proveedores.selection()
+        total_año = self.indice_gastos.gastado(año)
+        
+        self.tree_principales_proveedores.delete(*self.tree_principales_proveedores.get_children())
+        for posicion, (prov_id, total) in enumerate(self.resumen_proveedores.principales(año, TOP_PROVEEDORES), 1):
+            meses = sum(1 for monto in self.resumen_proveedores.mensual(prov_id, año) if monto)
+            porcentaje = (total / total_año * 100) if total_año > 0 else 0
+            self.tree_principales_proveedores.insert('', 'end', iid=prov_id or 'sin_proveedor', values=(
+                posicion, self.nombre_proveedor(prov_id), f"${total:,.2f}", f"{porcentaje:.1f}%", meses
+            ))
+        
+        con_compras = len(self.resumen_proveedores.por_año.get(año, {}))
+        self.label_total_analisis.config(text=f"Gasto del año: ${total_año:,.2f} · {con_compras} proveedores con compras")
+        
+        if seleccion and self.tree_principales_proveedores.exists(seleccion[0]):
+            self.tree_principales_proveedores.selection_set(seleccion[0])
+        self.actualizar_detalle_proveedor()
+
+    def actualizar_detalle_proveedor(self, event=None):
+        self.tree_categorias_proveedor.delete(*self.tree_categorias_proveedor.get_children())
+        self.tree_meses_proveedor.delete(*self.tree_meses_proveedor.get_children())
+        seleccion = self.tree_principales_proveedores.selection()
+        if not seleccion:
+            return
+        
+        año = int(self.combo_año_analisis.get())
+        prov_id = '' if seleccion[0] == 'sin_proveedor' else seleccion[0]
+        total = self.resumen_proveedores.gastado(prov_id, año)
+        for categoria, monto in self.resumen_proveedores.categorias(prov_id, año):
+            porcentaje = (monto / total * 100) if total > 0 else 0
+            self.tree_categorias_proveedor.insert('', 'end', values=(categoria, f"${monto:,.2f}", f"{porcentaje:.1f}%"))
+        for mes, monto in zip(self.meses, self.resumen_proveedores.mensual(prov_id, año)):
+            if monto:
+                self.tree_meses_proveedor.insert('', 'end', values=(mes, f"${monto:,.2f}"))
+
+    def refrescar_analisis_proveedores(self):
+        if hasattr(self, 'tree_principales_proveedores'):
+            self.actualizar_analisis_proveedores()
+
     def crear_tab_registro(self):
         frame_superior = ttk.LabelFrame(self.tab_registro, text=" Registrar Nuevo Gasto", padding=15)
         frame_superior.pack(fill='x', padx=10, pady=10)
@@ -2142,8 +4103,7 @@ class SistemaFinancieroAgricolaSeguro:
         self.entry_fecha.insert(0, datetime.now().strftime('%Y-%m-%d'))
         
         tk.Label(fila1, text="Categoría:", bg='white').pack(side='left', padx=15)
-        todas_cats_gasto = sorted(list({**self.categorias_agricolas, **self.categorias_personalizadas}.keys()))
-        self.combo_categoria = ttk.Combobox(fila1, values=todas_cats_gasto, state='readonly', width=25)
+        self.combo_categoria = ttk.Combobox(fila1, values=self.catalogo_categorias.categorias(), state='readonly', width=25)
         self.combo_categoria.pack(side='left', padx=5)
         self.combo_categoria.bind('<<ComboboxSelected>>', self.actualizar_subcategorias)
         
@@ -2159,7 +4119,7 @@ class SistemaFinancieroAgricolaSeguro:
         self.entry_monto.pack(side='left', padx=5)
         
         tk.Label(fila2, text="Proveedor:", bg='white').pack(side='left', padx=15)
-        nombres_proveedores = [p['nombre'] for p in self.proveedores.values()]
+        nombres_proveedores = sorted((p['nombre'] for p in self.proveedores.values()), key=normalizar_nombre)
         self.combo_proveedor = ttk.Combobox(fila2, values=nombres_proveedores, width=25)
         self.combo_proveedor.pack(side='left', padx=5)
         
@@ -2185,7 +4145,14 @@ class SistemaFinancieroAgricolaSeguro:
         frame_tabla.pack(fill='both', expand=True, padx=10, pady=10)
         
         scroll_y, scroll_x = ttk.Scrollbar(frame_tabla, orient='vertical'), ttk.Scrollbar(frame_tabla, orient='horizontal')
-        self.tree_gastos = ttk.Treeview(frame_tabla, columns=('fecha', 'categoria', 'subcategoria', 'monto', 'proveedor', 'descripcion'), show='headings', yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+        
+        def al_desplazar_gastos(primero, ultimo):
+            scroll_y.set(primero, ultimo)
+            if not self.revision_gastos_pendiente:
+                self.revision_gastos_pendiente = True
+                self.root.after_idle(self.revisar_ventana_gastos)
+        
+        self.tree_gastos = ttk.Treeview(frame_tabla, columns=('fecha', 'categoria', 'subcategoria', 'monto', 'proveedor', 'descripcion'), show='headings', yscrollcommand=al_desplazar_gastos, xscrollcommand=scroll_x.set)
         scroll_y.config(command=self.tree_gastos.yview)
         scroll_x.config(command=self.tree_gastos.xview)
         
@@ -2196,29 +4163,39 @@ class SistemaFinancieroAgricolaSeguro:
         self.tree_gastos.grid(row=0, column=0, sticky='nsew')
         scroll_y.grid(row=0, column=1, sticky='ns')
         scroll_x.grid(row=1, column=0, sticky='ew')
+        self.label_estado_gastos = tk.Label(frame_tabla, text="", font=('Arial', 9, 'italic'), fg='#666')
+        self.label_estado_gastos.grid(row=2, column=0, sticky='w')
         frame_tabla.grid_rowconfigure(0, weight=1)
         frame_tabla.grid_columnconfigure(0, weight=1)
         
+        self.catalogo_categorias.suscribir('registro', self.actualizar_categorias_gasto, self.aplicar_cambio_registro)
         self.actualizar_tabla_gastos()
 
     def actualizar_subcategorias(self, event=None):
         categoria = self.combo_categoria.get()
-        todas_cats = {cat: list(subcats) for cat, subcats in self.categorias_agricolas.items()}
-        for cat, subcats in self.categorias_personalizadas.items():
-            if cat in todas_cats:
-                todas_cats[cat] = list(set(todas_cats[cat] + list(subcats)))
-            else:
-                todas_cats[cat] = list(subcats)
-                
-        if categoria in todas_cats:
-            self.combo_subcategoria['values'] = sorted(todas_cats[categoria])
+        if categoria in self.catalogo_categorias:
+            self.combo_subcategoria['values'] = self.catalogo_categorias.subcategorias(categoria)
             self.combo_subcategoria.set('')
-            nombres_proveedores = [p['nombre'] for p in self.proveedores.values() if categoria in p.get('categorias', {})]
+            nombres_proveedores = self.indice_proveedores.nombres_en_categoria(self.proveedores, categoria)
             self.combo_proveedor['values'] = nombres_proveedores
 
+    def actualizar_categorias_gasto(self):
+        categoria = self.combo_categoria.get()
+        self.actualizar_combo_categorias(self.combo_categoria, self.catalogo_categorias.categorias(), seleccionar_primera=True)
+        if self.combo_categoria.get() != categoria:
+            self.actualizar_subcategorias()
+        elif categoria in self.catalogo_categorias:
+            self.combo_subcategoria['values'] = self.catalogo_categorias.subcategorias(categoria)
+        return True
+
+    def aplicar_cambio_registro(self, categoria, solo_subcategorias):
+        if not solo_subcategorias:
+            self.actualizar_categorias_gasto()
+        elif categoria == self.combo_categoria.get():
+            self.combo_subcategoria['values'] = self.catalogo_categorias.subcategorias(categoria)
+
     def refrescar_categorias_gasto(self):
-        self.actualizar_todas_categorias_combos()
-        self.actualizar_subcategorias()
+        self.catalogo_categorias.refrescar('registro', forzar=True)
         messagebox.showinfo("Actualizado", "✅ Categorías y subcategorías actualizadas correctamente.")
         
     def registrar_gasto(self):
@@ -2247,10 +4224,7 @@ class SistemaFinancieroAgricolaSeguro:
 
             if mes in self.presupuesto_mensual_por_mes:
                 presupuesto_categoria = self.presupuesto_mensual_por_mes[mes].get(categoria, 0)
-                gastos_categoria_mes = sum(
-                    t['monto'] for t in self.transacciones
-                    if t['categoria'] == categoria and datetime.strptime(t['fecha'], '%Y-%m-%d').month == fecha_obj.month and datetime.strptime(t['fecha'], '%Y-%m-%d').year == fecha_obj.year
-                )
+                gastos_categoria_mes = self.indice_gastos.gastado(fecha_obj.year, fecha_obj.month, categoria)
                 disponible = presupuesto_categoria - gastos_categoria_mes
                 if monto > disponible:
                     diferencia = monto - disponible
@@ -2293,6 +4267,7 @@ class SistemaFinancieroAgricolaSeguro:
                     else:
                         if messagebox.askyesno("Crear Año", f"No existe presupuesto para {año_gasto}.\n¿Desea crearlo ahora?"):
                             self.presupuestos_por_año[str(año_gasto)] = {}
+                            self.marcar_modificado('presupuestos_anuales')
                             self.presupuesto_mensual_por_mes = {}
                         else:
                             return
@@ -2316,17 +4291,15 @@ class SistemaFinancieroAgricolaSeguro:
                     messagebox.showinfo("Fecha Ajustada", f"Fecha cambiada a: {nueva_fecha.strftime('%Y-%m-%d')}\nPor favor registre el gasto nuevamente.")
                     return
 
-            self.transacciones.append({
-                'fecha': fecha,
-                'categoria': categoria,
-                'subcategoria': subcategoria,
-                'monto': monto,
-                'proveedor': proveedor_nombre,
-                'descripcion': descripcion
-            })
-            self.guardar_datos()
+            proveedor_id = self.indice_proveedores.id_por_nombre(proveedor_nombre) if proveedor_nombre else None
+            transaccion = Transaccion(fecha, categoria, subcategoria, monto, proveedor_nombre, descripcion,
+                                      proveedor_id=proveedor_id or '')
+            posicion = self.agregar_transaccion(transaccion)
+            self.marcar_modificado('transacciones')
+            self.flush()
             self.registrar_actividad("Registro de gasto", f"${monto:,.2f} en {categoria}")
-            self.actualizar_tabla_gastos()
+            self.insertar_fila_gasto(posicion, transaccion)
+            self.refrescar_analisis_proveedores()
             self.limpiar_campos_gasto()
             messagebox.showinfo("Éxito", "Gasto registrado correctamente")
 
@@ -2433,12 +4406,7 @@ class SistemaFinancieroAgricolaSeguro:
             if mes_sel and cat_sel:
                 presupuesto = self.presupuesto_mensual_por_mes.get(mes_sel, {}).get(cat_sel, 0)
                 
-                gastado = sum(
-                    t['monto'] for t in self.transacciones
-                    if t.get('categoria') == cat_sel and 
-                    datetime.strptime(t['fecha'], '%Y-%m-%d').strftime('%Y-%m') == 
-                    f"{self.año_actual}-{str(self.meses.index(mes_sel) + 1).zfill(2)}"
-                )
+                gastado = self.indice_gastos.gastado(self.año_actual, self.meses.index(mes_sel) + 1, cat_sel)
                 
                 disponible = presupuesto - gastado
                 
@@ -2538,12 +4506,7 @@ class SistemaFinancieroAgricolaSeguro:
                 presupuesto = self.presupuesto_mensual_por_mes.get(mes_origen, {}).get(cat_origen, 0)
                 
                 mes_idx_origen = self.meses.index(mes_origen) + 1
-                gastado = sum(
-                    t['monto'] for t in self.transacciones
-                    if t.get('categoria') == cat_origen and 
-                    datetime.strptime(t['fecha'], '%Y-%m-%d').strftime('%Y-%m') == 
-                    f"{self.año_actual}-{str(mes_idx_origen).zfill(2)}"
-                )
+                gastado = self.indice_gastos.gastado(self.año_actual, mes_idx_origen, cat_origen)
                 
                 disponible = presupuesto - gastado
                 
@@ -2577,7 +4540,8 @@ class SistemaFinancieroAgricolaSeguro:
                         self.presupuesto_modificado[mes_origen] = {}
                     self.presupuesto_modificado[mes_origen][cat_origen] = True
                     
-                    self.guardar_datos()
+                    self.marcar_modificado('presupuesto_mensual')
+                    self.flush()
                     self.registrar_actividad(
                         "Transferir presupuesto",
                         f"${monto_necesario:,.2f} de {mes_origen}/{cat_origen} a {mes_destino}/{categoria_destino}"
@@ -2624,8 +4588,8 @@ class SistemaFinancieroAgricolaSeguro:
                         self.presupuesto_modificado[mes_destino] = {}
                     self.presupuesto_modificado[mes_destino][categoria_destino] = True
                     
-                    self.guardar_datos()
-                    self.guardar_sobrantes_anuales()
+                    self.marcar_modificado('presupuesto_mensual', 'sobrantes_anuales')
+                    self.flush()
                     self.registrar_actividad(
                         "Usar sobrante",
                         f"${monto_necesario:,.2f} de sobrantes {año_anterior} a {mes_destino}/{categoria_destino}"
@@ -2656,7 +4620,8 @@ class SistemaFinancieroAgricolaSeguro:
                         self.presupuesto_modificado[mes_destino] = {}
                     self.presupuesto_modificado[mes_destino][categoria_destino] = True
                     
-                    self.guardar_datos()
+                    self.marcar_modificado('presupuesto_mensual')
+                    self.flush()
                     self.registrar_actividad(
                         "Agregar presupuesto",
                         f"${monto_necesario:,.2f} agregados a {mes_destino}/{categoria_destino}"
@@ -2702,18 +4667,137 @@ class SistemaFinancieroAgricolaSeguro:
         seleccion = self.tree_gastos.selection()
         if not seleccion: return
         if messagebox.askyesno("Confirmar", "¿Eliminar este gasto?"):
-            valores = self.tree_gastos.item(seleccion[0])['values']
-            for i, t in enumerate(self.transacciones):
-                if t['fecha'] == valores[0] and t['categoria'] == valores[1] and f"${t['monto']:,.2f}" == valores[3]:
-                    del self.transacciones[i]
-                    break
-            self.guardar_datos()
-            self.actualizar_tabla_gastos()
+            transaccion = self.buscar_transaccion(int(seleccion[0]))
+            if transaccion is None:
+                return
+            posicion = self.eliminar_transaccion(transaccion)
+            self.marcar_modificado('transacciones')
+            self.flush()
+            self.quitar_fila_gasto(posicion, transaccion)
+            self.refrescar_analisis_proveedores()
+
+    def buscar_transaccion(self, id_transaccion):
+        # self.transacciones es None cuando las filas se quedan en la base (SQLite)
+        if self.transacciones is not None:
+            return self.transacciones.get(id_transaccion)
+        datos = self.almacenamiento.leer_transaccion(id_transaccion)
+        return Transaccion.desde_dict(datos) if datos else None
+
+    def agregar_transaccion(self, transaccion):
+        transaccion.id = self.almacenamiento.registrar_transaccion('alta', transaccion.a_dict())
+        if self.transacciones is not None:
+            self.transacciones[transaccion.id] = transaccion
+        self.resumen_proveedores.agregar(transaccion)
+        posicion = self.indice_fechas.agregar(transaccion)
+        self.indice_gastos.agregar(transaccion)
+        return posicion
+
+    def eliminar_transaccion(self, transaccion):
+        if self.transacciones is not None:
+            del self.transacciones[transaccion.id]
+        self.indice_gastos.quitar(transaccion)
+        self.resumen_proveedores.quitar(transaccion)
+        self.almacenamiento.registrar_transaccion('baja', transaccion.a_dict())
+        return self.indice_fechas.quitar(transaccion)
+
+    def valores_fila_gasto(self, t):
+        return (t.fecha, t.categoria, t.subcategoria, f"${t.monto:,.2f}", self.nombre_proveedor(t.proveedor_id, t.proveedor), t.descripcion)
+
+    def materializar_fila_gasto(self, indice_tabla, t):
+        # El iid de cada fila es el id de la transacción
+        self.tree_gastos.insert('', indice_tabla, iid=str(t.id), values=self.valores_fila_gasto(t))
+
+    def descartar_filas_gasto(self, iids):
+        self.tree_gastos.delete(*iids)
 
     def actualizar_tabla_gastos(self):
-        for item in self.tree_gastos.get_children(): self.tree_gastos.delete(item)
-        for t in sorted(self.transacciones, key=lambda x: x['fecha'], reverse=True):
-            self.tree_gastos.insert('', 'end', values=(t['fecha'], t['categoria'], t.get('subcategoria', ''), f"${t['monto']:,.2f}", t.get('proveedor', ''), t.get('descripcion', '')))
+        self.tree_gastos.delete(*self.tree_gastos.get_children())
+        self.ventana_gastos = [0, 0]
+        self.ampliar_gastos_abajo()
+
+    def ampliar_gastos_abajo(self):
+        inicio, fin = self.ventana_gastos
+        nuevo_fin = min(fin + TAMAÑO_BLOQUE_GASTOS, len(self.indice_fechas))
+        if nuevo_fin == fin:
+            return
+        primera_visible = self.primera_fila_visible_gastos()
+        for t in self.indice_fechas[fin:nuevo_fin]:
+            self.materializar_fila_gasto('end', t)
+        
+        # Solo se mantiene en el Treeview una ventana acotada; lo que queda muy arriba se descarta
+        exceso = (nuevo_fin - inicio) - MAX_FILAS_GASTOS
+        if exceso > 0:
+            self.descartar_filas_gasto(self.tree_gastos.get_children()[:exceso])
+            inicio += exceso
+            self.mover_gastos_a_fila(primera_visible - exceso)
+        self.ventana_gastos = [inicio, nuevo_fin]
+        self.actualizar_estado_gastos()
+
+    def ampliar_gastos_arriba(self):
+        inicio, fin = self.ventana_gastos
+        nuevo_inicio = max(inicio - TAMAÑO_BLOQUE_GASTOS, 0)
+        if nuevo_inicio == inicio:
+            return
+        primera_visible = self.primera_fila_visible_gastos()
+        for i, t in enumerate(self.indice_fechas[nuevo_inicio:inicio]):
+            self.materializar_fila_gasto(i, t)
+        
+        exceso = (fin - nuevo_inicio) - MAX_FILAS_GASTOS
+        if exceso > 0:
+            self.descartar_filas_gasto(self.tree_gastos.get_children()[-exceso:])
+            fin -= exceso
+        self.mover_gastos_a_fila(primera_visible + (inicio - nuevo_inicio))
+        self.ventana_gastos = [nuevo_inicio, fin]
+        self.actualizar_estado_gastos()
+
+    def primera_fila_visible_gastos(self):
+        total = len(self.tree_gastos.get_children())
+        return int(round(self.tree_gastos.yview()[0] * total)) if total else 0
+
+    def mover_gastos_a_fila(self, fila):
+        total = len(self.tree_gastos.get_children())
+        if total:
+            self.tree_gastos.yview_moveto(max(fila, 0) / total)
+
+    def revisar_ventana_gastos(self):
+        self.revision_gastos_pendiente = False
+        if not self.tree_gastos.winfo_exists():
+            return
+        primero, ultimo = self.tree_gastos.yview()
+        if ultimo >= 0.98 and self.ventana_gastos[1] < len(self.indice_fechas):
+            self.ampliar_gastos_abajo()
+        elif primero <= 0.02 and self.ventana_gastos[0] > 0:
+            self.ampliar_gastos_arriba()
+
+    def insertar_fila_gasto(self, posicion, t):
+        if not hasattr(self, 'tree_gastos'):
+            return
+        inicio, fin = self.ventana_gastos
+        if posicion < inicio:
+            self.ventana_gastos = [inicio + 1, fin + 1]
+        elif posicion < fin or (posicion == fin and fin == len(self.indice_fechas) - 1):
+            self.materializar_fila_gasto(posicion - inicio, t)
+            self.ventana_gastos = [inicio, fin + 1]
+        self.actualizar_estado_gastos()
+
+    def quitar_fila_gasto(self, posicion, t):
+        if not hasattr(self, 'tree_gastos'):
+            return
+        inicio, fin = self.ventana_gastos
+        if posicion < inicio:
+            self.ventana_gastos = [inicio - 1, fin - 1]
+        elif posicion < fin:
+            self.descartar_filas_gasto([str(t.id)])
+            self.ventana_gastos = [inicio, fin - 1]
+            if fin - 1 - inicio < TAMAÑO_BLOQUE_GASTOS:
+                self.ampliar_gastos_abajo()
+        self.actualizar_estado_gastos()
+
+    def actualizar_estado_gastos(self):
+        inicio, fin = self.ventana_gastos
+        total = len(self.indice_fechas)
+        texto = f"Mostrando {inicio + 1:,}–{fin:,} de {total:,} gastos" if total else "Sin gastos registrados"
+        self.label_estado_gastos.config(text=texto)
 
     def crear_tab_control(self):
         frame_seleccion = ttk.Frame(self.tab_control)
@@ -2778,8 +4862,10 @@ class SistemaFinancieroAgricolaSeguro:
         total_presupuestado, total_gastado = 0, 0
         
         if mes_seleccionado in self.presupuesto_mensual_por_mes:
-            for categoria, presupuesto in self.presupuesto_mensual_por_mes[mes_seleccionado].items():
-                gastos = sum(t['monto'] for t in self.transacciones if t['categoria'] == categoria and datetime.strptime(t['fecha'], '%Y-%m-%d').month == mes_numero and datetime.strptime(t['fecha'], '%Y-%m-%d').year == año_actual)
+            presupuesto_mes = self.presupuesto_mensual_por_mes[mes_seleccionado]
+            gastos_mes = self.indice_gastos.gastado_por_categoria(año_actual, mes_numero, presupuesto_mes)
+            for categoria, presupuesto in presupuesto_mes.items():
+                gastos = gastos_mes[categoria]
                 disponible = presupuesto - gastos
                 porcentaje = (gastos / presupuesto * 100) if presupuesto > 0 else 0
                 estado, tag = (" OK", 'ok') if porcentaje <= 75 else (" ALERTA", 'warning') if porcentaje <= 90 else (" CRÍTICO", 'warning') if porcentaje <= 100 else (" EXCEDIDO", 'danger')
@@ -2839,8 +4925,7 @@ class SistemaFinancieroAgricolaSeguro:
             tk.Radiobutton(frame_transferencia, text="A otra categoría (mismo mes)", variable=self.tipo_transferencia, value="categoria").grid(row=0, column=2, sticky='w', padx=5)
             
             tk.Label(frame_transferencia, text="Categoría Origen:").grid(row=1, column=0, sticky='w', padx=5, pady=5)
-            todas_cats_sob = sorted({**self.categorias_agricolas, **self.categorias_personalizadas}.keys())
-            self.combo_categoria_origen_sobrante = ttk.Combobox(frame_transferencia, values=todas_cats_sob, state='readonly', width=25)
+            self.combo_categoria_origen_sobrante = ttk.Combobox(frame_transferencia, values=self.catalogo_categorias.categorias(), state='readonly', width=25)
             self.combo_categoria_origen_sobrante.grid(row=1, column=1, padx=5, pady=5)
             
             tk.Label(frame_transferencia, text="Monto:").grid(row=1, column=2, sticky='w', padx=5, pady=5)
@@ -2852,8 +4937,7 @@ class SistemaFinancieroAgricolaSeguro:
             self.combo_mes_destino.grid(row=2, column=1, padx=5, pady=5)
             
             tk.Label(frame_transferencia, text="Destino (Categoría):").grid(row=2, column=2, sticky='w', padx=5, pady=5)
-            todas_cats_sob2 = sorted({**self.categorias_agricolas, **self.categorias_personalizadas}.keys())
-            self.combo_categoria_destino = ttk.Combobox(frame_transferencia, values=todas_cats_sob2, state='readonly', width=25)
+            self.combo_categoria_destino = ttk.Combobox(frame_transferencia, values=self.catalogo_categorias.categorias(), state='readonly', width=25)
             self.combo_categoria_destino.grid(row=2, column=3, padx=5, pady=5)
             
             ttk.Button(frame_transferencia, text="Realizar Transferencia", command=self.realizar_transferencia).grid(row=3, column=0, columnspan=4, pady=15)
@@ -2863,20 +4947,23 @@ class SistemaFinancieroAgricolaSeguro:
         self.text_historial = scrolledtext.ScrolledText(frame_historial, height=8, font=('Courier', 9))
         self.text_historial.pack(fill='both', expand=True)
         
+        self.catalogo_categorias.suscribir('sobrantes', self.actualizar_categorias_sobrantes, self.aplicar_cambio_sobrantes)
         self.actualizar_sobrantes_disponibles()
 
-    def refrescar_categorias_sobrantes(self):
-        todas_cats = sorted({**self.categorias_agricolas, **self.categorias_personalizadas}.keys())
+    def actualizar_categorias_sobrantes(self):
+        # Sin permisos de edición no hay combos de transferencia y la pestaña no depende de las categorías
         if hasattr(self, 'combo_categoria_origen_sobrante'):
-            val = self.combo_categoria_origen_sobrante.get()
-            self.combo_categoria_origen_sobrante['values'] = todas_cats
-            if val in todas_cats:
-                self.combo_categoria_origen_sobrante.set(val)
-        if hasattr(self, 'combo_categoria_destino'):
-            val = self.combo_categoria_destino.get()
-            self.combo_categoria_destino['values'] = todas_cats
-            if val in todas_cats:
-                self.combo_categoria_destino.set(val)
+            self.actualizar_combo_categorias(self.combo_categoria_origen_sobrante, self.catalogo_categorias.categorias())
+            self.actualizar_combo_categorias(self.combo_categoria_destino, self.catalogo_categorias.categorias())
+        return True
+
+    def aplicar_cambio_sobrantes(self, categoria, solo_subcategorias):
+        # Los combos solo listan categorías
+        if not solo_subcategorias:
+            self.actualizar_categorias_sobrantes()
+
+    def refrescar_categorias_sobrantes(self):
+        self.catalogo_categorias.refrescar('sobrantes', forzar=True)
         messagebox.showinfo("Actualizado", "✅ Categorías de sobrantes actualizadas correctamente.")
 
     def calcular_sobrantes(self):
@@ -2894,8 +4981,10 @@ class SistemaFinancieroAgricolaSeguro:
         for item in self.tree_sobrantes.get_children(): self.tree_sobrantes.delete(item)
         
         if mes_seleccionado in self.presupuesto_mensual_por_mes:
-            for categoria, presupuesto in self.presupuesto_mensual_por_mes[mes_seleccionado].items():
-                gastos = sum(t['monto'] for t in self.transacciones if t['categoria'] == categoria and datetime.strptime(t['fecha'], '%Y-%m-%d').month == mes_numero and datetime.strptime(t['fecha'], '%Y-%m-%d').year == año_actual)
+            presupuesto_mes = self.presupuesto_mensual_por_mes[mes_seleccionado]
+            gastos_mes = self.indice_gastos.gastado_por_categoria(año_actual, mes_numero, presupuesto_mes)
+            for categoria, presupuesto in presupuesto_mes.items():
+                gastos = gastos_mes[categoria]
                 if presupuesto - gastos > 0:
                     self.tree_sobrantes.insert('', 'end', values=(categoria, f"${presupuesto:,.2f}", f"${gastos:,.2f}", f"${presupuesto - gastos:,.2f}"))
 
@@ -2914,7 +5003,7 @@ class SistemaFinancieroAgricolaSeguro:
             año_actual = datetime.now().year
             
             presupuesto = self.presupuesto_mensual_por_mes[mes_origen][categoria_origen]
-            gastos = sum(t['monto'] for t in self.transacciones if t['categoria'] == categoria_origen and datetime.strptime(t['fecha'], '%Y-%m-%d').month == mes_numero and datetime.strptime(t['fecha'], '%Y-%m-%d').year == año_actual)
+            gastos = self.indice_gastos.gastado(año_actual, mes_numero, categoria_origen)
             
             if monto > (presupuesto - gastos): return messagebox.showerror("Error", f"No hay suficiente sobrante. Disponible: ${presupuesto - gastos:,.2f}")
             
@@ -2936,7 +5025,8 @@ class SistemaFinancieroAgricolaSeguro:
                 self.presupuesto_modificado[mes_origen][categoria_destino] = True
                 mensaje = f"Transferencia en {mes_origen}: ${monto:,.2f} De {categoria_origen} → A {categoria_destino}"
                 
-            self.guardar_datos()
+            self.marcar_modificado('presupuesto_mensual')
+            self.flush()
             self.registrar_actividad("Transferencia", mensaje)
             self.text_historial.insert('1.0', f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {mensaje}\n")
             self.actualizar_sobrantes_disponibles()
@@ -2965,249 +5055,267 @@ class SistemaFinancieroAgricolaSeguro:
         self.frame_graficos.pack(fill='both', expand=True, padx=10, pady=10)
 
     def generar_graficos(self):
-        for widget in self.frame_graficos.winfo_children(): widget.destroy()
-        
         mes_seleccionado, mes_numero = self.combo_mes_grafico.get(), self.meses.index(self.combo_mes_grafico.get()) + 1
-        año_actual = datetime.now().year
         
         if mes_seleccionado not in self.presupuesto_mensual_por_mes: 
+            if self.grafico is not None:
+                self.canvas_graficos.get_tk_widget().pack_forget()
             return messagebox.showinfo("Sin Datos", "No hay presupuesto configurado para este mes")
         
-        fig = Figure(figsize=(14, 10))
-        ax1 = fig.add_subplot(2, 2, 1)
-        categorias, presupuestos, gastos = [], [], []
-        
-        for categoria, presupuesto in self.presupuesto_mensual_por_mes[mes_seleccionado].items():
-            gasto = sum(t['monto'] for t in self.transacciones if t['categoria'] == categoria and datetime.strptime(t['fecha'], '%Y-%m-%d').month == mes_numero and datetime.strptime(t['fecha'], '%Y-%m-%d').year == año_actual)
-            categorias.append(categoria[:12] + '..' if len(categoria) > 12 else categoria)
-            presupuestos.append(presupuesto)
-            gastos.append(gasto)
-        
-        x, width = range(len(categorias)), 0.35
-        ax1.bar([i - width/2 for i in x], presupuestos, width, label='Presupuesto', color='#4CAF50')
-        ax1.bar([i + width/2 for i in x], gastos, width, label='Gastado', color='#FF9800')
-        ax1.set_xlabel('Categorías')
-        ax1.set_ylabel('Monto ($)')
-        ax1.set_title(f'Presupuesto vs Gastado - {mes_seleccionado}')
-        ax1.set_xticks(x)
-        ax1.set_xticklabels(categorias, rotation=45, ha='right', fontsize=8)
-        ax1.legend()
-        ax1.grid(axis='y', alpha=0.3)
-        
-        ax2 = fig.add_subplot(2, 2, 2)
-        porcentajes = [(g/p*100 if p > 0 else 0) for g, p in zip(gastos, presupuestos)]
-        colors = ['#f44336' if p > 100 else '#FF9800' if p > 90 else '#4CAF50' for p in porcentajes]
-        ax2.barh(categorias, porcentajes, color=colors)
-        ax2.set_xlabel('% Utilizado')
-        ax2.set_title('Porcentaje de Uso del Presupuesto')
-        ax2.axvline(x=100, color='red', linestyle='--', linewidth=2, label='Límite')
-        ax2.legend()
-        ax2.grid(axis='x', alpha=0.3)
-        ax2.tick_params(axis='y', labelsize=8)
-        
-        ax3 = fig.add_subplot(2, 2, 3)
-        gastos_no_cero = [(cat, gasto) for cat, gasto in zip(categorias, gastos) if gasto > 0]
-        if gastos_no_cero:
-            labels, values = zip(*gastos_no_cero)
-            ax3.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, textprops={'fontsize': 8})
-            ax3.set_title('Distribución del Gasto por Categoría')
-        else: 
-            ax3.text(0.5, 0.5, 'Sin gastos registrados', ha='center', va='center', transform=ax3.transAxes)
-        
-        ax4 = fig.add_subplot(2, 2, 4)
-        meses_anteriores, totales_gastados = [], []
-        for i in range(6, 0, -1):
-            mes_idx = (mes_numero - i) % 12
-            if mes_idx == 0: mes_idx = 12
-            mes_nombre = self.meses[mes_idx - 1]
-            total = sum(t['monto'] for t in self.transacciones if datetime.strptime(t['fecha'], '%Y-%m-%d').month == mes_idx)
-            meses_anteriores.append(mes_nombre[:3])
-            totales_gastados.append(total)
-
-        ax4.plot(meses_anteriores, totales_gastados, marker='o', linewidth=2, markersize=8)
-        ax4.set_xlabel('Mes')
-        ax4.set_ylabel('Total Gastado ($)')
-        ax4.set_title('Tendencia de Gasto (Últimos 6 Meses)')
-        ax4.grid(True, alpha=0.3)
-        
-        fig.tight_layout()
-        fig.subplots_adjust(hspace=0.6, bottom=0.15) 
+        if self.grafico is None:
+            # matplotlib tarda casi un segundo en importarse: se carga al dibujar el primer gráfico
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            self.grafico = GraficosPresupuesto()
+            self.canvas_graficos = FigureCanvasTkAgg(self.grafico.figura, master=self.frame_graficos)
         
-        canvas = FigureCanvasTkAgg(fig, master=self.frame_graficos)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.grafico.actualizar(self.indice_gastos, self.presupuesto_mensual_por_mes[mes_seleccionado], self.año_actual, mes_numero)
+        self.canvas_graficos.get_tk_widget().pack(fill='both', expand=True)
+        self.canvas_graficos.draw_idle()
 
     def cargar_datos(self):
-        self.cargar_log_actividades()
+        self.aplicar_datos(self.leer_datos())
+
+    def cargar_datos_en_segundo_plano(self):
+        estado = {'completadas': []}
         
-        if os.path.exists(self.archivo_datos):
-            try:
-                with open(self.archivo_datos, 'r', encoding='utf-8') as f:
-                    self.transacciones = json.load(f)
-                    self.migrar_transacciones_antiguas()
-            except: 
-                self.transacciones = []
-                
-        if os.path.exists(self.archivo_presupuesto_mensual):
-            try:
-                with open(self.archivo_presupuesto_mensual, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.presupuesto_mensual_por_mes = data.get('presupuesto', {})
-                    self.presupuesto_modificado = data.get('modificado', {})
-            except: 
-                self.presupuesto_mensual_por_mes, self.presupuesto_modificado = {}, {}
-                
-        if os.path.exists(self.archivo_proveedores):
-            try:
-                with open(self.archivo_proveedores, 'r', encoding='utf-8') as f: 
-                    self.proveedores = json.load(f)
-            except: 
-                self.proveedores = {}
-                
-        if os.path.exists(self.archivo_presupuestos_anuales):
-            try:
-                with open(self.archivo_presupuestos_anuales, 'r', encoding='utf-8') as f: 
-                    self.presupuestos_por_año = json.load(f)
-            except: 
-                self.presupuestos_por_año = {}
-                
-        if os.path.exists(self.archivo_sobrantes_anuales):
-            try:
-                with open(self.archivo_sobrantes_anuales, 'r', encoding='utf-8') as f: 
-                    self.sobrantes_anuales = json.load(f)
-            except: 
-                self.sobrantes_anuales = {}
-                
-        if os.path.exists(self.archivo_categorias_personalizadas):
+        def trabajar():
             try:
-                with open(self.archivo_categorias_personalizadas, 'r', encoding='utf-8') as f: 
-                    self.categorias_personalizadas = json.load(f)
-            except: 
-                self.categorias_personalizadas = {}
+                estado['datos'] = self.leer_datos(estado['completadas'].append)
+            except Exception as e:
+                estado['error'] = e
+        
+        threading.Thread(target=trabajar, daemon=True).start()
+        
+        def revisar():
+            completadas = list(estado['completadas'])
+            self.barra_carga['value'] = len(completadas)
+            if completadas:
+                self.label_carga.config(text=f"⏳ Cargando datos... ({len(completadas)}/{len(self.tareas_carga())}) {completadas[-1]}")
+            if 'error' in estado:
+                # Sin datos no se puede seguir: guardar sobre un estado vacío borraría el contenido real
+                messagebox.showerror("Error", f"No se pudieron cargar los datos: {estado['error']}")
+                self.al_cerrar_ventana()
+            elif 'datos' in estado:
+                self.aplicar_datos(estado['datos'])
+                cronometro_arranque.marcar("Carga de datos")
+                self.crear_notebook()
+                cronometro_arranque.publicar()
+                self.registrar_actividad("Inicio de sesión")
+                self.mostrar_bienvenida()
+            else:
+                self.root.after(50, revisar)
+        
+        self.root.after(50, revisar)
+
+    def tareas_carga(self):
+        tareas = [('transacciones', self.leer_transacciones)]
+        for coleccion in self.COLECCIONES_PERSISTENTES:
+            tareas.append((coleccion, lambda c=coleccion: self.leer_coleccion(c)))
+        return tareas
+
+    def leer_datos(self, al_completar=None):
+        # Cada archivo se lee en su propia tarea; el estado de la aplicación no se toca hasta aplicar_datos
+        datos = {}
+        with ThreadPoolExecutor(max_workers=len(self.tareas_carga())) as ejecutor:
+            futuros = {ejecutor.submit(tarea): nombre for nombre, tarea in self.tareas_carga()}
+            for futuro in as_completed(futuros):
+                nombre = futuros[futuro]
+                datos[nombre] = futuro.result()
+                if al_completar:
+                    al_completar(nombre.replace('_', ' '))
+        return datos
+
+    def leer_coleccion(self, coleccion):
+        # Solo una colección que todavía no existe empieza vacía; un archivo ilegible se informa en trabajar()
+        if not self.almacenamiento.existe(coleccion):
+            return {}
+        return self.almacenamiento.cargar(coleccion, {})
+
+    def leer_transacciones(self):
+        indice_fechas = self.almacenamiento.indice_fechas()
+        if indice_fechas is not None:
+            return self.leer_transacciones_en_base(indice_fechas)
+        
+        transacciones = {}
+        if self.almacenamiento.existe('transacciones'):
+            for datos in self.almacenamiento.cargar_transacciones():
+                transaccion = Transaccion.desde_dict(datos)
+                transacciones[transaccion.id] = transaccion
+            # Migración única: al compactar, el historial queda guardado con la versión actual del esquema
+            migrar = self.almacenamiento.version_esquema() < VERSION_ESQUEMA
+            if migrar:
+                vincular_proveedores(transacciones.values(), self.leer_coleccion('proveedores'))
+            if migrar or self.almacenamiento.necesita_compactar():
+                self.almacenamiento.compactar([t.a_dict() for t in transacciones.values()])
+        
+        indice_fechas, resumen_proveedores = IndiceFechas(), ResumenProveedores()
+        indice_fechas.reconstruir(transacciones.values())
+        resumen_proveedores.reconstruir(transacciones.values())
+        try:
+            indice_gastos = TablaGastos(indice_fechas)
+        except ImportError:
+            indice_gastos = IndiceGastos()
+            indice_gastos.reconstruir(transacciones.values())
+        else:
+            indice_gastos.reconstruir()
+        return transacciones, indice_fechas, indice_gastos, resumen_proveedores
+
+    def leer_transacciones_en_base(self, indice_fechas):
+        # Con SQLite las filas se quedan en la base: el registro las pide por tramos y los totales salen de GROUP BY.
+        # Solo la migración única del esquema las recorre todas.
+        if self.almacenamiento.version_esquema() < VERSION_ESQUEMA:
+            transacciones = [Transaccion.desde_dict(datos) for datos in self.almacenamiento.cargar_transacciones()]
+            vincular_proveedores(transacciones, self.leer_coleccion('proveedores'))
+            self.almacenamiento.compactar([t.a_dict() for t in transacciones])
+        
+        indice_fechas.reconstruir()
+        indice_gastos, resumen_proveedores = IndiceGastos(), ResumenProveedores()
+        indice_gastos.cargar_resumen(self.almacenamiento.resumen_gastos())
+        sin_vincular = [Transaccion.desde_dict(datos) for datos in self.almacenamiento.transacciones_sin_vincular()]
+        resumen_proveedores.cargar_resumen(self.almacenamiento.resumen_proveedores(), sin_vincular)
+        return None, indice_fechas, indice_gastos, resumen_proveedores
+
+    def aplicar_datos(self, datos):
+        self.transacciones, self.indice_fechas, self.indice_gastos, self.resumen_proveedores = datos['transacciones']
+        self.presupuesto_mensual_por_mes = datos['presupuesto_mensual'].get('presupuesto', {})
+        self.presupuesto_modificado = datos['presupuesto_mensual'].get('modificado', {})
+        self.proveedores = datos['proveedores']
+        self.indice_proveedores.reconstruir(self.proveedores)
+        # La secuencia nunca queda por debajo del mayor id guardado, aunque el archivo de secuencias falte o esté atrasado
+        self.secuencias = datos['secuencias']
+        ids_numericos = [int(prov_id) for prov_id in self.proveedores if prov_id.isdigit()]
+        self.secuencias['proveedores'] = max([self.secuencias.get('proveedores', 0)] + ids_numericos)
+        self.presupuestos_por_año = datos['presupuestos_anuales']
+        self.sobrantes_anuales = datos['sobrantes_anuales']
+        self.categorias_personalizadas = datos['categorias_personalizadas']
+        self.catalogo_categorias.cargar(self.categorias_personalizadas)
                 
         if str(self.año_actual) not in self.presupuestos_por_año and self.presupuesto_mensual_por_mes:
             self.presupuestos_por_año[str(self.año_actual)] = dict(self.presupuesto_mensual_por_mes)
-            self.guardar_presupuestos_anuales()
-
-    def migrar_transacciones_antiguas(self):
-        modificado = False
-        for t in self.transacciones:
-            if 'proveedor' not in t: 
-                t['proveedor'] = ''
-                modificado = True
-            if 'descripcion' not in t: 
-                t['descripcion'] = ''
-                modificado = True
-            if 'subcategoria' not in t: 
-                t['subcategoria'] = ''
-                modificado = True
-        if modificado: 
-            self.guardar_datos()
-
-    def guardar_datos(self):
-        self.guardar_log_actividades()
-        
-        with open(self.archivo_datos, 'w', encoding='utf-8') as f:
-            json.dump(self.transacciones, f, ensure_ascii=False, indent=2)
-            
-        with open(self.archivo_presupuesto_mensual, 'w', encoding='utf-8') as f:
-            json.dump({'presupuesto': self.presupuesto_mensual_por_mes, 'modificado': self.presupuesto_modificado}, f, ensure_ascii=False, indent=2)
-            
-        with open(self.archivo_proveedores, 'w', encoding='utf-8') as f:
-            json.dump(self.proveedores, f, ensure_ascii=False, indent=2)
-            
-        if self.presupuesto_mensual_por_mes:
-            self.presupuestos_por_año[str(self.año_actual)] = dict(self.presupuesto_mensual_por_mes)
-            self.guardar_presupuestos_anuales()
+            self.marcar_modificado('presupuestos_anuales')
+            self.flush()
 
-    def guardar_presupuestos_anuales(self):
-        with open(self.archivo_presupuestos_anuales, 'w', encoding='utf-8') as f:
-            json.dump(self.presupuestos_por_año, f, ensure_ascii=False, indent=2)
+    def nombre_proveedor(self, prov_id, por_defecto=''):
+        if not prov_id:
+            return por_defecto or "(sin proveedor)"
+        prov = self.proveedores.get(prov_id)
+        return prov['nombre'] if prov else por_defecto or f"(proveedor eliminado #{prov_id})"
 
-    def guardar_sobrantes_anuales(self):
-        with open(self.archivo_sobrantes_anuales, 'w', encoding='utf-8') as f:
-            json.dump(self.sobrantes_anuales, f, ensure_ascii=False, indent=2)
+    def compactar_transacciones(self):
+        self.almacenamiento.compactar([t.a_dict() for t in self.transacciones.values()])
 
-    def guardar_categorias_personalizadas(self):
-        with open(self.archivo_categorias_personalizadas, 'w', encoding='utf-8') as f:
-            json.dump(self.categorias_personalizadas, f, ensure_ascii=False, indent=2)
-    
-    def actualizar_todas_categorias_combos(self):
-        todas_categorias = list(self.categorias_agricolas.keys())
-    
-        for cat in self.categorias_personalizadas.keys():
-            if cat not in todas_categorias:
-                todas_categorias.append(cat)
-    
-        todas_categorias.sort()
-    
-        if hasattr(self, 'combo_categoria'):
-            valor_actual = self.combo_categoria.get()
-            self.combo_categoria['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_categoria.set(valor_actual)
-            elif todas_categorias:
-                self.combo_categoria.current(0)
-                if hasattr(self, 'actualizar_subcategorias'):
-                    try:
-                        self.actualizar_subcategorias()
-                    except:
-                        pass
-    
-        if hasattr(self, 'combo_categoria_proveedor'):
-            valor_actual = self.combo_categoria_proveedor.get()
-            self.combo_categoria_proveedor['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_categoria_proveedor.set(valor_actual)
-            elif todas_categorias:
-                self.combo_categoria_proveedor.current(0)
-    
-        if hasattr(self, 'combo_cat_para_subcat'):
-            valor_actual = self.combo_cat_para_subcat.get()
-            self.combo_cat_para_subcat['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_cat_para_subcat.set(valor_actual)
-    
-        if hasattr(self, 'combo_cat_eliminar'):
-            valor_actual = self.combo_cat_eliminar.get()
-            self.combo_cat_eliminar['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_cat_eliminar.set(valor_actual)
+    def marcar_modificado(self, *colecciones):
+        self.colecciones_modificadas.update(colecciones)
+
+    def datos_coleccion(self, coleccion):
+        if coleccion == 'presupuesto_mensual':
+            return {'presupuesto': self.presupuesto_mensual_por_mes, 'modificado': self.presupuesto_modificado}
+        return {
+            'secuencias': self.secuencias,
+            'proveedores': self.proveedores,
+            'presupuestos_anuales': self.presupuestos_por_año,
+            'sobrantes_anuales': self.sobrantes_anuales,
+            'categorias_personalizadas': self.categorias_personalizadas
+        }[coleccion]
+
+    def flush(self, avisar=True):
+        pendientes, self.colecciones_modificadas = self.colecciones_modificadas, set()
         
-        if hasattr(self, 'combo_categoria_origen_sobrante'):
-            valor_actual = self.combo_categoria_origen_sobrante.get()
-            self.combo_categoria_origen_sobrante['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_categoria_origen_sobrante.set(valor_actual)
-                
-        if hasattr(self, 'combo_categoria_destino'):
-            valor_actual = self.combo_categoria_destino.get()
-            self.combo_categoria_destino['values'] = todas_categorias
-            if valor_actual in todas_categorias:
-                self.combo_categoria_destino.set(valor_actual)
+        if 'presupuesto_mensual' in pendientes and self.presupuesto_mensual_por_mes:
+            self.presupuestos_por_año[str(self.año_actual)] = dict(self.presupuesto_mensual_por_mes)
+            pendientes.add('presupuestos_anuales')
+        
+        # Las altas y bajas ya están en el diario; el snapshot solo se rehace cada cierto número de cambios
+        if 'transacciones' in pendientes and self.almacenamiento.necesita_compactar():
+            self.compactar_transacciones()
+        
+        for coleccion in self.COLECCIONES_PERSISTENTES:
+            if coleccion in pendientes:
+                self.escritor.encolar(coleccion, self.datos_coleccion(coleccion))
+        
+        self.avisar_error_escritura(avisar)
 
-        if hasattr(self, 'regenerar_presupuesto_categorias'):
-            try:
-                self.regenerar_presupuesto_categorias()
-            except:
-                pass
+    def avisar_error_escritura(self, avisar=True):
+        error = self.escritor.tomar_error()
+        if error and avisar:
+            messagebox.showerror("Error al Guardar", f"No se pudieron guardar los datos:\n{error}")
+        elif error:
+            print(f"No se pudieron guardar los datos: {error}", file=sys.stderr)
+
+    def cerrar_persistencia(self, avisar=True):
+        # Se llama al cerrar la ventana y otra vez al salir de mainloop: solo la primera llamada vacía el escritor
+        if self.persistencia_cerrada:
+            return
+        self.persistencia_cerrada = True
+        self.flush(avisar)
+        self.escritor.detener()
+        self.avisar_error_escritura(avisar)
+
+    def actualizar_combo_categorias(self, combo, valores, seleccionar_primera=False):
+        valor_actual = combo.get()
+        combo['values'] = valores
+        if valor_actual in valores:
+            combo.set(valor_actual)
+        elif seleccionar_primera and valores:
+            combo.current(0)
+
+def valor_argumento(opcion, por_defecto=None):
+    posicion = sys.argv.index(opcion) + 1
+    if posicion < len(sys.argv) and not sys.argv[posicion].startswith('--'):
+        return sys.argv[posicion]
+    return por_defecto
 
 def main():
-    seguridad = SistemaSeguridad()
+    if '--migrar-sqlite' in sys.argv:
+        total = migrar_json_a_sqlite()
+        print(f"Migración completada: {total} transacciones copiadas a {ARCHIVO_BASE_DATOS}")
+        return
+
+    if '--calibrar-hash' in sys.argv:
+        seguridad = SistemaSeguridad()
+        objetivo = float(valor_argumento('--calibrar-hash', TIEMPO_OBJETIVO_LOGIN))
+        iteraciones = seguridad.calibrar_iteraciones(objetivo)
+        seguridad.configurar_hash(algoritmo='pbkdf2_sha256', iteraciones=iteraciones)
+        print(f"PBKDF2-SHA256 calibrado a {iteraciones:,} iteraciones (objetivo: {objetivo:.2f} s por login). "
+              f"Las contraseñas se actualizarán en el próximo inicio de sesión de cada usuario.")
+        return
+
+    if '--exportar-graficos' in sys.argv:
+        destino = valor_argumento('--exportar-graficos', 'graficos')
+        formatos = valor_argumento('--formatos', 'png').split(',') if '--formatos' in sys.argv else ['png']
+        años = valor_argumento('--años') if '--años' in sys.argv else None
+        periodos = [(int(año), mes) for año in años.split(',') for mes in range(1, 13)] if años else None
+        rutas = exportar_graficos(destino, periodos, formatos)
+        print(f"{len(rutas)} archivos exportados en {destino}")
+        return
+
+    # El reloj empieza aquí; lo que cuesta importar el módulo se ve con python -X importtime
+    cronometro_arranque.reanudar()
+    cronometro_arranque.mostrar = '--tiempos-arranque' in sys.argv
+    almacenamiento = crear_almacenamiento()
+    seguridad = SistemaSeguridad(almacenamiento)
+    cronometro_arranque.marcar("Carga de usuarios")
     root_login = tk.Tk()
     ventana_login = VentanaLogin(root_login, seguridad)
+    root_login.update_idletasks()
+    cronometro_arranque.marcar("Ventana de login")
+    cronometro_arranque.publicar()
     root_login.mainloop()
     
     if not ventana_login.login_exitoso:
         return
         
+    cronometro_arranque.reanudar()
     root = tk.Tk()
     app = SistemaFinancieroAgricolaSeguro(
         root, 
         ventana_login.usuario_actual, 
-        seguridad
+        seguridad,
+        almacenamiento
     )
     root.mainloop()
+    # La ventana ya no existe: los errores de la última escritura van a la consola, sin diálogos
+    app.cerrar_persistencia(avisar=False)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
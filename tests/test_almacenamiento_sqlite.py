@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from financiero import VERSION_ESQUEMA, AlmacenamientoSQLite
+
+
+def gasto(fecha, monto, **extra):
+    return dict({'fecha': fecha, 'categoria': 'Semillas', 'subcategoria': 'Maíz', 'monto': monto,
+                 'proveedor': '', 'descripcion': '', 'proveedor_id': ''}, **extra)
+
+
+class TestAlmacenamientoSQLite(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.ruta = os.path.join(self.directorio.name, 'finanzas.db')
+
+    def abrir(self):
+        almacenamiento = AlmacenamientoSQLite(self.ruta)
+        self.addCleanup(almacenamiento.conexion.close)
+        return almacenamiento
+
+    def test_ida_y_vuelta_de_transacciones(self):
+        almacenamiento = self.abrir()
+        primero = almacenamiento.registrar_transaccion('alta', gasto('2024-01-05', 100))
+        segundo = almacenamiento.registrar_transaccion('alta', gasto('2024-02-06', 50))
+        almacenamiento.registrar_transaccion('cambio', gasto('2024-02-07', 75, id=segundo, proveedor_id='3'))
+        almacenamiento.registrar_transaccion('baja', {'id': primero})
+
+        self.assertEqual(self.abrir().cargar_transacciones(), [gasto('2024-02-07', 75, id=segundo, proveedor_id='3')])
+        self.assertEqual(self.abrir().resumen_gastos(), [(2024, 2, 'Semillas', 'Maíz', 75.0)])
+
+    def test_ida_y_vuelta_de_colecciones(self):
+        almacenamiento = self.abrir()
+        self.assertFalse(almacenamiento.existe('proveedores'))
+        self.assertEqual(almacenamiento.cargar('proveedores', {}), {})
+        almacenamiento.guardar('proveedores', {'1': {'nombre': 'Agro Núñez'}})
+
+        releido = self.abrir()
+        self.assertTrue(releido.existe('proveedores'))
+        self.assertEqual(releido.cargar('proveedores', {}), {'1': {'nombre': 'Agro Núñez'}})
+
+    def test_compactar_conserva_los_ids(self):
+        almacenamiento = self.abrir()
+        transacciones = [gasto('2024-01-05', 100, id=4), gasto('2024-01-06', 50, id=9)]
+        almacenamiento.compactar(transacciones)
+        self.assertEqual(self.abrir().cargar_transacciones(), transacciones)
+
+    def test_version_del_esquema(self):
+        self.assertEqual(self.abrir().version_esquema(), VERSION_ESQUEMA)
+
+        # Una base anterior a proveedor_id se amplía al abrirla y queda pendiente de migrar hasta compactar
+        os.remove(self.ruta)
+        conexion = sqlite3.connect(self.ruta)
+        conexion.executescript("""
+            CREATE TABLE transacciones (id INTEGER PRIMARY KEY AUTOINCREMENT, fecha TEXT NOT NULL, año INTEGER NOT NULL,
+                mes INTEGER NOT NULL, categoria TEXT NOT NULL, subcategoria TEXT NOT NULL DEFAULT '', monto REAL NOT NULL,
+                proveedor TEXT NOT NULL DEFAULT '', descripcion TEXT NOT NULL DEFAULT '');
+            INSERT INTO transacciones (fecha, año, mes, categoria, monto) VALUES ('2024-01-05', 2024, 1, 'Semillas', 100);
+            PRAGMA user_version = 2;
+        """)
+        conexion.close()
+
+        almacenamiento = self.abrir()
+        self.assertEqual(almacenamiento.version_esquema(), 2)
+        transacciones = almacenamiento.cargar_transacciones()
+        self.assertEqual(transacciones[0]['proveedor_id'], '')
+        almacenamiento.compactar(transacciones)
+        self.assertEqual(almacenamiento.version_esquema(), VERSION_ESQUEMA)
+
+    def test_actividades_de_la_mas_reciente_a_la_mas_antigua(self):
+        almacenamiento = self.abrir()
+        for i, usuario in enumerate(('ana', 'luis', 'ana')):
+            almacenamiento.agregar_actividad({'fecha_hora': f'2024-01-0{i + 1} 10:00:00', 'usuario': usuario,
+                                              'rol': 'admin', 'actividad': f'a{i}', 'detalles': ''})
+        self.assertEqual([a['actividad'] for a in almacenamiento.leer_actividades()], ['a2', 'a1', 'a0'])
+        self.assertEqual([a['actividad'] for a in almacenamiento.leer_actividades('ana')], ['a2', 'a0'])
+
+
+    def test_tramos_y_posiciones_por_fecha(self):
+        almacenamiento = self.abrir()
+        ids = [almacenamiento.registrar_transaccion('alta', gasto(f, 10)) for f in ('2024-01-15', '2024-02-01', '2024-01-15', '2023-12-31')]
+        self.assertEqual([t['id'] for t in almacenamiento.leer_transacciones()], [ids[1], ids[0], ids[2], ids[3]])
+        self.assertEqual([t['id'] for t in almacenamiento.leer_transacciones(1, 2)], [ids[0], ids[2]])
+        self.assertEqual([t['id'] for t in almacenamiento.leer_transacciones(desde='2024-01-01', hasta='2024-01-31')], [ids[0], ids[2]])
+        self.assertEqual(almacenamiento.contar_transacciones(), 4)
+        self.assertEqual(almacenamiento.contar_transacciones(desde='2024-01-15'), 3)
+        self.assertEqual(almacenamiento.contar_transacciones(hasta='2024-01-15'), 3)
+        self.assertEqual([almacenamiento.posicion_transaccion('2024-01-15', i) for i in ids[::2]], [1, 2])
+        self.assertEqual(almacenamiento.leer_transaccion(ids[3])['fecha'], '2023-12-31')
+        self.assertIsNone(almacenamiento.leer_transaccion(999))
+
+    def test_resumen_de_proveedores_y_gastos_sin_vincular(self):
+        almacenamiento = self.abrir()
+        almacenamiento.registrar_transaccion('alta', gasto('2024-01-05', 100, proveedor='Agro Núñez', proveedor_id='1'))
+        almacenamiento.registrar_transaccion('alta', gasto('2024-01-20', 40, proveedor='Agro Núñez', proveedor_id='1'))
+        pendiente = almacenamiento.registrar_transaccion('alta', gasto('2024-02-01', 5, proveedor='Campo Sur'))
+        almacenamiento.registrar_transaccion('alta', gasto('2024-02-02', 7))
+        self.assertEqual(sorted(almacenamiento.resumen_proveedores()),
+                         [('', 2024, 2, 'Semillas', 12.0), ('1', 2024, 1, 'Semillas', 140.0)])
+        self.assertEqual([t['id'] for t in almacenamiento.transacciones_sin_vincular()], [pendiente])
+
+if __name__ == '__main__':
+    unittest.main()
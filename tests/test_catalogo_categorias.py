@@ -0,0 +1,104 @@
+import unittest
+
+from financiero import CatalogoCategorias
+
+
+class TestCatalogoCategorias(unittest.TestCase):
+    def setUp(self):
+        self.personalizadas = {'Abonos': ['Orgánico']}
+        self.catalogo = CatalogoCategorias({'Semillas': ['Trigo', 'Maíz'], 'Riego': []}, self.personalizadas)
+
+    def test_vista_combinada_ordenada(self):
+        self.assertEqual(self.catalogo.vista(), {'Abonos': ['Orgánico'], 'Riego': [], 'Semillas': ['Maíz', 'Trigo']})
+        self.assertEqual(self.catalogo.categorias(), ['Abonos', 'Riego', 'Semillas'])
+        self.assertEqual(self.catalogo.subcategorias('Otra'), [])
+        self.assertIn('Riego', self.catalogo)
+        self.assertEqual([self.catalogo.tipo(c) for c in ('Abonos', 'Riego')], ['PERSONALIZADA', 'PREDEFINIDA'])
+
+    def test_altas_y_bajas(self):
+        self.catalogo.agregar_categoria('Herramientas')
+        self.catalogo.agregar_subcategoria('Herramientas', 'Palas')
+        self.assertEqual(self.catalogo.categorias(), ['Abonos', 'Herramientas', 'Riego', 'Semillas'])
+        with self.assertRaises(ValueError):
+            self.catalogo.agregar_categoria('Riego')
+        with self.assertRaises(ValueError):
+            self.catalogo.agregar_subcategoria('Herramientas', 'Palas')
+        with self.assertRaises(ValueError):
+            self.catalogo.agregar_subcategoria('Otra', 'Palas')
+        self.assertEqual(self.personalizadas['Herramientas'], ['Palas'])
+
+        self.catalogo.eliminar_categoria('Herramientas')
+        self.assertNotIn('Herramientas', self.catalogo)
+        with self.assertRaises(ValueError):
+            self.catalogo.eliminar_categoria('Riego')
+        self.assertFalse(self.catalogo.eliminar_subcategoria('Riego', 'Goteo'))
+
+    def test_modificar_una_predefinida_la_vuelve_mixta(self):
+        self.catalogo.agregar_subcategoria('Semillas', 'Avena')
+        self.assertEqual(self.catalogo.tipo('Semillas'), 'MIXTA')
+        self.assertEqual(self.catalogo.subcategorias('Semillas'), ['Avena', 'Maíz', 'Trigo'])
+        self.assertTrue(self.catalogo.eliminar_subcategoria('Semillas', 'Trigo'))
+        self.assertEqual(self.personalizadas['Semillas'], ['Maíz', 'Avena'])
+        # Al eliminarla vuelve a las subcategorías predefinidas
+        self.catalogo.eliminar_categoria('Semillas')
+        self.assertEqual(self.catalogo.tipo('Semillas'), 'PREDEFINIDA')
+        self.assertEqual(self.catalogo.subcategorias('Semillas'), ['Maíz', 'Trigo'])
+
+    def test_cargar_sustituye_las_personalizadas(self):
+        self.catalogo.cargar({'Riego': ['Goteo']})
+        self.assertEqual(self.catalogo.vista(), {'Riego': ['Goteo'], 'Semillas': ['Maíz', 'Trigo']})
+
+    def test_refrescar_solo_las_vistas_desactualizadas(self):
+        llamadas = []
+        resultado = [True]
+
+        def repintar():
+            llamadas.append('repintar')
+            return resultado[0]
+
+        self.catalogo.suscribir('registro', repintar)
+        self.assertFalse(self.catalogo.refrescar('registro'))
+        self.assertTrue(self.catalogo.refrescar('registro', forzar=True))
+
+        # Un repintado fallido no marca la vista como al día
+        resultado[0] = False
+        self.catalogo.agregar_categoria('Herramientas')
+        self.assertFalse(self.catalogo.vista_al_dia('registro'))
+        resultado[0] = True
+        self.assertTrue(self.catalogo.refrescar('registro'))
+        self.assertTrue(self.catalogo.vista_al_dia('registro'))
+        self.assertEqual(len(llamadas), 3)
+
+    def test_cada_cambio_se_notifica_con_su_categoria(self):
+        cambios, repintados = [], []
+        self.catalogo.suscribir('presupuesto', lambda: repintados.append('presupuesto') or True,
+                                lambda categoria, solo_subcategorias: cambios.append((categoria, solo_subcategorias)))
+        self.catalogo.agregar_categoria('Herramientas')
+        self.catalogo.agregar_subcategoria('Semillas', 'Avena')
+        self.catalogo.eliminar_subcategoria('Semillas', 'Avena')
+        self.catalogo.eliminar_categoria('Semillas')
+        self.catalogo.eliminar_categoria('Herramientas')
+        self.assertEqual(cambios, [('Herramientas', False), ('Semillas', True), ('Semillas', True),
+                                   ('Semillas', True), ('Herramientas', False)])
+        self.assertEqual(repintados, [])
+        self.assertEqual(self.catalogo.siguiente('Herramientas'), 'Riego')
+        self.assertIsNone(self.catalogo.siguiente('Semillas'))
+
+        # Una recarga completa repinta la vista entera
+        self.catalogo.cargar({})
+        self.assertEqual(repintados, ['presupuesto'])
+        self.assertEqual(len(cambios), 5)
+
+    def test_una_vista_desactualizada_se_repinta_entera(self):
+        cambios, repintados = [], []
+        self.catalogo.suscribir('proveedores', lambda: repintados.append('proveedores') or False,
+                                lambda categoria, solo_subcategorias: cambios.append(categoria))
+        self.catalogo.cargar({})
+        # El repintado falló: el siguiente cambio no puede aplicarse sobre una vista que no está al día
+        self.catalogo.agregar_categoria('Herramientas')
+        self.assertEqual(repintados, ['proveedores', 'proveedores'])
+        self.assertEqual(cambios, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
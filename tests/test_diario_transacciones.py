@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+
+from financiero import VERSION_ESQUEMA, DiarioTransacciones
+
+
+def gasto(fecha, monto, **extra):
+    return dict({'fecha': fecha, 'categoria': 'Semillas', 'subcategoria': 'Maíz', 'monto': monto}, **extra)
+
+
+class TestDiarioTransacciones(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.snapshot = os.path.join(self.directorio.name, 'transacciones.json')
+        self.diario = os.path.join(self.directorio.name, 'transacciones.jsonl')
+
+    def nuevo(self, **kwargs):
+        return DiarioTransacciones(self.snapshot, self.diario, **kwargs)
+
+    def test_repite_altas_bajas_y_cambios(self):
+        diario = self.nuevo()
+        diario.cargar()
+        primero = diario.registrar('alta', gasto('2024-01-05', 100))
+        segundo = diario.registrar('alta', gasto('2024-01-06', 50))
+        diario.registrar('cambio', gasto('2024-01-06', 75, id=segundo))
+        diario.registrar('baja', {'id': primero})
+
+        releido = self.nuevo()
+        transacciones = releido.cargar()
+        self.assertEqual(transacciones, [gasto('2024-01-06', 75, id=segundo)])
+        self.assertEqual((releido.secuencia, releido.ultimo_id, releido.entradas_pendientes), (4, 2, 4))
+
+    def test_bajas_antiguas_sin_id_se_localizan_por_sus_datos(self):
+        lineas = [
+            {'n': 1, 'op': 'alta', 'datos': gasto('2024-01-05', 100)},
+            {'n': 2, 'op': 'alta', 'datos': gasto('2024-01-05', 100)},
+            {'n': 3, 'op': 'alta', 'datos': gasto('2024-01-06', 50, id=7)},
+            {'n': 4, 'op': 'baja', 'datos': gasto('2024-01-05', 100)},
+            {'n': 5, 'op': 'baja', 'datos': {'id': 7}},
+            {'n': 6, 'op': 'cambio', 'datos': gasto('2024-01-06', 60, id=7)},
+        ]
+        with open(self.diario, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(linea) + '\n' for linea in lineas)
+
+        diario = self.nuevo()
+        self.assertEqual(diario.cargar(), [gasto('2024-01-05', 100, id=8)])
+        self.assertEqual(diario.secuencia, 6)
+
+    def test_los_ids_no_se_reutilizan_tras_una_baja(self):
+        diario = self.nuevo()
+        diario.cargar()
+        diario.registrar('alta', gasto('2024-01-05', 100))
+        ultimo = diario.registrar('alta', gasto('2024-01-06', 50))
+        diario.registrar('baja', {'id': ultimo})
+
+        releido = self.nuevo()
+        releido.cargar()
+        self.assertEqual(releido.registrar('alta', gasto('2024-01-07', 10)), ultimo + 1)
+
+    def test_compactar_y_volver_a_cargar(self):
+        diario = self.nuevo()
+        transacciones = diario.cargar()
+        for dia in range(1, 4):
+            datos = gasto(f'2024-01-0{dia}', dia)
+            diario.registrar('alta', datos)
+            transacciones.append(datos)
+        diario.compactar(transacciones)
+        self.assertEqual(os.path.getsize(self.diario), 0)
+        despues = diario.registrar('alta', gasto('2024-01-09', 9))
+
+        releido = self.nuevo()
+        cargadas = releido.cargar()
+        self.assertEqual([t['id'] for t in cargadas], [1, 2, 3, despues])
+        self.assertEqual(releido.entradas_pendientes, 1)
+        self.assertEqual(releido.secuencia, 4)
+
+    def test_ignora_entradas_ya_incluidas_en_el_snapshot(self):
+        # Cierre entre escribir el snapshot y truncar el diario: las entradas viejas no se aplican dos veces
+        diario = self.nuevo()
+        transacciones = diario.cargar()
+        datos = gasto('2024-01-05', 100)
+        diario.registrar('alta', datos)
+        transacciones.append(datos)
+        with open(self.diario, 'rb') as f:
+            contenido = f.read()
+        diario.compactar(transacciones)
+        with open(self.diario, 'wb') as f:
+            f.write(contenido)
+
+        self.assertEqual(len(self.nuevo().cargar()), 1)
+
+    def test_descarta_una_linea_truncada(self):
+        diario = self.nuevo()
+        diario.cargar()
+        diario.registrar('alta', gasto('2024-01-05', 100))
+        with open(self.diario, 'a', encoding='utf-8') as f:
+            f.write('{"n": 2, "op": "alta", "dat')
+
+        self.assertEqual(len(self.nuevo().cargar()), 1)
+
+    def test_necesita_compactar(self):
+        diario = self.nuevo(max_entradas=2)
+        diario.cargar()
+        diario.registrar('alta', gasto('2024-01-05', 1))
+        self.assertFalse(diario.necesita_compactar())
+        diario.registrar('alta', gasto('2024-01-06', 2))
+        self.assertTrue(diario.necesita_compactar())
+
+    def test_formato_antiguo_recibe_ids(self):
+        with open(self.snapshot, 'w', encoding='utf-8') as f:
+            json.dump([gasto('2024-01-05', 100), gasto('2024-01-06', 50)], f)
+
+        diario = self.nuevo()
+        transacciones = diario.cargar()
+        self.assertEqual([t['id'] for t in transacciones], [1, 2])
+        self.assertEqual(diario.version, 0)
+        diario.compactar(transacciones)
+
+        releido = self.nuevo()
+        self.assertEqual(releido.cargar(), transacciones)
+        self.assertEqual(releido.version, VERSION_ESQUEMA)
+
+
+if __name__ == '__main__':
+    unittest.main()
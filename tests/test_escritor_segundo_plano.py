@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from financiero import AlmacenamientoSQLite, EscritorSegundoPlano
+
+
+class TestEscritorSegundoPlano(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.almacenamiento = AlmacenamientoSQLite(os.path.join(self.directorio.name, 'finanzas.db'))
+        self.addCleanup(self.almacenamiento.conexion.close)
+        self.escritor = EscritorSegundoPlano(self.almacenamiento, espera=60)
+        self.addCleanup(self.escritor.detener)
+
+    def test_guarda_la_version_encolada_aunque_cambie_despues(self):
+        proveedores = {'1': {'nombre': 'Agro Núñez'}}
+        self.escritor.encolar('proveedores', proveedores)
+        # La interfaz sigue modificando la colección mientras la escritura espera
+        proveedores['2'] = {'nombre': 'Riegos del Valle'}
+        self.escritor.vaciar()
+        self.assertEqual(self.almacenamiento.cargar('proveedores', {}), {'1': {'nombre': 'Agro Núñez'}})
+
+    def test_una_rafaga_se_queda_con_la_ultima_version(self):
+        for i in range(5):
+            self.escritor.encolar('secuencias', {'proveedores': i})
+        self.assertEqual(len(self.escritor.pendientes), 1)
+        self.escritor.vaciar()
+        self.assertEqual(self.almacenamiento.cargar('secuencias', {}), {'proveedores': 4})
+
+    def test_tras_detener_escribe_en_el_acto(self):
+        self.escritor.encolar('secuencias', {'proveedores': 1})
+        self.escritor.detener()
+        self.escritor.detener()
+        self.assertEqual(self.almacenamiento.cargar('secuencias', {}), {'proveedores': 1})
+        self.escritor.encolar('secuencias', {'proveedores': 2})
+        self.assertEqual(self.almacenamiento.cargar('secuencias', {}), {'proveedores': 2})
+
+    def test_los_errores_se_entregan_una_vez(self):
+        self.escritor.encolar('proveedores', {})
+        self.almacenamiento.conexion.execute("DROP TABLE colecciones")
+        self.escritor.vaciar()
+        self.assertIn('proveedores', self.escritor.tomar_error())
+        self.assertIsNone(self.escritor.tomar_error())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from financiero import AlmacenamientoSQLite, IndiceFechas, Transaccion
+
+
+def gasto(fecha, monto=1):
+    return Transaccion(fecha, 'Semillas', 'Maíz', monto)
+
+
+class TestIndiceFechas(unittest.TestCase):
+    def setUp(self):
+        self.transacciones = [gasto(f) for f in ('2024-01-31', '2023-12-31', '2024-02-01', '2024-01-01', '2024-01-15', '2024-01-15')]
+        self.indice = IndiceFechas()
+        self.indice.reconstruir(self.transacciones)
+
+    def fechas(self, limites):
+        inicio, fin = limites
+        return [t.fecha for t in self.indice[inicio:fin]]
+
+    def test_de_la_mas_reciente_a_la_mas_antigua(self):
+        fechas = [t.fecha for t in self.indice]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+        # A igual fecha se mantiene el orden de registro
+        self.assertEqual(self.indice[2:4], self.transacciones[4:6])
+
+    def test_limites_periodo(self):
+        self.assertEqual(self.fechas(self.indice.limites_periodo(2024, 1)), ['2024-01-31', '2024-01-15', '2024-01-15', '2024-01-01'])
+        self.assertEqual(self.fechas(self.indice.limites_periodo(2023)), ['2023-12-31'])
+        self.assertEqual(self.fechas(self.indice.limites_periodo(2024, 3)), [])
+        self.assertEqual(self.fechas(self.indice.limites_periodo(2022)), [])
+
+    def test_limites_abiertos_y_con_texto(self):
+        self.assertEqual(self.fechas(self.indice.limites(desde='2024-01-15')), ['2024-02-01', '2024-01-31', '2024-01-15', '2024-01-15'])
+        self.assertEqual(self.fechas(self.indice.limites(hasta=date(2024, 1, 1))), ['2024-01-01', '2023-12-31'])
+        self.assertEqual(self.indice.limites(), (0, len(self.indice)))
+        # Un rango invertido queda vacío en lugar de devolver un tramo negativo
+        inicio, fin = self.indice.limites('2024-02-01', '2023-12-31')
+        self.assertEqual(inicio, fin)
+
+    def test_agregar_y_quitar_mantienen_el_orden(self):
+        nuevo = gasto('2024-01-15')
+        posicion = self.indice.agregar(nuevo)
+        self.assertIs(self.indice[posicion], nuevo)
+        self.assertEqual(posicion, 4)
+        self.assertEqual(self.indice.posicion(nuevo), posicion)
+        self.assertEqual(self.indice.quitar(self.transacciones[4]), 2)
+        self.assertEqual(self.indice.quitar(nuevo), 3)
+        self.assertEqual(self.indice.claves, sorted(self.indice.claves))
+        self.assertEqual(len(self.indice), 5)
+
+
+class TestIndiceFechasSQLite(unittest.TestCase):
+    # Debe repartir las mismas posiciones y tramos que IndiceFechas sobre las mismas transacciones
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.almacenamiento = AlmacenamientoSQLite(os.path.join(directorio.name, 'finanzas.db'))
+        self.addCleanup(self.almacenamiento.conexion.close)
+        self.memoria, self.base = IndiceFechas(), self.almacenamiento.indice_fechas()
+        self.base.reconstruir()
+        for f in ('2024-01-31', '2023-12-31', '2024-02-01', '2024-01-01', '2024-01-15', '2024-01-15'):
+            self.agregar(gasto(f))
+
+    def agregar(self, t):
+        t.id = self.almacenamiento.registrar_transaccion('alta', t.a_dict())
+        return self.memoria.agregar(t), self.base.agregar(t)
+
+    def ids(self, transacciones):
+        return [t.id for t in transacciones]
+
+    def test_mismo_orden_y_tramos(self):
+        self.assertEqual(len(self.base), len(self.memoria))
+        self.assertEqual(self.ids(self.base), self.ids(self.memoria))
+        self.assertEqual(self.ids(self.base[1:4]), self.ids(self.memoria[1:4]))
+        self.assertEqual(self.base[-1].id, self.memoria[-1].id)
+        for año, mes in ((2024, 1), (2024, 2), (2024, 3), (2023, None), (2022, None)):
+            self.assertEqual(self.base.limites_periodo(año, mes), self.memoria.limites_periodo(año, mes))
+        self.assertEqual(self.base.limites(desde='2024-01-15'), self.memoria.limites(desde='2024-01-15'))
+        self.assertEqual(self.base.limites(hasta=date(2024, 1, 1)), self.memoria.limites(hasta=date(2024, 1, 1)))
+
+    def test_agregar_y_quitar_devuelven_la_misma_posicion(self):
+        nuevo = gasto('2024-01-15')
+        memoria, base = self.agregar(nuevo)
+        self.assertEqual(base, memoria)
+        self.almacenamiento.registrar_transaccion('baja', {'id': nuevo.id})
+        self.assertEqual(self.base.quitar(nuevo), self.memoria.quitar(nuevo))
+        self.assertEqual(self.ids(self.base), self.ids(self.memoria))
+
+if __name__ == '__main__':
+    unittest.main()
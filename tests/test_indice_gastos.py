@@ -0,0 +1,62 @@
+import unittest
+
+from financiero import IndiceGastos, Transaccion
+
+
+def gasto(fecha, categoria, subcategoria, monto):
+    return Transaccion(fecha, categoria, subcategoria, monto)
+
+
+class TestIndiceGastos(unittest.TestCase):
+    def setUp(self):
+        self.transacciones = [
+            gasto('2024-01-05', 'Semillas', 'Maíz', 100),
+            gasto('2024-01-20', 'Semillas', 'Trigo', 50),
+            gasto('2024-02-03', 'Riego', 'Agua', 30),
+            gasto('2025-01-10', 'Semillas', 'Maíz', 70),
+        ]
+        self.indice = IndiceGastos()
+        self.indice.reconstruir(self.transacciones)
+
+    def test_totales_por_nivel(self):
+        self.assertEqual(self.indice.gastado(2024), 180)
+        self.assertEqual(self.indice.gastado(2024, 1), 150)
+        self.assertEqual(self.indice.gastado(2024, 1, 'Semillas'), 150)
+        self.assertEqual(self.indice.gastado(2024, 1, 'Semillas', 'Trigo'), 50)
+        self.assertEqual(self.indice.gastado(2023), 0)
+        self.assertEqual(self.indice.años(), [2024, 2025])
+
+    def test_quitar_descarta_claves_vacias(self):
+        self.indice.quitar(self.transacciones[2])
+        self.assertEqual(self.indice.gastado(2024, 2), 0)
+        self.assertNotIn((2024, 2), self.indice.por_mes)
+        self.assertNotIn((2024, 2, 'Riego'), self.indice.por_categoria)
+
+    def test_agregar_y_quitar_vuelven_al_estado_inicial(self):
+        nuevo = gasto('2024-01-07', 'Semillas', 'Maíz', 0.1)
+        self.indice.agregar(nuevo)
+        self.assertAlmostEqual(self.indice.gastado(2024, 1, 'Semillas', 'Maíz'), 100.1)
+        self.indice.quitar(nuevo)
+        self.assertEqual(self.indice.gastado(2024, 1, 'Semillas', 'Maíz'), 100)
+
+    def test_cargar_resumen_equivale_a_reconstruir(self):
+        resumen = IndiceGastos()
+        resumen.cargar_resumen([
+            (2024, 1, 'Semillas', 'Maíz', 100), (2024, 1, 'Semillas', 'Trigo', 50),
+            (2024, 2, 'Riego', 'Agua', 30), (2025, 1, 'Semillas', 'Maíz', 70),
+        ])
+        for tabla in ('por_subcategoria', 'por_categoria', 'por_mes', 'por_año'):
+            self.assertEqual(dict(getattr(resumen, tabla)), dict(getattr(self.indice, tabla)))
+
+    def test_consultas_agrupadas(self):
+        self.assertEqual(self.indice.gastado_por_categoria(2024, 1, ['Semillas', 'Riego']), {'Semillas': 150, 'Riego': 0})
+        self.assertEqual(self.indice.gastado_por_año([2024, 2026]), {2024: 180, 2026: 0})
+
+    def test_serie_mensual_cruza_el_año(self):
+        periodos, valores = self.indice.serie_mensual(2025, 2, meses=3)
+        self.assertEqual(periodos, [(2024, 11), (2024, 12), (2025, 1)])
+        self.assertEqual(list(valores), [0, 0, 70])
+
+
+if __name__ == '__main__':
+    unittest.main()
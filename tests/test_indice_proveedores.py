@@ -0,0 +1,60 @@
+import unittest
+
+from financiero import IndiceProveedores, normalizar_nombre
+
+
+class TestIndiceProveedores(unittest.TestCase):
+    def setUp(self):
+        self.proveedores = {
+            '1': {'nombre': 'Agro Insumos Núñez', 'categorias': {'Semillas': ['Maíz', 'Trigo']}},
+            '2': {'nombre': 'Riegos del Valle', 'categorias': {'Riego': ['Agua'], 'Semillas': []}},
+            '3': {'nombre': 'Agroquímica Sur', 'categorias': {}},
+        }
+        self.indice = IndiceProveedores()
+        self.indice.reconstruir(self.proveedores)
+
+    def test_normalizar_nombre(self):
+        self.assertEqual(normalizar_nombre('  Agro  Insumos NÚÑEZ '), 'agro insumos nunez')
+
+    def test_buscar_por_subcadena(self):
+        self.assertEqual(self.indice.buscar('nunez'), ['1'])
+        self.assertEqual(self.indice.buscar('AGRO'), ['1', '3'])
+        self.assertEqual(self.indice.buscar('valle del'), [])
+        self.assertEqual(self.indice.buscar('xyz'), [])
+
+    def test_buscar_por_prefijo_con_terminos_cortos(self):
+        self.assertEqual(self.indice.buscar('ag'), ['1', '3'])
+        self.assertEqual(self.indice.buscar('d'), ['2'])
+        self.assertEqual(self.indice.buscar('lle'), ['2'])
+
+    def test_buscar_por_categoria(self):
+        self.assertEqual(self.indice.buscar(categoria='Semillas'), ['1', '2'])
+        self.assertEqual(self.indice.buscar('agro', categoria='Semillas'), ['1'])
+        self.assertEqual(self.indice.buscar(categoria='Semillas', subcategoria='Trigo'), ['1'])
+        self.assertEqual(self.indice.buscar(categoria='Herramientas'), [])
+        self.assertEqual(self.indice.buscar(), ['1', '3', '2'])
+
+    def test_nombres_unicos(self):
+        with self.assertRaises(ValueError):
+            self.indice.agregar('4', {'nombre': 'agro insumos nunez'})
+        # Volver a guardar el mismo proveedor no es un duplicado
+        self.indice.agregar('1', {'nombre': 'Agro Insumos Núñez', 'categorias': {}})
+        self.assertEqual(self.indice.id_por_nombre('AGRO INSUMOS NUÑEZ'), '1')
+
+    def test_modificar_y_quitar(self):
+        self.indice.agregar('3', {'nombre': 'Fertilizantes Sur', 'categorias': {'Riego': ['Agua']}})
+        self.assertEqual(self.indice.buscar('agro'), ['1'])
+        self.assertEqual(self.indice.buscar('fert'), ['3'])
+        self.assertEqual(self.indice.buscar(categoria='Riego', subcategoria='Agua'), ['3', '2'])
+        self.indice.quitar('2')
+        self.assertEqual(self.indice.buscar(categoria='Riego'), ['3'])
+        self.assertEqual(self.indice.buscar('valle'), [])
+        self.assertEqual(self.indice.palabras, sorted(self.indice.palabras))
+        self.assertIsNone(self.indice.id_por_nombre('Riegos del Valle'))
+
+    def test_nombres_en_categoria(self):
+        self.assertEqual(self.indice.nombres_en_categoria(self.proveedores, 'Semillas'), ['Agro Insumos Núñez', 'Riegos del Valle'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+
+from financiero import LogSegmentado
+
+
+def actividad(fecha_hora, usuario='ana', detalles=''):
+    return {'fecha_hora': fecha_hora, 'usuario': usuario, 'rol': 'admin', 'actividad': 'Gasto', 'detalles': detalles}
+
+
+class TestLogSegmentado(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.carpeta_log = os.path.join(self.directorio.name, 'log')
+
+    def test_rota_al_superar_el_tamaño(self):
+        log = LogSegmentado(self.carpeta_log, max_bytes=200)
+        for i in range(10):
+            log.agregar(actividad('2024-01-01 10:00:00', detalles=f'entrada {i}'))
+        segmentos = log.segmentos()
+        self.assertGreater(len(segmentos), 1)
+        self.assertEqual([int(n[-10:-6]) for n in segmentos], list(range(1, len(segmentos) + 1)))
+
+        # Un log nuevo sobre la misma carpeta continúa la numeración sin sobrescribir segmentos
+        LogSegmentado(self.carpeta_log, max_bytes=200).agregar(actividad('2024-01-01 11:00:00', detalles='final'))
+        numeros = [int(n[-10:-6]) for n in log.segmentos()]
+        self.assertEqual(numeros, list(range(1, len(numeros) + 1)))
+        detalles = [e['detalles'] for e in log.leer_recientes()]
+        self.assertEqual(detalles, ['final'] + [f'entrada {i}' for i in range(9, -1, -1)])
+
+    def test_importa_el_log_antiguo_por_mes_y_tamaño(self):
+        antiguo = os.path.join(self.directorio.name, 'log_actividades.json')
+        entradas = [actividad(f'2024-01-{dia:02d} 09:00:00', detalles='ñ' * 40) for dia in range(1, 6)]
+        entradas += [actividad('2024-02-01 09:00:00', usuario='luis')]
+        with open(antiguo, 'w', encoding='utf-8') as f:
+            json.dump(entradas, f, ensure_ascii=False)
+
+        log = LogSegmentado(self.carpeta_log, antiguo, max_bytes=300)
+        self.assertFalse(os.path.exists(antiguo))
+        self.assertTrue(os.path.exists(antiguo + '.migrado'))
+        segmentos = log.segmentos()
+        de_enero = [n for n in segmentos if n.startswith('actividades_2024-01_')]
+        self.assertGreater(len(de_enero), 1)
+        self.assertEqual(de_enero[0], 'actividades_2024-01_0001.jsonl')
+        self.assertEqual([n for n in segmentos if n not in de_enero], ['actividades_2024-02_0001.jsonl'])
+        self.assertEqual(list(log.leer_recientes()), entradas[::-1])
+        self.assertEqual(list(log.leer_recientes('luis')), entradas[-1:])
+
+    def test_lineas_al_reves_con_bloques_pequeños(self):
+        ruta = os.path.join(self.directorio.name, 'segmento.jsonl')
+        lineas = ['{"a": "%s"}' % ('é' * i) for i in range(12)]
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lineas) + '\n\n')
+        # Bloques de pocos bytes cortan caracteres de dos bytes por la mitad
+        self.assertEqual(list(LogSegmentado.lineas_al_reves(ruta, tamaño_bloque=5)), lineas[::-1])
+
+    def test_limpiar(self):
+        log = LogSegmentado(self.carpeta_log)
+        log.agregar(actividad('2024-01-01 10:00:00'))
+        log.limpiar()
+        self.assertEqual(log.segmentos(), [])
+        self.assertEqual(list(log.leer_recientes()), [])
+        log.agregar(actividad('2024-01-01 10:00:00'))
+        self.assertEqual(len(log.segmentos()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from collections import defaultdict
+
+from financiero import ResumenProveedores, Transaccion, vincular_proveedores
+
+
+def gasto(id_transaccion, fecha, categoria, monto, proveedor='', proveedor_id=''):
+    return Transaccion(fecha, categoria, '', monto, proveedor, id_transaccion=id_transaccion, proveedor_id=proveedor_id)
+
+
+class TestResumenProveedores(unittest.TestCase):
+    def setUp(self):
+        self.transacciones = [
+            gasto(1, '2024-01-05', 'Semillas', 100, 'Agro Núñez', '1'),
+            gasto(2, '2024-01-20', 'Riego', 40, 'Agro Núñez', '1'),
+            gasto(3, '2024-03-02', 'Semillas', 300, 'Riegos del Valle', '2'),
+            gasto(4, '2024-03-09', 'Riego', 25),
+            gasto(5, '2024-04-01', 'Semillas', 60, 'Campo Sur'),
+            gasto(6, '2025-01-01', 'Semillas', 10, 'Agro Núñez', '1'),
+        ]
+        self.resumen = ResumenProveedores()
+        self.resumen.reconstruir(self.transacciones)
+
+    def test_totales(self):
+        self.assertEqual(self.resumen.gastado('1', 2024), 140)
+        self.assertEqual(self.resumen.gastado('1', 2024, 1), 140)
+        self.assertEqual(self.resumen.gastado('1', 2024, 2), 0)
+        self.assertEqual(self.resumen.mensual('2', 2024)[2], 300)
+        self.assertEqual(self.resumen.categorias('1', 2024), [('Semillas', 100), ('Riego', 40)])
+        # Sin proveedor dado de alta, el gasto queda bajo ''
+        self.assertEqual(self.resumen.gastado('', 2024), 85)
+        self.assertEqual(self.resumen.principales(2024, 2), [('2', 300), ('1', 140)])
+
+    def test_quitar_deshace_agregar(self):
+        antes = dict(self.resumen.por_mes)
+        nuevo = gasto(7, '2024-02-01', 'Riego', 5, 'Nuevo Proveedor')
+        self.resumen.agregar(nuevo)
+        self.assertIn('nuevo proveedor', self.resumen.sin_vincular)
+        self.resumen.quitar(nuevo)
+        self.assertEqual(dict(self.resumen.por_mes), antes)
+        self.assertNotIn('nuevo proveedor', self.resumen.sin_vincular)
+        self.assertEqual(self.resumen.gastado('', 2024), 85)
+
+    def test_vincular_pasa_los_gastos_pendientes(self):
+        self.assertEqual(list(self.resumen.sin_vincular), ['campo sur'])
+        vinculadas = self.resumen.vincular('3', 'campo sur')
+        self.assertEqual([t.id for t in vinculadas], [5])
+        self.assertEqual(self.transacciones[4].proveedor_id, '3')
+        self.assertEqual(self.resumen.gastado('3', 2024, 4), 60)
+        self.assertEqual(self.resumen.gastado('', 2024), 25)
+        self.assertEqual(dict(self.resumen.sin_vincular), {})
+        self.assertEqual(self.resumen.vincular('3', 'campo sur'), [])
+
+    def test_vincular_proveedores_en_la_migracion(self):
+        transacciones = [gasto(1, '2024-01-05', 'Semillas', 100, '  agro NUÑEZ'), gasto(2, '2024-01-06', 'Riego', 5, 'Desconocido'),
+                         gasto(3, '2024-01-07', 'Riego', 5)]
+        proveedores = {'7': {'nombre': 'Agro Núñez'}, '8': {'nombre': 'agro nunez'}}
+        self.assertEqual(vincular_proveedores(transacciones, proveedores), 1)
+        self.assertEqual([t.proveedor_id for t in transacciones], ['7', '', ''])
+
+
+    def test_cargar_resumen_equivale_a_reconstruir(self):
+        filas = defaultdict(float)
+        for t in self.transacciones:
+            filas[(t.proveedor_id, t.año, t.mes, t.categoria)] += t.monto
+        cargado = ResumenProveedores()
+        cargado.cargar_resumen([clave + (monto,) for clave, monto in filas.items()],
+                               [t for t in self.transacciones if t.proveedor and not t.proveedor_id])
+        self.assertEqual(dict(cargado.por_mes), dict(self.resumen.por_mes))
+        self.assertEqual(cargado.principales(2024, 3), self.resumen.principales(2024, 3))
+        self.assertEqual(cargado.categorias('1', 2024), self.resumen.categorias('1', 2024))
+        self.assertEqual(list(cargado.sin_vincular), ['campo sur'])
+
+if __name__ == '__main__':
+    unittest.main()
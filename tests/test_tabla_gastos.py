@@ -0,0 +1,77 @@
+import random
+import unittest
+
+from financiero import IndiceFechas, IndiceGastos, TablaGastos, Transaccion
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "TablaGastos necesita numpy")
+class TestTablaGastos(unittest.TestCase):
+    def setUp(self):
+        self.azar = random.Random(7)
+        self.transacciones = [self.gasto_al_azar() for _ in range(300)]
+        self.fechas = IndiceFechas()
+        self.fechas.reconstruir(self.transacciones)
+        self.indice = IndiceGastos()
+        self.indice.reconstruir(self.transacciones)
+        self.tabla = TablaGastos(self.fechas, capacidad=4)
+        self.tabla.reconstruir()
+
+    def gasto_al_azar(self):
+        azar = self.azar
+        fecha = f"{azar.choice((2023, 2024))}-{azar.randint(1, 12):02d}-{azar.randint(1, 28):02d}"
+        categoria = azar.choice(('Semillas', 'Riego', 'Maquinaria'))
+        return Transaccion(fecha, categoria, azar.choice(('a', 'b')), azar.randint(1, 500), azar.choice(('', 'Agro', 'Núñez')))
+
+    def comprobar_igual_al_indice(self):
+        categorias = ['Semillas', 'Riego', 'Maquinaria', 'Otra']
+        self.assertEqual(self.tabla.años(), self.indice.años())
+        self.assertEqual(self.tabla.gastado_por_año([2023, 2024, 2025]), self.indice.gastado_por_año([2023, 2024, 2025]))
+        for año in (2023, 2024):
+            for mes in range(1, 13):
+                self.assertAlmostEqual(self.tabla.gastado(año, mes), self.indice.gastado(año, mes))
+                self.assertAlmostEqual(self.tabla.gastado(año, mes, 'Riego', 'a'), self.indice.gastado(año, mes, 'Riego', 'a'))
+                self.assertEqual(self.tabla.gastado_por_categoria(año, mes, categorias),
+                                 self.indice.gastado_por_categoria(año, mes, categorias))
+        periodos, totales = self.tabla.serie_mensual(2024, 3, meses=6)
+        periodos_indice, totales_indice = self.indice.serie_mensual(2024, 3, meses=6)
+        self.assertEqual(periodos, periodos_indice)
+        self.assertEqual(list(totales), list(totales_indice))
+
+    def test_reconstruir_coincide_con_el_indice(self):
+        self.comprobar_igual_al_indice()
+
+    def test_altas_y_bajas_incrementales(self):
+        for _ in range(100):
+            if self.azar.random() < 0.6:
+                t = self.gasto_al_azar()
+                self.transacciones.append(t)
+                self.fechas.agregar(t)
+                self.tabla.agregar(t)
+                self.indice.agregar(t)
+            else:
+                t = self.transacciones.pop(self.azar.randrange(len(self.transacciones)))
+                self.tabla.quitar(t)
+                self.fechas.quitar(t)
+                self.indice.quitar(t)
+        self.comprobar_igual_al_indice()
+
+    def test_sumar_por(self):
+        esperado = {}
+        for t in self.transacciones:
+            if t.año == 2024 and t.categoria == 'Riego':
+                esperado[t.proveedor] = esperado.get(t.proveedor, 0) + t.monto
+        self.assertEqual(self.tabla.sumar_por('proveedor', año=2024, categoria='Riego'), esperado)
+        por_mes = self.tabla.sumar_por('mes', año=2023)
+        self.assertEqual(por_mes, {m: self.indice.gastado(2023, m) for m in range(1, 13) if self.indice.gastado(2023, m)})
+        self.assertEqual(self.tabla.sumar_por('categoria', categoria='No existe'), {})
+        with self.assertRaises(ValueError):
+            self.tabla.sumar_por('descripcion')
+
+
+if __name__ == '__main__':
+    unittest.main()